@@ -1,31 +1,57 @@
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 from bson import ObjectId
 from app.db import db
+from app.core.config import settings
 from app.core.security import get_current_user
+from app.core.serialization import DocumentShape, FastJSONResponse
 from app.schemas.activity import ActivityCreate, ActivityOut
+from app.services.activity_feed import FEED_SIZE, activity_feed
+from app.services.activity_queue import activity_queue
 
 router = APIRouter()
 
-@router.post("/", response_model=ActivityOut, status_code=201)
+_activity_shape = DocumentShape(ActivityOut)
+
+@router.post("/", response_model=ActivityOut, status_code=202)
 async def log_activity(payload: ActivityCreate, current_user: dict = Depends(get_current_user)):
+    """
+    Registra un evento de actividad. Se encola y se escribe en segundo plano por lotes
+    (202 Accepted): puede tardar hasta ACTIVITY_QUEUE_FLUSH_INTERVAL_SECONDS en aparecer en /user.
+    """
     user_id = current_user["id"]
     
     activity_data = payload.model_dump()
+    # El _id se genera aquí para poder devolver el evento sin esperar a la escritura
+    activity_data["_id"] = ObjectId()
     activity_data["user_id"] = user_id
     activity_data["timestamp"] = datetime.now(timezone.utc)
     
-    result = await db.activities.insert_one(activity_data)
+    if not activity_queue.submit(activity_data):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Activity ingestion is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    if settings.activity_feed_cache_enabled:
+        activity_feed.record(activity_data)
     
-    return ActivityOut(id=str(result.inserted_id), **activity_data)
+    return ActivityOut(id=str(activity_data["_id"]), **{k: v for k, v in activity_data.items() if k != "_id"})
 
 @router.get("/user", response_model=List[ActivityOut])
 async def get_user_activity(current_user: dict = Depends(get_current_user)):
     user_id = current_user["id"]
     
     # Cap to 20 to match previous localStorage limit behavior
-    cursor = db.activities.find({"user_id": user_id}).sort("timestamp", -1).limit(20)
-    activities = await cursor.to_list(length=20)
+    if settings.activity_feed_cache_enabled:
+        activities = await activity_feed.recent(db.activities, user_id)
+    else:
+        cursor = db.activities.find({"user_id": user_id}).sort("timestamp", -1).limit(FEED_SIZE)
+        activities = await cursor.to_list(length=FEED_SIZE)
+
+    if settings.fast_json_responses:
+        return FastJSONResponse([_activity_shape(a) for a in activities])
     
-    return [ActivityOut(id=str(a.pop("_id")), **a) for a in activities]
+    # Sin modificar los documentos: pueden ser los del buffer en memoria
+    return [ActivityOut(id=str(a["_id"]), **{k: v for k, v in a.items() if k != "_id"}) for a in activities]
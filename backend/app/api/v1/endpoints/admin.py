@@ -1,63 +1,149 @@
-from fastapi import APIRouter, Depends
-from typing import List
-from app.core.security import get_current_admin_user
-from app.schemas.user import UserOut
-from app.db import db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, List, Literal, Optional
+import csv
+import io
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.core.security import get_current_admin_user, password_pool, user_cache
+from app.core.serialization import dumps
+from app.db import pool_stats
+from app.schemas.user import AdminUserOut
+from app.repositories.user_repository import UserRepository, user_list_filter
+from app.services import metrics
+from app.services.activity_feed import activity_feed
+from app.services.activity_queue import activity_queue
+from app.services.image_pipeline import image_pipeline
+from app.services.stock_ledger import stock_ledger
 
 router = APIRouter()
 
-@router.get("/users", response_model=List[UserOut])
-async def get_all_users(current_admin: dict = Depends(get_current_admin_user)):
+def _user_filters(
+    role: Optional[str] = Query(None, description="Solo usuarios con este rol (ej: admin)"),
+    is_active: Optional[bool] = Query(None),
+    created_from: Optional[datetime] = Query(None, description="Alta desde (incluida)"),
+    created_to: Optional[datetime] = Query(None, description="Alta hasta (excluida)"),
+) -> dict:
+    return user_list_filter(role, is_active, created_from, created_to)
+
+def _admin_user(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "email": doc.get("email"),
+        "name": doc.get("name"),
+        "role": doc.get("role", "user"),
+        "is_active": doc.get("is_active", True),
+        "created_at": doc.get("created_at"),
+    }
+
+@router.get("/users", response_model=List[AdminUserOut])
+async def get_all_users(
+    response: Response,
+    query: dict = Depends(_user_filters),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    current_admin: dict = Depends(get_current_admin_user),
+):
     """
-    Endpoint para obtener todos los usuarios registrados.
+    Endpoint para obtener los usuarios registrados, paginado por cursor.
     Solo accesible para usuarios con rol 'admin'.
+
+    La respuesta sigue siendo una lista (compatible con el panel); si hay más
+    usuarios, la cabecera X-Next-Cursor trae el cursor de la siguiente página.
     """
-    users_cursor = db.users.find()
-    users = await users_cursor.to_list(length=100) # Límite para evitar sobrecarga (puede añadirse paginación)
-    
-    # Formatear el ID para Pydantic
-    formatted_users = []
-    for user in users:
-        user_id = str(user.pop("_id", ""))
-        if user_id:
-            user["id"] = user_id
-        # Si el token no tiene username ni demás, pasarlo igual (el Schema hará validación)
-        formatted_users.append(user)
-        
-    return formatted_users
+    users, next_cursor = await UserRepository().list_page(query, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [_admin_user(user) for user in users]
+
+_EXPORT_COLUMNS = ["id", "email", "name", "role", "is_active", "created_at"]
+# Filas por escritura al socket: ni una por usuario ni todo el listado en memoria
+_EXPORT_CHUNK_ROWS = 500
+
+async def _export_rows(query: dict, fmt: str) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    chunk: List[bytes] = []
+    if fmt == "csv":
+        writer.writerow(_EXPORT_COLUMNS)
+    rows = 0
+    async for doc in UserRepository().iter_all(query):
+        user = _admin_user(doc)
+        if fmt == "csv":
+            writer.writerow(_csv_row(user))
+        else:
+            chunk.append(dumps(user) + b"\n")
+        rows += 1
+        if rows % _EXPORT_CHUNK_ROWS == 0:
+            yield _drain(buffer, chunk)
+    yield _drain(buffer, chunk)
+
+def _csv_row(user: dict) -> list:
+    values = (user[column] for column in _EXPORT_COLUMNS)
+    return [value.isoformat() if isinstance(value, datetime) else value for value in values]
+
+def _drain(buffer: io.StringIO, chunk: List[bytes]) -> bytes:
+    data = buffer.getvalue().encode("utf-8") + b"".join(chunk)
+    buffer.seek(0)
+    buffer.truncate()
+    chunk.clear()
+    return data
+
+@router.get("/users/export")
+async def export_users(
+    query: dict = Depends(_user_filters),
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    current_admin: dict = Depends(get_current_admin_user),
+):
+    """
+    Exporta los usuarios (mismos filtros que /users) como NDJSON o CSV.
+    Se transmite a medida que se lee el cursor de MongoDB: la memoria no crece con
+    el número de usuarios.
+    """
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(query, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users-{stamp}.{format}"'},
+    )
 
 @router.get("/stats")
-async def get_dashboard_stats(current_admin: dict = Depends(get_current_admin_user)):
-    """
-    Retorna métricas reales leyendo directamente las colecciones de MongoDB
-    para el Dashboard Administrativo.
-    """
-    try:
-        total_users = await db.users.count_documents({})
-        total_products = await db.products.count_documents({})
-        
-        # Colección de orders (la crea implícitamente Mongo si no existe y devolverá 0)
-        total_orders = await db.orders.count_documents({})
-        
-        total_revenue = 0.0
-        if total_orders > 0:
-            # Agregación para sumar los ingresos ('total_amount') de todos los pedidos
-            pipeline = [{"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}]
-            revenue_cursor = db.orders.aggregate(pipeline)
-            revenue_data = await revenue_cursor.to_list(length=1)
-            total_revenue = float(revenue_data[0].get("total", 0.0)) if revenue_data else 0.0
-            
-        return {
-            "products": total_products,
-            "users": total_users,
-            "orders": total_orders,
-            "revenue": total_revenue
-        }
-    except Exception as e:
-        print(f"Error en /admin/stats: {e}")
-        return {
-            "products": 0,
-            "users": 0,
-            "orders": 0,
-            "revenue": 0.0
-        }
+async def get_dashboard_stats(
+    date_from: Optional[date] = Query(None, alias="from", description="Desglose diario desde (YYYY-MM-DD, UTC)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Desglose diario hasta, incluido (por defecto hoy)"),
+    current_admin: dict = Depends(get_current_admin_user),
+):
+    """
+    Métricas del Dashboard Administrativo, leídas de los rollups precalculados
+    (ver app/services/metrics.py): no recorre products, users ni orders.
+    Con ?from=...&to=... añade 'range' con los totales y el desglose por día.
+    """
+    stats = await metrics.totals()
+    if date_from or date_to:
+        date_to = date_to or datetime.now(timezone.utc).date()
+        date_from = date_from or date_to
+        if date_from > date_to:
+            raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+        if (date_to - date_from).days >= metrics.MAX_RANGE_DAYS:
+            raise HTTPException(status_code=400, detail=f"Range cannot exceed {metrics.MAX_RANGE_DAYS} days")
+        stats["range"] = await metrics.daily_range(date_from, date_to)
+    return stats
+
+@router.get("/runtime")
+async def get_runtime_stats(current_admin: dict = Depends(get_current_admin_user)):
+    """
+    Contadores en memoria de ESTE worker (cachés, pools...).
+    Útil para dimensionar TTLs y tamaños bajo carga real.
+    """
+    return {
+        "user_cache": user_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "stock_ledger": stock_ledger.stats(),
+        "response_cache": response_cache.stats(),
+        "image_pipeline": image_pipeline.stats(),
+        "activity_queue": activity_queue.stats(),
+        "activity_feed": activity_feed.stats(),
+        "mongo_pool": {"max_pool_size": settings.mongo_max_pool_size, "servers": pool_stats.stats()},
+    }
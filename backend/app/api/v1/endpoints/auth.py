@@ -81,7 +81,7 @@ async def refresh_token(request: Request, response: Response):
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    tokens = auth_service.refresh_user_token(user_id)
+    tokens = auth_service.refresh_user_token(user_id, payload.get("ver", 0))
     
     response.set_cookie(
         key="access_token",
@@ -1,12 +1,18 @@
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from app.core.config import settings
+from app.core.response_cache import CachedRoute, cached
 from app.core.security import get_current_user
-from app.schemas.order import OrderCreate, OrderOut
+from app.core.serialization import FastJSONResponse, DocumentShape
+from app.schemas.order import OrderCreate, OrderOut, OrderSummary
 from app.services.order_service import OrderService
 import logging
 
 logger = logging.getLogger("api.orders")
-router = APIRouter()
+router = APIRouter(route_class=CachedRoute)
+
+_order_shape = DocumentShape(OrderOut)
 
 @router.post("/", response_model=OrderOut, status_code=status.HTTP_201_CREATED)
 async def create_order(payload: OrderCreate, current_user: dict = Depends(get_current_user)):
@@ -14,8 +20,39 @@ async def create_order(payload: OrderCreate, current_user: dict = Depends(get_cu
     order_service = OrderService()
     return await order_service.create_order(user_id, payload)
 
-@router.get("/", response_model=list[OrderOut])
-async def get_user_orders(current_user: dict = Depends(get_current_user)):
+@router.get("/", response_model=Union[List[OrderOut], List[OrderSummary]])
+@cached(ttl=30, tags=["orders:{scope}"], per_user=True)
+async def get_user_orders(
+    response: Response,
+    view: Literal["full", "summary"] = Query("full", description="summary: sin líneas de pedido (nº de unidades y miniatura)"),
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Historial de pedidos del usuario, del más reciente al más antiguo.
+    Sigue siendo una lista; si hay más pedidos, X-Next-Cursor trae el cursor de la
+    siguiente página. La caché de respuestas (por usuario) se purga al crear un pedido.
+    """
     user_id = current_user["id"]
     order_service = OrderService()
-    return await order_service.get_user_orders(user_id)
+    summary = view == "summary"
+    headers = {}
+    if settings.fast_json_responses:
+        orders, next_cursor = await order_service.get_user_order_documents(user_id, limit, cursor, summary)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return FastJSONResponse(orders, headers=headers)
+    orders, next_cursor = await order_service.get_user_orders(user_id, limit, cursor, summary)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return orders
+
+@router.get("/{order_id}", response_model=OrderOut)
+@cached(ttl=60, tags=["orders:{scope}"], per_user=True)
+async def get_user_order(order_id: str, current_user: dict = Depends(get_current_user)):
+    """Detalle completo de un pedido del usuario (404 si no existe o es de otro usuario)."""
+    order = await OrderService().get_user_order(current_user["id"], order_id)
+    if settings.fast_json_responses:
+        return FastJSONResponse(_order_shape(order))
+    return OrderOut(id=str(order.pop("_id")), **order)
@@ -1,66 +1,310 @@
-from fastapi import APIRouter, HTTPException, Query, Depends, UploadFile, File
-from typing import Optional, List
-import os
-import shutil
-import uuid
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, List, Tuple, Type, Union
+import json
+import logging
 import re
 from bson import ObjectId
-from app.db import db
+from pymongo.errors import DuplicateKeyError
+from app.db import causal_session, db, reader
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.http_cache import etag_matches, is_fresh, make_etag, not_modified, validators
+from app.core.pagination import (
+    decode_cursor, decode_offset_cursor, encode_cursor, encode_offset_cursor, keyset_filter, sort_spec,
+)
+from app.core.response_cache import CachedRoute, cache_tags, cached, response_cache
 from app.core.security import get_current_admin_user
-from app.schemas.product import ProductCreate, ProductList, ProductOut
+from app.core.serialization import DocumentShape, FastJSONResponse
+from app.schemas.product import (
+    ProductBatchItem, ProductBatchRequest, ProductBatchResult, ProductCreate, ProductFieldsList, ProductList,
+    ProductOut, ProductSummary, ProductSummaryList,
+)
+from app.services import metrics
+from app.services.catalog_facets import catalog_facets
+from app.services.catalog_version import bump_catalog_version, catalog_version
+from app.services.home_service import home_snapshot
+from app.services.image_pipeline import image_pipeline
+from app.services.product_fields import SUMMARY_FIELDS, derived_fields, refresh_derived_fields, touch
+from app.services.product_search import product_search, regex_search_query, text_search_query, tokenize
 
 # --- Endpoints de Productos (API REST clásica) ---
 # Maneja CRUD: Create, Read, Update, Delete
 # En este caso: List, Detail, Create
 
-router = APIRouter()
+router = APIRouter(route_class=CachedRoute)
+logger = logging.getLogger("api.products")
 
-@router.get("/", response_model=ProductList)
+# Campos por los que se puede ordenar (todos presentes en cada documento)
+SORT_PATTERN = "^-?(_id|name|sold_count)$"
+
+# Totales de consultas filtradas para el modo cursor (por worker)
+_count_cache = TTLCache(settings.catalog_count_cache_ttl_seconds, 512)
+
+# Campos públicos de un producto (lo que se puede pedir con ?fields= o en /batch)
+PUBLIC_FIELDS = frozenset(ProductOut.model_fields) - {"id"}
+
+class ListingView(NamedTuple):
+    """Cómo se proyecta y serializa una página del catálogo."""
+    projection: Optional[dict]
+    model: Type[ProductList]
+    # Con ?fields=: claves que se devuelven (el resto de la proyección solo sirve al cursor)
+    keep: Optional[frozenset] = None
+
+def _listing_view(view: str, fields: Optional[str], sort: Optional[str]) -> ListingView:
+    """Traduce view/fields a una proyección de MongoDB, para no traer del servidor lo que no se va a enviar."""
+    sort_field = [sort.lstrip("-")] if sort else []
+    if fields:
+        wanted = {field.strip() for field in fields.split(",") if field.strip()} - {"id"}
+        unknown = wanted - PUBLIC_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        projection = {field: 1 for field in [*wanted, *sort_field]}
+        return ListingView(projection, ProductFieldsList, frozenset(wanted | {"id"}))
+    if view == "summary":
+        return ListingView({field: 1 for field in [*SUMMARY_FIELDS, *sort_field]}, ProductSummaryList)
+    return ListingView(None, ProductList)
+
+# Forma de cada producto en el camino rápido (settings.fast_json_responses)
+_product_shape = DocumentShape(ProductOut)
+_ITEM_SHAPES = {ProductList: _product_shape, ProductSummaryList: DocumentShape(ProductSummary)}
+
+def _page_response(listing: ListingView, products: list, total: int, next_cursor: Optional[str] = None, total_is_estimate: bool = False):
+    """La página como modelo Pydantic o, con fast_json_responses, codificada directamente."""
+    if not settings.fast_json_responses:
+        return listing.model(products=products, total=total, next_cursor=next_cursor, total_is_estimate=total_is_estimate)
+    shape = _ITEM_SHAPES.get(listing.model)
+    return FastJSONResponse({
+        "products": [shape(doc) for doc in products] if shape else products,
+        "total": total,
+        "next_cursor": next_cursor,
+        "total_is_estimate": total_is_estimate,
+    })
+
+def _product_response(doc: dict, request: Request, response: Response):
+    """Detalle de un producto con ETag/Last-Modified; 304 si el cliente ya tiene esta versión."""
+    updated_at = doc.get("updated_at")
+    etag = make_etag(doc["_id"], doc.get("version", 0), updated_at, settings.fast_json_responses)
+    headers = validators(etag, updated_at)
+    if is_fresh(request, etag, updated_at):
+        return not_modified(etag, headers)
+    if settings.fast_json_responses:
+        return FastJSONResponse(_product_shape(doc), headers=headers)
+    response.headers.update(headers)
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+def _with_headers(result, response: Response, headers: dict):
+    # Las respuestas ya construidas (camino rápido) no heredan las cabeceras de 'response'
+    if isinstance(result, Response):
+        result.headers.update(headers)
+    else:
+        response.headers.update(headers)
+    return result
+
+def _listing_item(doc: dict, listing: ListingView) -> dict:
+    # Transformamos _id (ObjectId) a id (str) para Pydantic
+    doc["id"] = str(doc.pop("_id"))
+    if listing.keep is not None:
+        return {key: value for key, value in doc.items() if key in listing.keep}
+    return doc
+
+@router.get("/", response_model=Union[ProductList, ProductSummaryList, ProductFieldsList])
+@cached(ttl=30, tags=["catalog"])
 async def read_products(
+    request: Request,
+    response: Response,
     # Parámetros Query (?type=Fire&search=Pika...)
     type: Optional[str] = Query(None, description="Filtro por tipo de producto (ej: Fuego, Agua)"),
-    search: Optional[str] = Query(None, description="Búsqueda parcial por nombre"),
+    search: Optional[str] = Query(None, max_length=100, description="Búsqueda por nombre, tipo y descripciones"),
     # Paginación básica
     skip: int = Query(0, ge=0, description="Número de registros a saltar (offset)"),
-    limit: int = Query(50, ge=1, le=100, description="Máximo de registros a devolver (limit)")
+    limit: int = Query(50, ge=1, le=100, description="Máximo de registros a devolver (limit)"),
+    # Paginación por cursor (opcional)
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="'offset' (skip/limit) o 'cursor' (keyset)"),
+    after: Optional[str] = Query(None, description="Cursor opaco devuelto como 'next_cursor' en la página anterior"),
+    sort: Optional[str] = Query(None, pattern=SORT_PATTERN, description="Orden: _id, name o sold_count ('-' delante para descendente)"),
+    # Tamaño de la respuesta
+    view: str = Query("full", pattern="^(summary|full)$", description="'summary': solo lo que pinta la tarjeta del grid"),
+    fields: Optional[str] = Query(None, max_length=500, description="Campos a devolver separados por comas (ej: name,min_price)"),
 ):
     """
     Lista productos con filtrado, búsqueda y paginación.
     
     Uso: GET /api/v1/products?type=Fire&limit=10
+
+    Modo cursor: GET /api/v1/products?pagination=cursor&sort=name&limit=20
+    y luego ...&after=<next_cursor> para la siguiente página. Cada página cuesta
+    lo mismo sin importar su profundidad; 'total' sale de una caché o de una
+    estimación ('total_is_estimate': true) en lugar de contar en cada página.
+
+    Con 'search' y sin 'sort', los resultados se ordenan por relevancia
+    (ver settings.product_search_backend).
+
+    Listados ligeros: ?view=summary devuelve ProductSummary (nombre, slug, imagen,
+    min_price, in_stock...) y ?fields=name,min_price solo esos campos. La proyección
+    se aplica en MongoDB, no después.
+
+    Peticiones condicionales: el ETag sale de la versión del catálogo (ver
+    catalog_version) y de los parámetros; con If-None-Match responde 304 sin
+    ejecutar la consulta.
     """
+    listing = _listing_view(view, fields, sort)
+
+    # Todas las lecturas del listado (versión y datos) en una sesión causal: aunque los datos
+    # vengan de una réplica, nunca son más antiguos que la versión del ETag (ver causal_session)
+    async with causal_session("catalog.list") as session:
+        # Se calcula ANTES de consultar: si algo cambia entre medias, el ETag queda viejo y el
+        # cliente simplemente volverá a descargar (nunca al revés). Sin Last-Modified: un
+        # borrado no mueve max(updated_at), así que If-Modified-Since no sería fiable aquí
+        version, last_write = await catalog_version(session)
+        etag = make_etag("products", version, last_write, request.url.query, settings.fast_json_responses)
+        headers = validators(etag)
+        if is_fresh(request, etag):
+            return not_modified(etag, headers)
     
-    # Construcción de la consulta MongoDB (Query object)
-    query = {}
+        # Construcción de la consulta MongoDB (Query object)
+        query = {}
     
-    if type:
-        # Filtro exacto: type == "Fire"
-        query["type"] = type
+        if type:
+            # Filtro exacto: type == "Fire"
+            query["type"] = type
         
-    if search:
-        # Filtro regex: Contiene 'search' (insensible a mayúsculas/minúsculas)
-        # $options: "i" hace la búsqueda case-insensitive
-        query["name"] = {"$regex": search, "$options": "i"}
+        ranked_ids = None
+        if search:
+            backend = settings.product_search_backend
+            if backend == "regex":
+                # Filtro regex sobre el nombre; escapamos la entrada para que '.', '(' o '*'
+                # del usuario se busquen literalmente y no como operadores
+                query["name"] = regex_search_query(search)
+            else:
+                if not tokenize(search):
+                    # Solo símbolos/espacios: nada que buscar
+                    return _with_headers(_page_response(listing, [], 0), response, headers)
+                if backend == "memory":
+                    await product_search.ensure_ready()
+                    ranked_ids = product_search.search(search, type)
+                    query["_id"] = {"$in": ranked_ids}
+                else:
+                    # Índice de texto de MongoDB (ver TEXT_INDEX_KEYS)
+                    query["$text"] = text_search_query(search)
+                if not sort:
+                    result = await _read_ranked_products(query, ranked_ids, skip, limit, pagination, after, listing, session)
+                    return _with_headers(result, response, headers)
+
+        if pagination == "cursor" or after:
+            result = await _read_products_page(query, limit, after, sort or "_id", listing, session)
+            return _with_headers(result, response, headers)
         
-    # Ejecutamos dos consultas:
-    # 1. Total de documentos para saber cuántas páginas hay (count_documents)
-    total = await db.products.count_documents(query)
+        # Ejecutamos dos consultas:
+        # 1. Total de documentos para saber cuántas páginas hay (count_documents)
+        total = await reader("catalog.list").products.count_documents(query, session=session)
     
-    # 2. Los datos paginados (find + skip + limit)
-    cursor = db.products.find(query).skip(skip).limit(limit)
+        # 2. Los datos paginados (find + skip + limit)
+        cursor = reader("catalog.list").products.find(query, listing.projection, session=session)
+        if sort:
+            cursor = cursor.sort(sort_spec(sort))
+        cursor = cursor.skip(skip).limit(limit)
     
-    products = []
+        products = []
     
-    # Iteramos asíncronamente sobre el cursor de MongoDB
-    async for doc in cursor:
-        # Transformamos _id (ObjectId) a id (str) para Pydantic
-        doc["id"] = str(doc.pop("_id"))
-        products.append(doc)
+        # Iteramos asíncronamente sobre el cursor de MongoDB
+        async for doc in cursor:
+            products.append(_listing_item(doc, listing))
         
-    return ProductList(products=products, total=total)
+        return _with_headers(_page_response(listing, products, total), response, headers)
+
+async def _read_products_page(query: dict, limit: int, after: Optional[str], sort: str, listing: ListingView, session=None) -> ProductList:
+    """Página en modo cursor: filtro keyset sobre (campo, _id) en lugar de skip."""
+    page_query = query
+    if after:
+        page_query = {"$and": [query, keyset_filter(sort, decode_cursor(after, sort))]}
+
+    # Pedimos uno de más para saber si existe página siguiente sin contar
+    docs = await reader("catalog.list").products.find(page_query, listing.projection, session=session).sort(sort_spec(sort)).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(sort, docs[limit - 1]) if len(docs) > limit else None
+
+    products = [_listing_item(doc, listing) for doc in docs[:limit]]
+
+    total, is_estimate = await _catalog_total(query, session)
+    return _page_response(listing, products, total, next_cursor, is_estimate)
+
+async def _read_ranked_products(
+    query: dict, ranked_ids: Optional[list], skip: int, limit: int, pagination: str, after: Optional[str],
+    listing: ListingView, session=None,
+) -> ProductList:
+    """
+    Página de resultados de búsqueda ordenados por relevancia.
+    - Backend "memory": el ranking ya viene calculado (ranked_ids); traemos la página con un $in.
+    - Backend "text": MongoDB ordena por textScore.
+    La relevancia no es un campo filtrable, así que aquí el cursor transporta la posición.
+    """
+    cursor_mode = pagination == "cursor" or after is not None
+    if after:
+        skip = decode_offset_cursor(after, "relevance")
+
+    if ranked_ids is not None:
+        page_ids = ranked_ids[skip:skip + limit]
+        docs = await reader("catalog.list").products.find({"_id": {"$in": page_ids}}, listing.projection, session=session).to_list(length=len(page_ids))
+        by_id = {doc["_id"]: doc for doc in docs}
+        docs = [by_id[pid] for pid in page_ids if pid in by_id]
+        total, is_estimate = len(ranked_ids), False
+        has_more = skip + limit < total
+    else:
+        cursor = reader("catalog.list").products.find(query, {**(listing.projection or {}), "score": {"$meta": "textScore"}}, session=session)
+        cursor = cursor.sort([("score", {"$meta": "textScore"}), ("_id", 1)]).skip(skip).limit(limit + 1)
+        docs = await cursor.to_list(length=limit + 1)
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        if cursor_mode:
+            total, is_estimate = await _catalog_total(query, session)
+        else:
+            total, is_estimate = await reader("catalog.list").products.count_documents(query, session=session), False
+
+    products = []
+    for doc in docs:
+        doc.pop("score", None)
+        products.append(_listing_item(doc, listing))
+
+    next_cursor = encode_offset_cursor("relevance", skip + limit) if cursor_mode and has_more else None
+    return _page_response(listing, products, total, next_cursor, is_estimate)
+
+async def _catalog_total(query: dict, session=None) -> Tuple[int, bool]:
+    """
+    Total para el modo cursor sin contar en cada página:
+    - Sin filtros: estimated_document_count() lee los metadatos de la colección (O(1)).
+    - Con filtros: count_documents() cacheado unos segundos por consulta.
+    """
+    if not query:
+        return await reader("catalog.list").products.estimated_document_count(session=session), True
+    key = json.dumps(query, sort_keys=True, default=str)
+    total = _count_cache.get(key)
+    if total is None:
+        total = await reader("catalog.list").products.count_documents(query, session=session)
+        _count_cache.set(key, total)
+    return total, False
+
+# Declarado antes de "/{product_id}" para que "facets" no se interprete como un ID
+@router.get("/facets")
+@cached(ttl=60, tags=["catalog"])
+async def get_product_facets(request: Request):
+    """
+    Facetas para los filtros del catálogo en una sola llamada:
+    tipos con su número de productos, rango de precios y disponibilidad
+    (por tipo y en total). Los precios salen de variants[].price o, en
+    productos antiguos, de price.
+
+    Se calcula con una única agregación y se sirve desde memoria
+    (ver CatalogFacets); con If-None-Match responde 304.
+    """
+    body, etag = await catalog_facets.get()
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @router.get("/{product_id}", response_model=ProductOut)
-async def read_product(product_id: str):
+@cached(ttl=60, tags=["product:{product_id}"])
+async def read_product(product_id: str, request: Request, response: Response):
     """
     Obtiene el detalle de un solo producto por su ID.
     Uso: GET /api/v1/products/65cde...
@@ -71,33 +315,85 @@ async def read_product(product_id: str):
         raise HTTPException(status_code=400, detail="Invalid ID format")
         
     # Buscamos por _id
-    doc = await db.products.find_one({"_id": ObjectId(product_id)})
+    doc = await reader("catalog.product").products.find_one({"_id": ObjectId(product_id)})
     
     if not doc:
         raise HTTPException(status_code=404, detail="Product not found")
         
-    doc["id"] = str(doc.pop("_id"))
-    return doc
+    return _product_response(doc, request, response)
 
 @router.get("/slug/{slug}", response_model=ProductOut)
-async def read_product_by_slug(slug: str):
+@cached(ttl=60)
+async def read_product_by_slug(slug: str, request: Request, response: Response):
     """
     Obtiene el detalle de un producto por su slug.
     Uso: GET /api/v1/products/slug/pikachu-plush
     """
-    doc = await db.products.find_one({"slug": slug})
+    doc = await reader("catalog.product").products.find_one({"slug": slug})
     
     if not doc:
         # Fallback para productos antiguos que aún no tengan slug
         # Si el slug es en realidad una _id válida de mongo, buscar por ahí
         if ObjectId.is_valid(slug):
-            doc = await db.products.find_one({"_id": ObjectId(slug)})
+            doc = await reader("catalog.product").products.find_one({"_id": ObjectId(slug)})
             
     if not doc:
         raise HTTPException(status_code=404, detail="Product not found by slug or ID")
+
+    # El slug no dice qué producto es: la etiqueta se conoce ahora
+    cache_tags(request, f"product:{doc['_id']}")
         
-    doc["id"] = str(doc.pop("_id"))
-    return doc
+    return _product_response(doc, request, response)
+
+@router.post("/batch", response_model=ProductBatchResult)
+async def read_products_batch(payload: ProductBatchRequest):
+    """
+    Resuelve varios productos (por ID o slug) en una sola consulta.
+    Pensado para el carrito: refrescar precio y stock de todas sus líneas de golpe.
+
+    Uso: POST /api/v1/products/batch
+         {"keys": ["65cde...", "pikachu-plush"], "fields": ["name", "variants"]}
+
+    Devuelve un resultado por clave, en el mismo orden, con found=false si no existe.
+    """
+    fields = PUBLIC_FIELDS if payload.fields is None else set(payload.fields) - {"id"}
+    unknown = fields - PUBLIC_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    # Una sola consulta $in: por _id para las claves con formato ObjectId y por slug para todas
+    # (un slug podría tener forma de ObjectId); ambos campos están indexados
+    oids = list({ObjectId(key) for key in payload.keys if ObjectId.is_valid(key)})
+    slugs = list(set(payload.keys))
+    projection = {field: 1 for field in fields} | {"slug": 1}
+    docs = await reader("catalog.batch").products.find(
+        {"$or": [{"_id": {"$in": oids}}, {"slug": {"$in": slugs}}]}, projection
+    ).to_list(length=None)
+
+    by_slug, by_id = {}, {}
+    for doc in docs:
+        doc["id"] = str(doc.pop("_id"))
+        by_id[doc["id"]] = doc
+        if doc.get("slug"):
+            by_slug.setdefault(doc["slug"], doc)
+
+    results = []
+    for key in payload.keys:
+        # Igual que /slug/{slug}: primero por slug y, si no, por ID
+        doc = by_slug.get(key) or by_id.get(key)
+        if doc is None:
+            results.append(ProductBatchItem(key=key, found=False))
+            continue
+        product = {k: v for k, v in doc.items() if k in fields or k == "id"}
+        results.append(ProductBatchItem(key=key, found=True, product=product))
+    return ProductBatchResult(results=results)
+
+async def _record_product(delta: int, product_id: str):
+    # El producto ya está escrito: un fallo del contador del dashboard no debe convertirse en un 500
+    try:
+        await metrics.record_product(delta)
+    except Exception as e:
+        logger.error(f"Failed to update product metrics for {product_id}: {e}")
 
 @router.post("/", response_model=ProductOut, status_code=201)
 async def create_product(
@@ -133,11 +429,26 @@ async def create_product(
     elif await db.products.find_one({"slug": product_dict["slug"]}):
         raise HTTPException(status_code=409, detail="Slug already exists")
     
-    # Insertamos
-    result = await db.products.insert_one(product_dict)
+    # Campos derivados para los listados (min_price, in_stock) y versión para los ETag
+    product_dict.update(derived_fields(product_dict))
+    product_dict["version"] = 1
+    product_dict["updated_at"] = datetime.now(timezone.utc)
+
+    # Insertamos. Las comprobaciones de arriba no bastan si dos altas llegan a la vez:
+    # el índice único slug_unique decide
+    try:
+        result = await db.products.insert_one(product_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Slug already exists")
     
     # Construimos la respuesta con el ID generado
     product_dict["id"] = str(result.inserted_id)
+    home_snapshot.product_created(product_dict)
+    product_search.upsert(product_dict)
+    catalog_facets.invalidate()
+    await bump_catalog_version()
+    await response_cache.purge("catalog", "home")
+    await _record_product(+1, product_dict["id"])
     return product_dict
 
 @router.put("/{product_id}", response_model=ProductOut)
@@ -160,13 +471,28 @@ async def update_product(
             raise HTTPException(status_code=409, detail="Slug already exists")
 
     # Update Document in MongoDB
-    result = await db.products.update_one(
-        {"_id": ObjectId(product_id)},
-        {"$set": product_dict}
-    )
+    try:
+        result = await db.products.update_one(
+            {"_id": ObjectId(product_id)},
+            touch({"$set": product_dict})
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Slug already exists")
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+
+    # Precio o stock pueden haber cambiado: recalculamos min_price/in_stock en MongoDB
+    await refresh_derived_fields(db.products, [product_id])
+
+    # Puede ser uno de los destacados de la home: que se regenere en la próxima lectura
+    home_snapshot.invalidate()
+    updated = await db.products.find_one({"_id": ObjectId(product_id)})
+    if updated:
+        product_search.upsert(updated)
+    catalog_facets.invalidate()
+    await bump_catalog_version()
+    await response_cache.purge(f"product:{product_id}", "catalog", "home")
         
     product_dict["id"] = product_id
     return product_dict
@@ -186,53 +512,59 @@ async def delete_product(
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+
+    home_snapshot.product_deleted(product_id)
+    product_search.remove(product_id)
+    catalog_facets.invalidate()
+    await bump_catalog_version()
+    await response_cache.purge(f"product:{product_id}", "catalog", "home")
+    await _record_product(-1, product_id)
     
     return None
 
 @router.get("/types/list")
-async def get_product_types():
+@cached(ttl=300, tags=["catalog"])
+async def get_product_types(request: Request, response: Response):
     """
     Retorna una lista única de todos los tipos de productos disponibles en la DB.
     Útil para llenar dropdowns o filtros en el frontend.
+    Sale de las facetas cacheadas (ver /facets) en lugar de un distinct() por llamada,
+    y comparte su ETag: con If-None-Match responde 304.
     """
-    # distinct() es muy eficiente en Mongo para esto
-    types = await db.products.distinct("type")
+    _, facets_etag = await catalog_facets.get()
+    etag = make_etag("types", facets_etag)
+    if is_fresh(request, etag):
+        return not_modified(etag, validators(etag))
+    response.headers.update(validators(etag))
+    types = await catalog_facets.types()
     
     # Agregamos "Todos" como opción por defecto para la UI
     return {"types": ["Todos"] + types}
 
-@router.post("/upload-image", status_code=201)
+# El cuerpo no se declara como parámetro (File(...)): FastAPI lo leería entero antes de
+# comprobar el token. Se documenta aquí y lo lee image_pipeline.save_request
+_UPLOAD_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+}}}}}
+
+@router.post("/upload-image", status_code=201, openapi_extra=_UPLOAD_BODY)
 async def upload_product_image(
-    file: UploadFile = File(...),
+    request: Request,
     current_admin: dict = Depends(get_current_admin_user)
 ):
     """
-    Sube una imagen al servidor en la carpeta estática "uploads/".
-    Devuelve la URL pública para ser usada en el frontend.
-    Solo administradores.
+    Sube una imagen al servidor en la carpeta estática "uploads/" (multipart, campo 'file').
+    Genera variantes WebP (thumb, medium, full) y devuelve sus URLs públicas;
+    'url' es la variante "full" (la que se guarda en image_url).
+    La misma imagen subida dos veces reutiliza los mismos archivos.
+    Solo administradores: sin token válido se responde 401 sin leer el cuerpo.
     """
-    # Validaciones básicas de tipo
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(400, "File must be an image")
-        
-    # Crear directorio si no existe por algún motivo
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generar un nombre seguro y único usando UUID
-    extension = file.filename.split(".")[-1]
-    secure_filename = f"{uuid.uuid4().hex}.{extension}"
-    file_path = os.path.join(upload_dir, secure_filename)
-    
-    # Guardar en disco local de forma binaria
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(500, f"Error saving file: {e}")
-        
-    # Retornar la URL estática (ej: http://localhost:8000/uploads/uuid.png)
-    # Como Vite ya tiene un proxy o el .env la base_url, retornamos solo la ruta relativa absoluta
-    image_url = f"http://localhost:8000/uploads/{secure_filename}"
-    
-    return {"url": image_url}
+    names = await image_pipeline.save_request(request)
+    variants = {variant: _upload_url(request, name) for variant, name in names.items()}
+    return {"url": variants["full"], "variants": variants}
+
+def _upload_url(request: Request, name: str) -> str:
+    if settings.uploads_base_url:
+        return f"{settings.uploads_base_url.rstrip('/')}/{name}"
+    # Host y esquema de la propia petición (en vez de un http://localhost:8000 fijo)
+    return str(request.url_for("uploads", path=name))
@@ -1,3 +1,4 @@
+from typing import Dict
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -18,6 +19,43 @@ class Settings(BaseSettings):
     mongo_uri: str = "mongodb://localhost:27017"
     # Nombre de la base de datos dentro de MongoDB
     mongo_db: str = "webpoke"
+    # Crear en el arranque los índices que falten (ver app/db/indexes.py).
+    # En colecciones grandes puede preferirse lanzarlos aparte: python -m app.db.indexes build
+    build_indexes_on_startup: bool = True
+
+    # --- Pool de conexiones de MongoDB (ver app/db/database.py) ---
+    # Tienen prioridad sobre las mismas opciones en MONGO_URI. Son por worker:
+    # con app.serve el total de conexiones es SERVER_WORKERS x MONGO_MAX_POOL_SIZE.
+    # GET /api/v1/admin/runtime muestra conexiones en uso y espera media/máxima del pool.
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    # Cierra conexiones ociosas más de este tiempo (0 = nunca)
+    mongo_max_idle_time_ms: int = 0
+    # Espera máxima por una conexión libre del pool antes de fallar (0 = sin límite)
+    mongo_wait_queue_timeout_ms: int = 0
+    mongo_server_selection_timeout_ms: int = 30000
+    mongo_connect_timeout_ms: int = 20000
+    # Timeout de lectura/escritura en el socket (0 = sin límite)
+    mongo_socket_timeout_ms: int = 0
+    # Compresión de la red, en orden de preferencia (ej: "zstd,snappy,zlib"). zstd y snappy
+    # requieren pip install "pymongo[zstd,snappy]"; zlib viene con Python. El servidor elige
+    # la primera que soporte. Vacío = sin compresión (lo mejor con MongoDB en la misma máquina)
+    mongo_compressors: str = ""
+    # primary, primaryPreferred, secondary, secondaryPreferred o nearest.
+    # Las transacciones del checkout leen siempre del primario
+    mongo_read_preference: str = "primary"
+
+    # --- Lecturas en réplicas (ver READ_ROUTES en app/db/database.py) ---
+    # Read preference de las lecturas que toleran retraso (catálogo, facetas, home, dashboard):
+    # secondaryPreferred, secondary, nearest o primaryPreferred. Sin replica set van al único servidor
+    mongo_replica_read_preference: str = "secondaryPreferred"
+    # Retraso máximo de un secundario para recibirlas (mínimo 90 según MongoDB; -1 = sin límite)
+    mongo_max_staleness_seconds: int = 90
+    # Cambios por ruta, en JSON: '{"home": "primary", "orders.history": "replica"}'
+    mongo_read_routes: Dict[str, str] = {}
+    # Tareas únicas del arranque (índices, campos derivados, rollups del dashboard).
+    # python -m app.serve las ejecuta una vez en el proceso padre y las desactiva en los workers
+    startup_maintenance: bool = True
     
     # --- Seguridad (JWT) ---
     # ¡CRÍTICO! Esta clave secreta se usa para firmar los tokens. 
@@ -32,6 +70,128 @@ class Settings(BaseSettings):
     # Tiempo de vida del token de refresco (largo para usabilidad, permite "recordar sesión", ej: 30 días)
     refresh_token_expires_min: int = 43200
 
+    # --- Servidor de producción (python -m app.serve) ---
+    server_host: str = "0.0.0.0"
+    server_port: int = 8000
+    # Número de workers (procesos). 0 = uno por núcleo disponible
+    server_workers: int = 0
+    # Segundos que un worker saliente (parada o reinicio con SIGHUP) espera a las peticiones en curso
+    server_graceful_timeout: int = 30
+    # IPs del proxy (nginx) de las que se acepta X-Forwarded-For; el rate limit usa la IP resultante
+    server_forwarded_allow_ips: str = "127.0.0.1"
+
+    # --- Rate limiting (ver app/core/limiter.py) ---
+    # "memory://" (por worker) o "redis://localhost:6379/1" (compartido entre workers).
+    # Síncrono: bloquea el event loop en cada comprobación, así que nada de "mongodb://"
+    rate_limit_storage_uri: str = "memory://"
+    # "sliding-window-counter" (O(1) por clave), "fixed-window" o "moving-window"
+    rate_limit_strategy: str = "sliding-window-counter"
+
+    # --- Hashing de contraseñas (bcrypt) ---
+    # Factor de coste de bcrypt (2^rounds iteraciones). Cada +1 duplica el tiempo de cálculo.
+    # Los hashes ya guardados conservan su propio coste, así que cambiarlo no invalida contraseñas.
+    bcrypt_rounds: int = 12
+    # Pool donde se ejecuta bcrypt para no bloquear el event loop: "thread" o "process".
+    # bcrypt libera el GIL, así que "thread" suele bastar; "process" aísla aún más la CPU.
+    password_hash_executor: str = "thread"
+    # Número de workers del pool (0 = uno por núcleo de CPU)
+    password_hash_workers: int = 2
+    # Máximo de operaciones esperando turno en el pool. Por encima se rechaza con 503
+    # en lugar de acumular logins que acabarían expirando en el cliente.
+    password_hash_max_queue: int = 32
+
+    # --- Caché de usuarios autenticados ---
+    # Evita ir a MongoDB en cada petición autenticada para reconstruir el mismo usuario.
+    # El TTL es el desfase máximo entre workers cuando un usuario cambia (rol, desactivación...).
+    user_cache_enabled: bool = True
+    user_cache_ttl_seconds: float = 30.0
+    user_cache_max_entries: int = 10000
+
+    # --- Home (/api/v1/home) ---
+    # Antigüedad máxima (s) del snapshot en memoria antes de reconstruirlo desde MongoDB.
+    # Acota el desfase con escrituras que haya procesado otro worker.
+    home_snapshot_max_age_seconds: float = 60.0
+    # max-age de la cabecera Cache-Control que enviamos a navegadores/CDN
+    home_cache_control_max_age: int = 30
+
+    # --- Catálogo ---
+    # Segundos que se reutiliza el total de una búsqueda filtrada en la paginación por cursor
+    catalog_count_cache_ttl_seconds: float = 30.0
+    # Motor de búsqueda de productos:
+    # - "memory": índice invertido en proceso con prefijos y tolerancia a erratas
+    #   ("pika" encuentra "Pikachu", como la regex original)
+    # - "text": índice de texto de MongoDB (solo palabras completas, ranking por textScore);
+    #   para catálogos que no caben en memoria de cada worker
+    # - "regex": regex sobre el nombre (sin índice; solo para catálogos pequeños)
+    product_search_backend: str = "memory"
+    # Antigüedad máxima (s) del índice en memoria antes de reconstruirlo desde MongoDB
+    search_index_max_age_seconds: float = 300.0
+    # Antigüedad máxima (s) de las facetas del catálogo (tipos, precios, disponibilidad).
+    # Crear/editar/borrar productos las invalida al momento; esto acota el desfase por ventas
+    catalog_facets_max_age_seconds: float = 60.0
+
+    # --- Caché de respuestas GET (ver app/core/response_cache.py) ---
+    # "memory" (LRU por worker), "redis" (compartida; requiere el paquete redis) o "none"
+    response_cache_backend: str = "memory"
+    response_cache_max_entries: int = 5000
+    response_cache_redis_url: str = "redis://localhost:6379/0"
+
+    # --- Actividad de usuarios (ver app/services/activity_queue.py) ---
+    # Los eventos se aceptan al momento (202) y se escriben en lotes con insert_many
+    # al llegar a 'batch_size' eventos o cada 'flush_interval' segundos
+    activity_queue_batch_size: int = 200
+    activity_queue_flush_interval_seconds: float = 1.0
+    # Eventos máximos esperando en memoria por worker. Por encima se responde 503
+    activity_queue_max_pending: int = 10000
+    # Días que se conservan los eventos (índice TTL sobre 'timestamp'; 0 = sin caducidad).
+    # Cambiarlo en una BD existente requiere collMod o recrear el índice (ver 'indexes check')
+    activity_retention_days: int = 90
+    # Últimos eventos de cada usuario en memoria: el feed se sirve sin ir a MongoDB.
+    # El TTL acota el desfase con eventos registrados por otros workers
+    activity_feed_cache_enabled: bool = True
+    activity_feed_cache_ttl_seconds: float = 30.0
+    activity_feed_cache_max_users: int = 10000
+
+    # --- Imágenes subidas (ver app/services/image_pipeline.py) ---
+    # Carpeta donde se guardan las imágenes y sus variantes (servida en /uploads)
+    uploads_dir: str = "uploads"
+    # Tamaño máximo de una imagen subida (bytes). Por encima se responde 413
+    upload_max_bytes: int = 10 * 1024 * 1024
+    # Procesos que generan las variantes WebP (0 = uno por núcleo de CPU)
+    image_workers: int = 2
+    # URL pública de la carpeta (ej: un CDN). Vacío: se deriva de la petición (http://host/uploads)
+    uploads_base_url: str = ""
+    # Si se define (ej: "/_uploads"), /uploads responde solo cabeceras con X-Accel-Redirect
+    # hacia esa location interna y nginx sirve el archivo (ver README)
+    uploads_accel_redirect_prefix: str = ""
+
+    # --- Serialización ---
+    # Si se activa, los endpoints de lectura (productos, pedidos, actividad) codifican los
+    # documentos de MongoDB directamente a JSON con orjson, sin construir ni validar modelos
+    # Pydantic (ver app/core/serialization.py)
+    fast_json_responses: bool = False
+
+    # --- Checkout ---
+    # Cómo se descuenta el stock al crear un pedido (ver OrderRepository.create_with_transaction):
+    # "auto" (transacción si hay replica set, si no "bulk"), "transaction", "bulk" o "sequential"
+    checkout_mode: str = "auto"
+    # Reservas de stock (modo "bulk") más antiguas que esto se consideran huérfanas
+    # (el worker murió a mitad de checkout) y se liberan en el arranque
+    reservation_timeout_seconds: float = 300.0
+
+    # --- Ledger de stock en memoria (flash sales) ---
+    # Si se activa, cada worker toma stock de MongoDB por lotes y admite pedidos contra
+    # sus contadores locales (ver app/services/stock_ledger.py). Nunca sobrevende.
+    stock_ledger_enabled: bool = False
+    # Unidades que se reservan de golpe en MongoDB cuando el contador local se agota
+    stock_ledger_chunk: int = 20
+    # Cada cuánto se vuelcan a MongoDB las ventas acumuladas (sold_count) y el estado de los lotes
+    stock_ledger_flush_interval_seconds: float = 1.0
+    # Un lote sin latido durante este tiempo pertenece a un worker caído y se devuelve al stock
+    stock_ledger_lease_ttl_seconds: float = 60.0
+    # Stock local sin ventas durante este tiempo se devuelve para que otros workers lo vendan
+    stock_ledger_idle_return_seconds: float = 5.0
+
     # Configuración de Pydantic para leer el archivo .env
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
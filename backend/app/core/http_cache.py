@@ -0,0 +1,68 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from starlette.requests import Request
+from starlette.responses import Response
+
+# --- Caché HTTP (ETag / peticiones condicionales) ---
+# Un ETag es una "huella" del contenido de la respuesta. El navegador la guarda y
+# la reenvía en 'If-None-Match'; si no ha cambiado, respondemos 304 sin cuerpo
+# y el cliente reutiliza su copia (ahorramos serialización y ancho de banda).
+
+def make_etag(*parts) -> str:
+    """Genera un ETag fuerte a partir de cualquier combinación de valores (bytes o str)."""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Comprueba si el ETag actual aparece en la cabecera If-None-Match del cliente."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Comparación débil (RFC 9110): ignoramos el prefijo W/
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def http_date(value: datetime) -> str:
+    """Fecha en formato HTTP (Last-Modified). MongoDB devuelve fechas naive en UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def is_fresh(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    ¿La copia del cliente sigue siendo válida?
+    If-None-Match manda; If-Modified-Since solo se mira si no viene (RFC 9110 §13.2.2).
+    """
+    if request.headers.get("if-none-match") is not None:
+        return etag_matches(request, etag)
+    since = request.headers.get("if-modified-since")
+    if not since or last_modified is None:
+        return False
+    try:
+        since_date = parsedate_to_datetime(since)
+    except (TypeError, ValueError):
+        return False
+    if since_date.tzinfo is None:
+        since_date = since_date.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Las fechas HTTP tienen resolución de segundos
+    return last_modified.replace(microsecond=0) <= since_date
+
+def validators(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    """Cabeceras ETag/Last-Modified, más no-cache: el navegador guarda la copia pero revalida siempre."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    """Respuesta 304 con las cabeceras de validación que exige el estándar."""
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag})
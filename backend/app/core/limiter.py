@@ -1,5 +1,47 @@
+from jose import JWTError, jwt
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from starlette.requests import Request
+from app.core.config import settings
 
-# Limitador basado en la IP del cliente
-limiter = Limiter(key_func=get_remote_address)
+# --- Rate limiting ---
+# slowapi delega el conteo en la librería 'limits'. Dos piezas configurables:
+# - Algoritmo (RATE_LIMIT_STRATEGY): "sliding-window-counter" por defecto. Guarda dos
+#   contadores por clave (ventana actual y anterior) y pondera la anterior: memoria O(1)
+#   por clave y sin las ráfagas de 2x en el borde de ventana del "fixed-window".
+#   "moving-window" es exacto pero guarda un timestamp por petición.
+# - Almacenamiento (RATE_LIMIT_STORAGE_URI): "memory://" cuenta por worker (con N workers
+#   de uvicorn el límite efectivo es N veces el declarado). Para compartirlo entre workers:
+#   "redis://localhost:6379/1" (pip install redis), a ser posible local (latencia < 1 ms).
+#   Las llamadas al almacenamiento son síncronas y bloquean el event loop del worker en
+#   cada petición limitada: no usar "mongodb://" ni un Redis remoto.
+#   Si el almacenamiento compartido falla, se sigue limitando en memoria en cada worker.
+
+def _request_token(request: Request):
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    return request.cookies.get("access_token")
+
+def rate_limit_key(request: Request) -> str:
+    """
+    Clave del límite: "user:<id>" si la petición trae un token válido y "ip:<ip>" si no.
+    Solo comprueba la firma (sin ir a MongoDB): basta para repartir cuotas, no para autorizar.
+    """
+    token = _request_token(request)
+    if token:
+        try:
+            subject = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_alg]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            pass
+    return f"ip:{get_remote_address(request)}"
+
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=settings.rate_limit_storage_uri,
+    strategy=settings.rate_limit_strategy,
+    key_prefix="webpoke",
+    in_memory_fallback_enabled=True,
+)
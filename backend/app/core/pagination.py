@@ -0,0 +1,110 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+
+# --- Paginación por cursor (keyset) ---
+# En lugar de .skip(n) (que obliga a MongoDB a recorrer y descartar n documentos),
+# recordamos el último elemento devuelto y pedimos "los siguientes a este" con un
+# filtro sobre (campo_de_orden, _id). Con un índice adecuado, cada página cuesta
+# lo mismo sin importar lo profunda que sea. El _id desempata valores repetidos
+# y hace el orden estable.
+#
+# El cursor que ve el cliente es opaco: JSON en base64url. No debe interpretarlo.
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+    return value
+
+def parse_sort(sort: str) -> Tuple[str, int]:
+    """'-price' -> ('price', -1); 'name' -> ('name', 1)."""
+    if sort.startswith("-"):
+        return sort[1:], -1
+    return sort, 1
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def _pack(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _unpack(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError):
+        raise _invalid_cursor()
+    if not isinstance(payload, dict):
+        raise _invalid_cursor()
+    return payload
+
+def encode_cursor(sort: str, doc: dict, **extra) -> str:
+    """Construye el cursor que apunta justo después de 'doc' para el orden 'sort'."""
+    field, _ = parse_sort(sort)
+    payload = {"s": sort, "id": str(doc["_id"]), **extra}
+    if field != "_id":
+        payload["v"] = _dump_value(doc.get(field))
+    return _pack(payload)
+
+def decode_cursor(token: str, sort: Optional[str] = None) -> dict:
+    """
+    Decodifica un cursor y comprueba que corresponda al mismo orden solicitado.
+    Lanza HTTP 400 si está corrupto o es de otra consulta.
+    """
+    invalid = _invalid_cursor()
+    payload = _unpack(token)
+    if not ObjectId.is_valid(payload.get("id", "")):
+        raise invalid
+    if sort is not None and payload.get("s") != sort:
+        raise invalid
+    payload["id"] = ObjectId(payload["id"])
+    if "v" in payload:
+        payload["v"] = _load_value(payload["v"])
+    return payload
+
+def keyset_filter(sort: str, cursor: dict) -> dict:
+    """Filtro MongoDB para 'documentos posteriores al cursor' según el orden (campo, _id)."""
+    field, direction = parse_sort(sort)
+    op = "$gt" if direction == 1 else "$lt"
+    if field == "_id":
+        return {"_id": {op: cursor["id"]}}
+    value = cursor.get("v")
+    return {"$or": [
+        {field: {op: value}},
+        {field: value, "_id": {op: cursor["id"]}},
+    ]}
+
+def sort_spec(sort: str) -> list:
+    """Especificación para .sort(): el campo pedido y _id en la misma dirección como desempate."""
+    field, direction = parse_sort(sort)
+    if field == "_id":
+        return [("_id", direction)]
+    return [(field, direction), ("_id", direction)]
+
+# Para órdenes que no se pueden expresar como filtro (ej: relevancia de una búsqueda),
+# el cursor simplemente transporta la posición. Sigue siendo opaco para el cliente.
+
+def encode_offset_cursor(kind: str, offset: int) -> str:
+    return _pack({"s": kind, "o": offset})
+
+def decode_offset_cursor(token: str, kind: str) -> int:
+    payload = _unpack(token)
+    offset = payload.get("o")
+    if payload.get("s") != kind or not isinstance(offset, int) or offset < 0:
+        raise _invalid_cursor()
+    return offset
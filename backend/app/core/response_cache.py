@@ -0,0 +1,337 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response
+from app.core.config import settings
+from app.core.http_cache import etag_matches, not_modified
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - Redis es opcional (backend "redis")
+    aioredis = None
+
+logger = logging.getLogger("api.cache")
+
+# --- Caché de respuestas GET ---
+# Las rutas se marcan con @cached(...) y sus routers usan route_class=CachedRoute.
+# La respuesta ya serializada (bytes + cabeceras) se guarda con una clave formada por
+# ruta, query normalizada y ámbito (público o el usuario autenticado), y se etiqueta
+# con las entidades de las que depende ("product:<id>", "catalog", "home"...).
+# Las escrituras purgan por etiqueta con `await response_cache.purge(...)`.
+#
+# Backends:
+# - "memory": LRU por worker. Cada worker purga lo suyo; el TTL acota el desfase
+#   con escrituras procesadas por otros workers.
+# - "redis": compartido entre workers y réplicas (pip install redis).
+# - "none": desactivada.
+
+Handler = Callable[[Request], Awaitable[Response]]
+
+# Cabeceras que no se guardan: las recalcula Response o no deben compartirse entre clientes
+_SKIPPED_HEADERS = {"content-length", "set-cookie", "x-cache"}
+
+@dataclass
+class CachePolicy:
+    ttl: float
+    # Etiquetas con placeholders de path_params y {scope}: "product:{product_id}", "orders:{scope}"
+    tags: Tuple[str, ...] = ()
+    # True: una entrada por usuario autenticado (sin token válido no se cachea)
+    per_user: bool = False
+
+def cached(ttl: float, tags: Iterable[str] = (), per_user: bool = False):
+    """
+    Marca un endpoint GET como cacheable. El router debe usar route_class=CachedRoute.
+
+        @router.get("/{product_id}")
+        @cached(ttl=60, tags=["product:{product_id}"])
+        async def read_product(...): ...
+    """
+    def decorator(endpoint):
+        endpoint.__response_cache__ = CachePolicy(ttl, tuple(tags), per_user)
+        return endpoint
+    return decorator
+
+def cache_tags(request: Request, *tags: str):
+    """Añade etiquetas conocidas solo dentro del endpoint (ej: el ID de un producto buscado por slug)."""
+    request.state.cache_tags = [*getattr(request.state, "cache_tags", []), *tags]
+
+def _encode(headers: List[Tuple[str, str]], body: bytes) -> bytes:
+    # Formato compacto independiente del backend: cabeceras en JSON, salto de línea y cuerpo
+    return json.dumps(headers, separators=(",", ":")).encode("utf-8") + b"\n" + body
+
+def _decode(entry: bytes) -> Tuple[List[Tuple[str, str]], bytes]:
+    headers, _, body = entry.partition(b"\n")
+    return json.loads(headers), body
+
+class MemoryBackend:
+    """LRU en proceso con TTL por entrada e índice de etiqueta -> claves."""
+    name = "memory"
+
+    def __init__(self, max_entries: int, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[float, Tuple[str, ...], bytes]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self._clock():
+            self._drop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry[2]
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]):
+        self._drop(key)
+        tags = tuple(tags)
+        self._data[key] = (self._clock() + ttl, tags, value)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.max_entries:
+            self._drop(next(iter(self._data)))
+
+    async def purge(self, tags: Iterable[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.get(tag, set())
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    def _drop(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class RedisBackend:
+    """Compartido entre workers: cada etiqueta es un SET de claves en Redis."""
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "respcache:"):
+        if aioredis is None:
+            raise RuntimeError("response_cache_backend='redis' requires the 'redis' package (pip install redis)")
+        self._redis = aioredis.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(self._prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.set(self._prefix + key, value, px=int(ttl * 1000))
+        for tag in tags:
+            tag_key = f"{self._prefix}tag:{tag}"
+            pipe.sadd(tag_key, self._prefix + key)
+            # El SET de la etiqueta no debe sobrevivir mucho a sus entradas
+            pipe.expire(tag_key, int(ttl) + 60)
+        await pipe.execute()
+
+    async def purge(self, tags: Iterable[str]) -> int:
+        tag_keys = [f"{self._prefix}tag:{tag}" for tag in tags]
+        keys = await self._redis.sunion(tag_keys) if tag_keys else set()
+        if keys or tag_keys:
+            await self._redis.delete(*keys, *tag_keys)
+        return len(keys)
+
+class ResponseCache:
+    def __init__(self, backend=None):
+        self.backend = backend
+        # Un solo relleno por clave: el resto de peticiones esperan su resultado
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Número de purga y, mientras haya rellenos en curso, la última purga de cada etiqueta:
+        # un relleno no debe guardar datos de una etiqueta purgada después de empezar
+        self._epoch = 0
+        self._purged: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stores = 0
+        self.purges = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def serve(self, request: Request, policy: CachePolicy, handler: Handler) -> Response:
+        if request.method != "GET" or not self.enabled:
+            return await handler(request)
+
+        scope = "public"
+        if policy.per_user:
+            scope = await _user_scope(request)
+            if scope is None:
+                # Sin credenciales válidas: que el endpoint responda su 401 de siempre
+                return await handler(request)
+        key = _cache_key(request, scope)
+
+        entry = await self._backend_get(key)
+        if entry is not None:
+            self.hits += 1
+            return _respond(request, entry)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            entry = await asyncio.shield(inflight)
+            if entry is not None:
+                return _respond(request, entry)
+            return await handler(request)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        epoch = self._epoch
+        entry = None
+        try:
+            response = await handler(request)
+            entry = _entry(response)
+            if entry is not None:
+                tags = [tag.format(scope=scope, **request.path_params) for tag in policy.tags]
+                tags += getattr(request.state, "cache_tags", [])
+                if any(self._purged.get(tag, 0) > epoch for tag in tags):
+                    # Purgado mientras se calculaba: puede estar obsoleto, no se comparte
+                    entry = None
+                else:
+                    await self._backend_set(key, entry, policy.ttl, tags)
+        finally:
+            del self._inflight[key]
+            if not self._inflight:
+                # Ningún relleno empezó antes de estas purgas
+                self._purged.clear()
+            future.set_result(entry)
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    async def purge(self, *tags: str):
+        """Invalida todas las respuestas etiquetadas con cualquiera de 'tags'."""
+        self._epoch += 1
+        if self._inflight:
+            for tag in tags:
+                self._purged[tag] = self._epoch
+        if not self.enabled or not tags:
+            return
+        self.purges += 1
+        try:
+            await self.backend.purge(tags)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Response cache purge failed for {tags}: {e}")
+
+    async def _backend_get(self, key: str) -> Optional[bytes]:
+        # Un backend caído (ej: Redis) no debe tumbar la API: se comporta como un fallo de caché
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Response cache read failed: {e}")
+            return None
+
+    async def _backend_set(self, key: str, entry: bytes, ttl: float, tags: List[str]):
+        try:
+            await self.backend.set(key, entry, ttl, tags)
+            self.stores += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Response cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        stats = {
+            "backend": self.backend.name if self.backend else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stores": self.stores,
+            "purges": self.purges,
+            "errors": self.errors,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+        if isinstance(self.backend, MemoryBackend):
+            stats["entries"] = len(self.backend)
+        return stats
+
+def _cache_key(request: Request, scope: str) -> str:
+    # Query normalizada: mismo resultado para ?a=1&b=2 y ?b=2&a=1, sin parámetros vacíos
+    params = sorted((k, v) for k, v in parse_qsl(request.url.query, keep_blank_values=False))
+    return f"{scope}|{request.url.path}?{urlencode(params)}"
+
+async def _user_scope(request: Request) -> Optional[str]:
+    # Misma validación que get_current_user (firma, usuario activo, token no revocado)
+    from app.core.security import get_current_user, oauth2_scheme
+    try:
+        user = await get_current_user(await oauth2_scheme(request))
+    except HTTPException:
+        return None
+    return f"user:{user['id']}"
+
+def _entry(response: Response) -> Optional[bytes]:
+    body = getattr(response, "body", None)
+    if response.status_code != 200 or body is None:
+        return None
+    headers = []
+    for name, value in response.raw_headers:
+        name = name.decode("latin-1").lower()
+        if name == "set-cookie":
+            # Nunca compartir una respuesta que fija cookies
+            return None
+        if name not in _SKIPPED_HEADERS:
+            headers.append((name, value.decode("latin-1")))
+    return _encode(headers, body)
+
+def _respond(request: Request, entry: bytes) -> Response:
+    headers, body = _decode(entry)
+    etag = next((value for name, value in headers if name == "etag"), None)
+    if etag is not None and etag_matches(request, etag):
+        validators = {name: value for name, value in headers if name in ("cache-control", "last-modified")}
+        return not_modified(etag, {**validators, "X-Cache": "HIT"})
+    response = Response(content=body)
+    response.raw_headers = [
+        *[(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        (b"content-length", str(len(body)).encode("latin-1")),
+        (b"x-cache", b"HIT"),
+    ]
+    return response
+
+class CachedRoute(APIRoute):
+    """APIRoute que aplica la política @cached del endpoint (si la tiene)."""
+
+    def get_route_handler(self) -> Handler:
+        handler = super().get_route_handler()
+        policy = getattr(self.endpoint, "__response_cache__", None)
+        if policy is None:
+            return handler
+
+        async def cached_handler(request: Request) -> Response:
+            return await response_cache.serve(request, policy, handler)
+
+        return cached_handler
+
+def _make_backend():
+    backend = settings.response_cache_backend
+    if backend == "memory":
+        return MemoryBackend(settings.response_cache_max_entries)
+    if backend == "redis":
+        return RedisBackend(settings.response_cache_redis_url)
+    return None
+
+response_cache = ResponseCache(_make_backend())
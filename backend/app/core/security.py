@@ -1,10 +1,16 @@
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
 from jose import jwt, JWTError
+import asyncio
 import bcrypt
 import hashlib
+import multiprocessing
+import os
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.db import db
 
@@ -71,7 +77,7 @@ def hash_password(password: str) -> str:
     ¡NUNCA almacenes contraseñas en texto plano!
     """
     p_bytes = _prepare_password(password)
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
     return bcrypt.hashpw(p_bytes, salt).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
@@ -83,7 +89,90 @@ def verify_password(password: str, hashed: str) -> bool:
     hashed_bytes = hashed.encode('utf-8')
     return bcrypt.checkpw(p_bytes, hashed_bytes)
 
-def create_token(subject: str, minutes: int):
+class PasswordHasherPool:
+    """
+    Pool acotado para ejecutar bcrypt fuera del event loop.
+
+    bcrypt tarda ~200-300 ms por operación (a propósito). Si se llama desde un
+    endpoint async, congela TODO el worker de uvicorn durante ese tiempo.
+    Aquí lo delegamos a un pool de threads o procesos y limitamos cuántas
+    operaciones pueden esperar turno: si la cola está llena, rechazamos al
+    instante con 503 en vez de encolar logins que nunca llegarían a tiempo.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int):
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # "spawn" evita heredar el estado del event loop y del cliente de Mongo del padre
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    async def run(self, func, *args):
+        # Solo se modifica desde el event loop, así que no necesita lock
+        if self._in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_pool = PasswordHasherPool(
+    settings.password_hash_executor,
+    settings.password_hash_workers,
+    settings.password_hash_max_queue,
+)
+
+async def hash_password_async(password: str) -> str:
+    """
+    Versión no bloqueante de hash_password para usar dentro de endpoints async.
+    Lanza HTTP 503 si el pool de hashing está saturado.
+    """
+    return await password_pool.run(hash_password, password)
+
+async def verify_password_async(password: str, hashed: str) -> bool:
+    """
+    Versión no bloqueante de verify_password para usar dentro de endpoints async.
+    Lanza HTTP 503 si el pool de hashing está saturado.
+    """
+    return await password_pool.run(verify_password, password, hashed)
+
+def create_token(subject: str, minutes: int, token_version: int = 0):
     """
     Genera un Token JWT (JSON Web Token).
     La clave secreta (settings.jwt_secret) garantiza que el token no ha sido modificado.
@@ -92,15 +181,29 @@ def create_token(subject: str, minutes: int):
     - sub (subject): ID del usuario
     - exp (expiration): fecha de caducidad
     - iat (issued at): fecha de creación
+    Y uno propio:
+    - ver: 'token_version' del usuario al emitirlo. Incrementarlo en la BD revoca los tokens anteriores.
     """
     expire = datetime.now(timezone.utc) + timedelta(minutes=minutes)
     to_encode = {
         "sub": subject,
         "exp": expire,
-        "iat": datetime.now(timezone.utc)
+        "iat": datetime.now(timezone.utc),
+        "ver": token_version,
     }
     return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_alg)
 
+# Caché de usuarios por (user_id, token_version).
+# Guardamos el documento SIN el hash de la contraseña.
+user_cache = TTLCache(settings.user_cache_ttl_seconds, settings.user_cache_max_entries)
+
+def invalidate_user_cache(user_id: str):
+    """
+    Descarta las entradas cacheadas de un usuario.
+    Debe llamarse al desactivarlo, cambiar su rol o incrementar su token_version.
+    """
+    user_cache.invalidate_where(lambda key: key[0] == user_id)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Dependencia de FastAPI CRUCIAL para proteger endpoints.
@@ -112,7 +215,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     1. Extrae el token del header Authorization: Bearer <token>.
     2. Decodifica y valida la firma del token con jwt.decode.
     3. Extrae el user_id (sub).
-    4. Verifica que el usuario exista en la base de datos (seguridad adicional).
+    4. Busca el usuario en la caché en memoria por (user_id, ver); si no está,
+       lo lee de la base de datos y comprueba que exista, esté activo y que su
+       token_version coincida con la del token (tokens revocados -> 401).
     5. Retorna el objeto usuario validado.
     
     Si falla cualquier paso, lanza HTTP 401 Unauthorized y detiene la ejecución.
@@ -127,21 +232,37 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
+        token_version = payload.get("ver", 0)
     except JWTError:
         raise credentials_exception
+
+    # Camino rápido: usuario ya validado recientemente para esta misma versión de token
+    cache_key = (user_id, token_version)
+    if settings.user_cache_enabled:
+        cached = user_cache.get(cache_key)
+        if cached is not None:
+            # Copia para que el endpoint no pueda alterar la entrada cacheada
+            return dict(cached)
     
     # Busca en MongoDB por _id (ObjectId)
     # Importante: Validar que el ID sea un ObjectId válido para evitar inyecciones raras (aunque poco probables aquí)
     if not ObjectId.is_valid(user_id):
         raise credentials_exception
         
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"password": 0})
     if user is None:
         # El token es válido pero el usuario fue borrado -> 401
         raise credentials_exception
+
+    if not user.get("is_active", True) or user.get("token_version", 0) != token_version:
+        # Usuario desactivado o token revocado al incrementar token_version -> 401
+        raise credentials_exception
     
     # Normalizamos el ID para que coincida con lo que espera Pydantic (id vs _id)
     user["id"] = str(user.pop("_id"))
+    if settings.user_cache_enabled:
+        user_cache.set(cache_key, user)
+        return dict(user)
     return user
 
 async def get_current_admin_user(current_user: dict = Depends(get_current_user)):
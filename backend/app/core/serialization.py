@@ -0,0 +1,65 @@
+import json
+from datetime import date, datetime
+from typing import Any, Type
+from bson import ObjectId
+from pydantic import BaseModel
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional, json de la stdlib como respaldo
+    orjson = None
+
+# --- Serialización rápida de documentos de MongoDB ---
+# El camino normal construye modelos Pydantic a partir de los dicts de MongoDB, FastAPI
+# los vuelve a validar contra response_model y los pasa por jsonable_encoder.
+# Con settings.fast_json_responses, los endpoints de lectura dan forma a los documentos
+# (mismas claves y valores por defecto que el modelo de respuesta) y los codifican
+# directamente a bytes, sin validar: confiamos en lo que nosotros mismos escribimos.
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dumps(obj: Any) -> bytes:
+    """JSON compacto en bytes. Convierte ObjectId a str y fechas a ISO 8601."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """Respuesta JSON codificada con dumps(); no pasa por response_model ni jsonable_encoder."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+class DocumentShape:
+    """
+    Da a un documento de MongoDB la forma de un modelo de respuesta sin validarlo:
+    _id pasa a id (str), se descartan las claves que el modelo no expone y se
+    rellenan los valores por defecto de los campos ausentes.
+    Los submodelos (ej: items de un pedido) se confían tal y como están guardados.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.fields = frozenset(model.model_fields)
+        self._defaults = {
+            name: field.get_default(call_default_factory=True)
+            for name, field in model.model_fields.items()
+            if not field.is_required()
+        }
+
+    def __call__(self, doc: dict) -> dict:
+        shaped = dict(self._defaults)
+        for key, value in doc.items():
+            if key == "_id":
+                shaped["id"] = str(value)
+            elif key in self.fields:
+                shaped[key] = value
+        return shaped
@@ -0,0 +1,159 @@
+import mimetypes
+import os
+import re
+import stat
+from typing import Callable, Optional, Tuple
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+from app.core.cache import TTLCache
+
+# --- Servido de /uploads ---
+# Las imágenes subidas se nombran por contenido (hash o UUID en las antiguas) y nunca se
+# sobrescriben: el navegador/CDN puede guardarlas un año sin revalidar ("immutable").
+# Sobre StaticFiles (que ya da ETag, Last-Modified, 304 y Range) se añade:
+# - Cache-Control por tipo de nombre y bloques de lectura más grandes.
+# - Caché del stat() de los nombres inmutables: un acierto no pasa por el threadpool.
+# - Variantes precomprimidas (.br/.gz junto al original) para tipos comprimibles (SVG...),
+#   buscadas en el threadpool junto con el stat() y cacheadas con él.
+# - Envío sin copia cuando el servidor ASGI lo soporta (extensión http.response.pathsend).
+# - Modo X-Accel-Redirect: la API solo responde cabeceras y nginx sirve los bytes.
+
+# Nombre por contenido: 32 hex (SHA-256 truncado o UUID) + sufijo de variante opcional
+_CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{32}(-[a-z]+)?\.[a-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+
+# Las imágenes ya van comprimidas: solo se buscan .br/.gz para estos tipos
+_COMPRESSIBLE_TYPES = {"image/svg+xml", "application/json", "text/plain", "text/css", "application/javascript"}
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# (encoding, ruta, stat) de cada variante precomprimida que existe
+Variants = Tuple[Tuple[str, str, os.stat_result], ...]
+
+class _UploadFileResponse(FileResponse):
+    # 64 KB por defecto: con archivos de cientos de KB, bloques más grandes
+    # significan menos vueltas al threadpool por imagen
+    chunk_size = 256 * 1024
+
+    def __init__(self, *args, on_missing: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_missing = on_missing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # FileResponse envía las cabeceras antes de abrir el archivo. Con un stat() cacheado el
+        # archivo puede haberse borrado desde entonces: se retienen hasta el primer bloque para
+        # poder responder 404 (y olvidar el stat()) en lugar de un 500 a medias
+        start = None
+
+        async def held_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is not None:
+                await send(start)
+                start = None
+            await send(message)
+
+        try:
+            await super().__call__(scope, receive, held_send)
+        except FileNotFoundError:
+            if start is None:
+                raise
+            if self.on_missing is not None:
+                self.on_missing()
+            raise HTTPException(status_code=404)
+
+def is_immutable(name: str) -> bool:
+    return _CONTENT_ADDRESSED.match(name) is not None
+
+class UploadFiles(StaticFiles):
+    """StaticFiles para la carpeta de subidas (ver cabecera del módulo)."""
+
+    def __init__(self, directory: str, accel_redirect_prefix: str = "", stat_cache_entries: int = 10000):
+        super().__init__(directory=directory)
+        self.accel_redirect_prefix = accel_redirect_prefix
+        # Un nombre inmutable no cambia de stat(); un borrado manual se detecta al abrirlo
+        # (404 y fuera de la caché) y el TTL acota el resto
+        self._stat_cache = TTLCache(300.0, stat_cache_entries)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # Temporales de subidas en curso (.tmp/, .<nombre>.<uuid>): nunca se sirven
+        if any(part.startswith(".") for part in path.split(os.sep)):
+            raise HTTPException(status_code=404)
+        if scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        cached = self._stat_cache.get(path)
+        if cached is None:
+            try:
+                cached = await anyio.to_thread.run_sync(self._lookup_file, path)
+            except (OSError, ValueError):
+                cached = None
+            if cached is None:
+                # No es un archivo (o la ruta no es válida): la respuesta de StaticFiles (404...)
+                return await super().get_response(path, scope)
+            if is_immutable(os.path.basename(cached[0])):
+                self._stat_cache.set(path, cached)
+        return self._file_response(*cached, scope, on_missing=lambda: self._stat_cache.pop(path))
+
+    def _lookup_file(self, path: str) -> Optional[Tuple[str, os.stat_result, Variants]]:
+        # En el threadpool: todo el acceso a disco antes de construir la respuesta
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        variants = []
+        if mimetypes.guess_type(full_path)[0] in _COMPRESSIBLE_TYPES:
+            for encoding, suffix in _ENCODINGS:
+                try:
+                    variants.append((encoding, full_path + suffix, os.stat(full_path + suffix)))
+                except FileNotFoundError:
+                    continue
+        return full_path, stat_result, tuple(variants)
+
+    def _file_response(
+        self, full_path, stat_result: os.stat_result, variants: Variants, scope: Scope,
+        on_missing: Optional[Callable[[], None]] = None,
+    ) -> Response:
+        name = os.path.basename(full_path)
+        immutable = is_immutable(name)
+        cache_control = IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL
+        request_headers = Headers(scope=scope)
+
+        if self.accel_redirect_prefix:
+            return self._accel_redirect(full_path, cache_control)
+
+        headers = {"cache-control": cache_control}
+        media_type = mimetypes.guess_type(name)[0]
+        if media_type in _COMPRESSIBLE_TYPES:
+            headers["vary"] = "Accept-Encoding"
+            precompressed = self._precompressed(variants, request_headers)
+            if precompressed is not None:
+                encoding, full_path, stat_result = precompressed
+                headers["content-encoding"] = encoding
+
+        response = _UploadFileResponse(
+            full_path, stat_result=stat_result, media_type=media_type, headers=headers, on_missing=on_missing
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _precompressed(self, variants: Variants, request_headers: Headers) -> Optional[Tuple[str, str, os.stat_result]]:
+        accepted = {value.split(";")[0].strip() for value in request_headers.get("accept-encoding", "").split(",")}
+        # En el orden de _ENCODINGS: br antes que gzip
+        return next((variant for variant in variants if variant[0] in accepted), None)
+
+    def _accel_redirect(self, full_path: str, cache_control: str) -> Response:
+        # nginx resuelve la ruta interna y se encarga de ETag, 304, Range y sendfile
+        relative = os.path.relpath(full_path, os.path.realpath(self.directory)).replace(os.sep, "/")
+        if relative.startswith(".."):
+            raise HTTPException(status_code=404)
+        return Response(headers={
+            "X-Accel-Redirect": f"{self.accel_redirect_prefix.rstrip('/')}/{relative}",
+            "Cache-Control": cache_control,
+        }, media_type=mimetypes.guess_type(full_path)[0])
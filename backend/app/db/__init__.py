@@ -1 +1 @@
-from .database import client, db, get_database
+from .database import PRIMARY, READ_ROUTES, REPLICA, causal_session, client, db, get_database, pool_stats, reader
@@ -1,4 +1,11 @@
+import os
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, monitoring
+from pymongo.read_preferences import Nearest, PrimaryPreferred, Secondary, SecondaryPreferred
 from app.core.config import settings
 
 # --- Cliente de Base de Datos Asíncrono ---
@@ -8,22 +15,240 @@ from app.core.config import settings
 # Si usáramos un driver síncrono (como pymongo estándar), bloquearíamos todas las peticiones
 # hasta que la base de datos respondiera, arruinando el rendimiento.
 
-# 1. Crear la conexión global al clúster de MongoDB
-# Esta instancia gestiona un pool de conexiones automáticamente.
-client = AsyncIOMotorClient(settings.mongo_uri)
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Contadores del pool de conexiones del driver, por servidor (host:port).
+
+    `checked_out` son las conexiones en uso ahora mismo y `waiting` las operaciones
+    que esperan una: si `waiting` suele ser > 0 o `wait_max_ms` crece con carga,
+    MONGO_MAX_POOL_SIZE se queda corto para este worker.
+    PyMongo llama al listener desde sus propios hilos, de ahí el lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: dict.fromkeys(
+            ("open", "checked_out", "waiting", "checkouts", "checkout_failures", "cleared", "wait_total", "wait_max"), 0
+        ))
+
+    def _update(self, address, **changes):
+        with self._lock:
+            server = self._servers[f"{address[0]}:{address[1]}"]
+            for field, delta in changes.items():
+                server[field] += delta
+
+    def _waited(self, address, duration: Optional[float]):
+        duration = duration or 0.0
+        with self._lock:
+            server = self._servers[f"{address[0]}:{address[1]}"]
+            server["wait_total"] += duration
+            server["wait_max"] = max(server["wait_max"], duration)
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event): pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1, checkout_failures=1)
+        self._waited(event.address, event.duration)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, waiting=-1, checked_out=1, checkouts=1)
+        self._waited(event.address, event.duration)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            servers = {address: dict(server) for address, server in self._servers.items()}
+        for server in servers.values():
+            wait_total, wait_max = server.pop("wait_total"), server.pop("wait_max")
+            server["wait_avg_ms"] = round(wait_total / server["checkouts"] * 1000, 3) if server["checkouts"] else 0.0
+            server["wait_max_ms"] = round(wait_max * 1000, 3)
+        return servers
+
+pool_stats = PoolStats()
+
+def client_options() -> dict:
+    """Opciones del pool a partir de Settings (tienen prioridad sobre las de MONGO_URI)."""
+    options = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_time_ms or None,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms or None,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "socketTimeoutMS": settings.mongo_socket_timeout_ms or None,
+        "readPreference": settings.mongo_read_preference,
+        "event_listeners": [pool_stats],
+    }
+    if settings.mongo_compressors:
+        options["compressors"] = settings.mongo_compressors
+    return options
+
+# 1. La conexión al clúster de MongoDB
+# Esta instancia gestiona un pool de conexiones automáticamente. Se crea en el arranque
+# de la app (lifespan en main.py) y se cierra al apagarla; scripts y CLIs la crean al
+# primer uso. Un proceso hijo creado con fork no reutiliza el pool del padre: crea el suyo.
+_client: Optional[AsyncIOMotorClient] = None
+_client_pid: Optional[int] = None
+
+def get_client() -> AsyncIOMotorClient:
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = AsyncIOMotorClient(settings.mongo_uri, **client_options())
+        _client_pid = os.getpid()
+        _readers.clear()
+        _topology.clear()
+    return _client
+
+def connect() -> AsyncIOMotorClient:
+    """Crea el cliente (si no existe). Llamado al arrancar la app."""
+    return get_client()
+
+def close():
+    """Cierra el pool de conexiones. Llamado al apagar la app."""
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        _client.close()
+    _client, _client_pid = None, None
+    _readers.clear()
+    _topology.clear()
+
+class _Lazy:
+    """Resuelve el cliente/base de datos actual en cada acceso (db.products, client.admin...)."""
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+client = _Lazy(get_client)
 
 # 2. Seleccionar la base de datos específica
 # En MongoDB, no necesitas crear la base de datos explícitamente antes de usarla.
 # Se creará automáticamente (lazy creation) cuando insertes el primer documento.
-db = client[settings.mongo_db]
+db = _Lazy(lambda: get_client()[settings.mongo_db])
+
+# 3. Enrutado de lecturas (réplicas)
+# 'db' usa MONGO_READ_PREFERENCE. Las lecturas que toleran datos algo atrasados piden en
+# su lugar reader("<ruta>"): con REPLICA van a un secundario con como mucho
+# MONGO_MAX_STALENESS_SECONDS de retraso (o al primario si no hay ninguno así);
+# con PRIMARY, siempre al primario. Las escrituras van siempre al primario.
+# Cada ruta se puede cambiar sin tocar código: MONGO_READ_ROUTES='{"home": "primary"}'.
+# Lo que se cachea o se valida con ETag tras leerlo de una réplica (listados, facetas,
+# home) se lee dentro de causal_session(ruta): nunca más antiguo que el primario al empezar.
+PRIMARY = "primary"
+REPLICA = "replica"
+
+READ_ROUTES = {
+    # Catálogo: listados, facetas e índice de búsqueda en memoria (ya cacheados unos segundos)
+    "catalog.list": REPLICA,
+    "catalog.facets": REPLICA,
+    "catalog.search_index": REPLICA,
+    # Ficha de producto y refresco del carrito: precio y stock al día
+    "catalog.product": PRIMARY,
+    "catalog.batch": PRIMARY,
+    # Home y dashboard de administración
+    "home": REPLICA,
+    "admin.stats": REPLICA,
+    # Lecturas justo después de escribir: historial y confirmación de pedidos
+    "orders.history": PRIMARY,
+    "orders.detail": PRIMARY,
+    # Checkout (stock, reservas): debe quedarse en el primario
+    "orders.checkout": PRIMARY,
+}
+
+_REPLICA_MODES = {
+    "secondaryPreferred": SecondaryPreferred,
+    "secondary": Secondary,
+    "nearest": Nearest,
+    "primaryPreferred": PrimaryPreferred,
+}
+_readers: dict = {}
+_topology: dict = {}
+
+def _route_target(route: str) -> str:
+    return settings.mongo_read_routes.get(route, READ_ROUTES[route])
+
+def read_preference(route: str):
+    """Read preference de la ruta 'route' (ver READ_ROUTES y MONGO_READ_ROUTES)."""
+    target = _route_target(route)
+    if target == PRIMARY:
+        return ReadPreference.PRIMARY
+    if target != REPLICA:
+        raise ValueError(f"Read route '{route}' must be '{PRIMARY}' or '{REPLICA}', not '{target}'")
+    mode = _REPLICA_MODES[settings.mongo_replica_read_preference]
+    return mode(max_staleness=settings.mongo_max_staleness_seconds)
+
+def reader(route: str):
+    """Base de datos para las lecturas de 'route' (reader("catalog.list").products.find(...))."""
+    database = _readers.get(route)
+    if database is None:
+        database = get_client()[settings.mongo_db].with_options(read_preference=read_preference(route))
+        _readers[route] = database
+    return database
+
+def _primary():
+    database = _readers.get(PRIMARY)
+    if database is None:
+        database = get_client()[settings.mongo_db].with_options(read_preference=ReadPreference.PRIMARY)
+        _readers[PRIMARY] = database
+    return database
+
+async def _replicated() -> bool:
+    """¿Hay réplicas de las que leer? (replica set o mongos). Se pregunta una vez por cliente."""
+    if "replicated" not in _topology:
+        hello = await get_client().admin.command("hello")
+        _topology["replicated"] = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _topology["replicated"]
+
+@asynccontextmanager
+async def causal_session(route: str):
+    """
+    Sesión causalmente consistente anclada al primario, para las lecturas de 'route'.
+
+    Empieza con una lectura en el primario; las lecturas que pasen session=... esperan,
+    si van a un secundario, a que este haya replicado hasta ese punto. Así lo que se lee
+    de una réplica incluye toda escritura confirmada antes de abrir la sesión (p. ej. la
+    que provocó el purge de la caché o marcó un snapshot como sucio), y una lectura
+    posterior de la sesión nunca ve datos más antiguos que una anterior.
+    Si la ruta lee del primario o no hay replica set (un único servidor) no hay nada que
+    esperar: devuelve None, sin sesión ni lectura extra, y las lecturas van sin session.
+    """
+    if _route_target(route) == PRIMARY or not await _replicated():
+        yield None
+        return
+    async with await get_client().start_session(causal_consistency=True) as session:
+        await _primary().counters.find_one({}, {"_id": 1}, session=session)
+        yield session
 
 async def get_database():
     """
     Función de utilidad para Inyección de Dependencias (Dependency Injection).
-    
+
     Patrón común en FastAPI:
     En lugar de importar 'db' directamente en los endpoints, inyectamos esta función.
-    
+
     Beneficios:
     1. Testing: Permite reemplazar (mockear) la base de datos fácilmente en los tests.
     2. Gestión de Conexiones: Podríamos añadir lógica para abrir/cerrar sesiones por request si fuera necesario (común en SQL/SQLAlchemy, menos en Mongo).
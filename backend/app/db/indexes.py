@@ -0,0 +1,245 @@
+"""
+Registro declarativo de índices de MongoDB.
+
+Aquí se declara, en un único sitio, qué índices necesita cada colección para que
+las consultas de repositorios y endpoints no recorran la colección completa
+(COLLSCAN). En el arranque se compara con lo que existe en la base de datos
+(drift) y se crean los que falten.
+
+CLI (desde backend/):
+    python -m app.db.indexes check     # informa de índices que faltan, sobran o difieren
+    python -m app.db.indexes build     # crea los índices que faltan (construcción online)
+    python -m app.db.indexes explain   # ejecuta explain() de cada consulta y falla si hay COLLSCAN
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.core.config import settings
+from app.repositories.order_repository import RESERVATIONS_FIELD
+from app.services.product_search import TEXT_INDEX_KEYS, TEXT_INDEX_OPTIONS, text_search_query
+
+logger = logging.getLogger("api.indexes")
+
+# Opciones que forman parte de la "identidad" de un índice al comparar con la BD
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights", "default_language")
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # Login/registro: find_one({"email"}). Único para impedir cuentas duplicadas por carrera
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # Filtro por fecha de alta del listado/exportación de administración
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    "products": [
+        # Detalle por slug. Parcial: los productos antiguos sin slug (o slug "") no colisionan
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True, partialFilterExpression={"slug": {"$gt": ""}}),
+        # Duplicados por nombre al crear + paginación por cursor ordenada por nombre
+        IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name_id"),
+        # Filtro por tipo, distinct("type") y paginación por cursor dentro de un tipo
+        IndexModel([("type", ASCENDING), ("_id", ASCENDING)], name="type_id"),
+        # Paginación por cursor ordenada por ventas
+        IndexModel([("sold_count", DESCENDING), ("_id", DESCENDING)], name="sold_count_id"),
+        # Versión del catálogo para los ETag de los listados: max(updated_at)
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+        # Búsqueda de productos (backend "text")
+        IndexModel(TEXT_INDEX_KEYS, **TEXT_INDEX_OPTIONS),
+        # Reservas de checkout abandonadas. Parcial: solo los productos con reservas en curso
+        IndexModel([(f"{RESERVATIONS_FIELD}.at", ASCENDING)], name="reservations_at",
+                   partialFilterExpression={f"{RESERVATIONS_FIELD}.at": {"$exists": True}}),
+    ],
+    "orders": [
+        IndexModel([("user_id", ASCENDING)]),
+        # Historial de pedidos del usuario ordenado por fecha, paginado por cursor (created_at, _id).
+        # Sustituye a user_id_1_created_at_-1 (sin _id el desempate obligaba a ordenar en memoria)
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_at_id"),
+        # Reconciliación del ledger de stock: pedidos de un worker posteriores a su último volcado
+        IndexModel([("ledger.worker", ASCENDING), ("ledger.seq", ASCENDING)], name="ledger_worker_seq", sparse=True),
+        # Liberación de reservas: ¿llegó a crearse el pedido de esta reserva?
+        IndexModel([("reservation_id", ASCENDING)], name="reservation_id", sparse=True),
+    ],
+    "stock_leases": [
+        # Reconciliación: leases con el heartbeat caducado
+        IndexModel([("heartbeat_at", ASCENDING)], name="heartbeat_at"),
+        # Volcado del ledger: borrado de los leases vacíos de un worker
+        IndexModel([("worker", ASCENDING), ("qty", ASCENDING)], name="worker_qty"),
+    ],
+    "activities": [
+        # Feed de actividad del usuario ordenado por fecha
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+        # Retención: MongoDB borra los eventos más antiguos que activity_retention_days
+        *([IndexModel([("timestamp", ASCENDING)], name="timestamp_ttl",
+                      expireAfterSeconds=settings.activity_retention_days * 86400)]
+          if settings.activity_retention_days > 0 else []),
+    ],
+}
+
+# Consultas representativas de repositorios y endpoints, para 'explain'.
+# (colección, filtro, orden) — el orden puede ser None.
+# Toda consulta nueva sobre una colección que crece (filtro u orden que no sea solo _id)
+# se registra aquí, con su índice en INDEXES: 'explain' solo vigila lo que está en la lista.
+QUERY_PLANS = [
+    ("users", {"email": "ash@pallet.town"}, None),
+    # Listado/exportación de administración: rango de alta ordenado por _id
+    ("users", {"created_at": {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc)}}, [("_id", ASCENDING)]),
+    ("products", {"slug": "pikachu-plush"}, None),
+    ("products", {"name": "Pikachu Plush"}, None),
+    ("products", {"type": "Electric"}, None),
+    ("products", {"type": "Electric"}, [("_id", ASCENDING)]),
+    ("products", {}, [("name", ASCENDING), ("_id", ASCENDING)]),
+    ("products", {}, [("sold_count", DESCENDING), ("_id", DESCENDING)]),
+    ("products", {"$text": text_search_query("pikachu")}, None),
+    ("products", {}, [("updated_at", DESCENDING)]),
+    ("products", {f"{RESERVATIONS_FIELD}.at": {"$lt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, None),
+    ("orders", {"user_id": "000000000000000000000000"}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ("orders", {"reservation_id": ObjectId("000000000000000000000000")}, None),
+    ("activities", {"user_id": "000000000000000000000000"}, [("timestamp", DESCENDING)]),
+    ("stock_leases", {"worker": "host:1:00000000", "qty": 0}, None),
+    ("stock_leases", {"heartbeat_at": {"$lt": datetime(2000, 1, 1, tzinfo=timezone.utc)}}, None),
+    ("metrics_daily", {"_id": {"$gte": "2024-01-01", "$lte": "2024-12-31"}}, None),
+]
+
+def _signature(spec: dict) -> dict:
+    """Reduce la descripción de un índice (de IndexModel o de list_indexes) a lo comparable."""
+    key = spec["key"]
+    if "_fts" in key or "text" in dict(key).values():
+        # Los índices de texto se listan como {_fts: "text", _ftsx: 1}; los identifican sus pesos
+        key = {"_fts": "text"}
+    signature = {"key": list(dict(key).items())}
+    for option in _COMPARED_OPTIONS:
+        if option in spec:
+            signature[option] = spec[option]
+    signature.setdefault("unique", False)
+    return signature
+
+async def index_drift(database) -> dict:
+    """
+    Compara INDEXES con los índices existentes.
+    Devuelve {colección: {"missing": [...], "different": [...], "extra": [...]}} solo para colecciones con diferencias.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        existing = {spec["name"]: spec async for spec in database[collection_name].list_indexes()}
+        existing.pop("_id_", None)
+        missing, different = [], []
+        for model in models:
+            wanted = model.document
+            current = existing.pop(wanted["name"], None)
+            if current is None:
+                missing.append(wanted["name"])
+            elif _signature(current) != _signature(wanted):
+                different.append(wanted["name"])
+        if missing or different or existing:
+            report[collection_name] = {"missing": missing, "different": different, "extra": sorted(existing)}
+    return report
+
+async def _update_ttl(database, collection_name: str, wanted: dict) -> bool:
+    """
+    Si el índice existente solo difiere de 'wanted' en expireAfterSeconds (ej: cambió
+    ACTIVITY_RETENTION_DAYS), lo cambia en su sitio con collMod en lugar de reconstruirlo.
+    Devuelve False si la diferencia es otra.
+    """
+    if "expireAfterSeconds" not in wanted:
+        return False
+    current = None
+    async for spec in database[collection_name].list_indexes():
+        if spec["name"] == wanted["name"]:
+            current = spec
+    if current is None or "expireAfterSeconds" not in current:
+        return False
+    if {**_signature(current), "expireAfterSeconds": None} != {**_signature(wanted), "expireAfterSeconds": None}:
+        return False
+    await database.command({
+        "collMod": collection_name,
+        "index": {"name": wanted["name"], "expireAfterSeconds": wanted["expireAfterSeconds"]},
+    })
+    logger.info(
+        f"Index {collection_name}.{wanted['name']}: expireAfterSeconds "
+        f"{current['expireAfterSeconds']} -> {wanted['expireAfterSeconds']}"
+    )
+    return True
+
+async def ensure_indexes(database) -> List[str]:
+    """
+    Crea los índices declarados que falten y actualiza el TTL de los que solo difieren
+    en expireAfterSeconds. Devuelve los que no se pudieron crear (ej: datos duplicados
+    que impiden un índice único) sin interrumpir el resto.
+    """
+    failures = []
+    for collection_name, models in INDEXES.items():
+        for model in models:
+            name = f"{collection_name}.{model.document['name']}"
+            try:
+                await database[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                error = e
+            else:
+                continue
+            # 85 = IndexOptionsConflict: mismo nombre y claves, otras opciones
+            if error.code == 85:
+                try:
+                    if await _update_ttl(database, collection_name, model.document):
+                        continue
+                except OperationFailure as e:
+                    error = e
+            logger.warning(f"Could not build index {name}: {error}")
+            failures.append(name)
+    return failures
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            yield from _stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+async def collection_scans(database) -> List[str]:
+    """Ejecuta explain() de QUERY_PLANS y devuelve las consultas cuyo plan ganador usa COLLSCAN."""
+    offenders = []
+    for collection_name, query, sort in QUERY_PLANS:
+        cursor = database[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = set(_stages(explanation["queryPlanner"]["winningPlan"]))
+        if "COLLSCAN" in stages:
+            offenders.append(f"{collection_name} {query} sort={sort}")
+    # distinct("type") para el filtro del catálogo
+    explanation = await database.command({"explain": {"distinct": "products", "key": "type"}})
+    if "COLLSCAN" in set(_stages(explanation["queryPlanner"]["winningPlan"])):
+        offenders.append("products distinct(type)")
+    return offenders
+
+async def _main(argv=None) -> int:
+    from app.db import db
+
+    parser = argparse.ArgumentParser(prog="python -m app.db.indexes", description="Gestión de índices de MongoDB")
+    parser.add_argument("command", choices=["check", "build", "explain"])
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        drift = await index_drift(db)
+        for collection_name, diff in drift.items():
+            print(f"{collection_name}: {diff}")
+        print("OK: sin diferencias" if not drift else "Hay diferencias con el registro de índices")
+        return 1 if drift else 0
+
+    if args.command == "build":
+        failures = await ensure_indexes(db)
+        print("OK: índices creados" if not failures else f"Fallaron: {failures}")
+        return 1 if failures else 0
+
+    offenders = await collection_scans(db)
+    for offender in offenders:
+        print(f"COLLSCAN: {offender}")
+    print("OK: todas las consultas usan índice" if not offenders else f"{len(offenders)} consultas sin índice")
+    return 1 if offenders else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
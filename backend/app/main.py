@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.api import api_router
@@ -9,6 +10,68 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
+from app.db import database
+from app.db.database import db
+from app.db.indexes import ensure_indexes, index_drift
+from app.core.security import password_pool
+from app.repositories.order_repository import OrderRepository
+from app.services.activity_queue import activity_queue
+from app.services.image_pipeline import image_pipeline
+from app.services.metrics import ensure_metrics
+from app.services.product_fields import backfill_derived_fields
+from app.services.stock_ledger import stock_ledger
+import logging
+
+logger = logging.getLogger("api.startup")
+
+async def startup_maintenance():
+    """
+    Tareas del arranque que basta con hacer una vez, no una por worker.
+    python -m app.serve las lanza en el proceso padre antes de crear los workers.
+    """
+    # Optimización de DB y ordenamiento (FASE 4)
+    # Los índices se declaran en app/db/indexes.py; aquí avisamos de diferencias y creamos los que falten.
+    drift = await index_drift(db)
+    if drift:
+        logger.warning(f"Index drift detected: {drift}")
+    if settings.build_indexes_on_startup:
+        await ensure_indexes(db)
+    # min_price/in_stock de productos anteriores a los campos derivados (solo la primera vez)
+    backfilled = await backfill_derived_fields(db.products)
+    if backfilled:
+        logger.info(f"Derived fields computed for {backfilled} products")
+    # Rollups del dashboard de administración a partir de los datos existentes (solo la primera vez)
+    if await ensure_metrics(db):
+        logger.info("Admin metrics rollups rebuilt")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- Arranque ---
+    # Cliente de MongoDB (y su pool de conexiones) de este worker
+    database.connect()
+    if settings.startup_maintenance:
+        await startup_maintenance()
+    # Devuelve el stock de checkouts que quedaron a medias si un worker se cayó
+    await OrderRepository().release_stale_reservations(settings.reservation_timeout_seconds)
+    activity_queue.start()
+    if settings.stock_ledger_enabled:
+        # Recupera el stock de workers caídos y arranca el volcado periódico
+        await stock_ledger.start()
+
+    yield
+
+    # --- Apagado ---
+    # Liberamos los threads/procesos del pool de bcrypt
+    password_pool.shutdown()
+    image_pipeline.shutdown()
+    # Escribe los eventos de actividad que aún estén en memoria
+    await activity_queue.stop()
+    if settings.stock_ledger_enabled:
+        # Vuelca ventas pendientes y devuelve el stock no vendido
+        await stock_ledger.stop()
+    # Lo último: lo anterior aún escribe en MongoDB
+    database.close()
+
 # --- Entrypoint de la Aplicación ---
 # Aquí arranca el servidor. Configura el título, versión, documentación (Swagger)
 # y, crucialmente, los Middlewares y Rutas.
@@ -18,7 +81,8 @@ app = FastAPI(
     description="API RESTful para E-commerce de Pokémon construida con FastAPI y MongoDB",
     version="1.0.0",
     docs_url="/docs", # URL para Swagger UI (interfaz interactiva)
-    redoc_url="/redoc" # URL para ReDoc (documentación estática bonita)
+    redoc_url="/redoc", # URL para ReDoc (documentación estática bonita)
+    lifespan=lifespan, # Arranque y apagado (conexión a MongoDB, pools, colas...)
 )
 
 app.state.limiter = limiter
@@ -49,10 +113,11 @@ app.add_middleware(
     allow_credentials=True, # Permite cookies/headers de autorización
     allow_methods=["*"],    # Métodos HTTP permitidos (GET, POST, PUT, DELETE, OPTIONS)
     allow_headers=["*"],    # Cabeceras permitidas (Content-Type, Authorization...)
+    expose_headers=["X-Next-Cursor"],  # Cabeceras que el JS del navegador puede leer (paginación)
 )
 
 import os
-from fastapi.staticfiles import StaticFiles
+from app.core.uploads import UploadFiles
 
 # --- Registramos las Rutas (Routers) ---
 # Todas las rutas definidas en api/v1/api.py estarán prefijadas con /api/v1
@@ -60,18 +125,13 @@ from fastapi.staticfiles import StaticFiles
 app.include_router(api_router, prefix="/api/v1")
 
 # Configuramos la carpeta local "uploads" para que pueda ser leída públicamente
-os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
-from app.db.database import db
-from pymongo import ASCENDING, DESCENDING
-
-@app.on_event("startup")
-async def startup_event():
-    # Optimización de DB y ordenamiento (FASE 4)
-    await db.orders.create_index([("user_id", ASCENDING)])
-    await db.orders.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
-    await db.activities.create_index([("user_id", ASCENDING), ("timestamp", DESCENDING)])
+# (con caché inmutable para los nombres por contenido, ver app/core/uploads.py)
+os.makedirs(settings.uploads_dir, exist_ok=True)
+app.mount(
+    "/uploads",
+    UploadFiles(settings.uploads_dir, accel_redirect_prefix=settings.uploads_accel_redirect_prefix),
+    name="uploads",
+)
 
 @app.get("/")
 async def root():
@@ -86,4 +146,4 @@ async def root():
         "version": "1.0.0"
     }
 
-# Para correr: uvicorn app.main:app --reload
+# Para correr: uvicorn app.main:app --reload (desarrollo) o python -m app.serve (producción)
@@ -1,50 +1,219 @@
-from typing import List, Optional
-from app.db import client, db
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.core.pagination import decode_cursor, encode_cursor, keyset_filter, sort_spec
+from app.db import client, reader
 from bson import ObjectId
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from pymongo import ReadPreference, UpdateOne
+from pymongo.errors import BulkWriteError
+import logging
+from app.services.product_fields import touch
+
+logger = logging.getLogger("api.orders")
+
+# In-flight stock reservations are tagged on the product document (bulk checkout path).
+# Never expose them to clients.
+RESERVATIONS_FIELD = "_reservations"
+# Last sold_count flushes applied by the stock ledger, so that a retried flush is not counted twice
+SOLD_FLUSHES_FIELD = "_sold_flushes"
+PRODUCT_PUBLIC_PROJECTION = {RESERVATIONS_FIELD: 0, SOLD_FLUSHES_FIELD: 0}
+
+# Order history: newest first, paginated by (created_at, _id) on the (user_id, created_at, _id) index
+ORDER_HISTORY_SORT = "-created_at"
+# Summary view: what an order list row shows, computed by MongoDB instead of shipping every line item
+ORDER_SUMMARY_PROJECTION = {
+    "user_id": 1,
+    "total": 1,
+    "status": 1,
+    "created_at": 1,
+    "item_count": {"$sum": "$items.quantity"},
+    "thumbnail": {"$arrayElemAt": ["$items.img", 0]},
+}
+
+# Cached result of the replica-set probe (transactions need a replica set or mongos)
+_supports_transactions: Optional[bool] = None
+
+async def supports_transactions() -> bool:
+    global _supports_transactions
+    if _supports_transactions is None:
+        try:
+            hello = await client.admin.command("hello")
+            _supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logger.warning(f"Could not detect replica set, transactions disabled: {e}")
+            _supports_transactions = False
+    return _supports_transactions
+
+def _stock_filter(product_id: ObjectId, item: dict) -> dict:
+    quantity, size = item["quantity"], item.get("size")
+    if size:
+        # $elemMatch so that size and stock are checked on the SAME variant
+        return {"_id": product_id, "variants": {"$elemMatch": {"size": size, "stock": {"$gte": quantity}}}}
+    # Legacy fallback
+    return {"_id": product_id, "stock": {"$gte": quantity}}
+
+def _stock_decrement(item: dict) -> dict:
+    quantity = item["quantity"]
+    if item.get("size"):
+        return {"variants.$.stock": -quantity, "sold_count": quantity}
+    return {"stock": -quantity, "sold_count": quantity}
 
 class OrderRepository:
-    def __init__(self):
-        self.collection = db.orders
-        self.products = db.products
+    # Resolved on every use: the MongoDB client is created when the app starts.
+    # Checkout writes and the reads that depend on them (stock, reservations) go to the
+    # primary; history and detail reads have their own routes (see READ_ROUTES)
+    @property
+    def collection(self):
+        return reader("orders.checkout").orders
+
+    @property
+    def products(self):
+        return reader("orders.checkout").products
 
     async def create_with_transaction(self, order_data: dict) -> dict:
+        """
+        Reserves stock for every line item and inserts the order, all or nothing.
+
+        Checkout path (settings.checkout_mode):
+        - "transaction": one ordered bulk_write + insert inside a multi-document
+          transaction. Needs a replica set; retried on transient write conflicts.
+        - "bulk": one ordered bulk_write that tags each reservation on the product;
+          any shortfall is undone with one compensating bulk_write. Works on standalone.
+        - "sequential": the original one-update-per-item path.
+        - "auto" (default): "transaction" when a replica set is available, else "bulk".
+        With settings.stock_ledger_enabled, stock is admitted by the in-process
+        StockLedger instead and only the order insert reaches Mongo.
+        """
+        ids = []
+        for item in order_data["items"]:
+            if not ObjectId.is_valid(item["id"]):
+                raise ValueError(f"Out of stock or invalid product/variant: {item['name']}")
+            ids.append(ObjectId(item["id"]))
+
+        if settings.stock_ledger_enabled:
+            return await self._create_with_ledger(order_data)
+
+        mode = settings.checkout_mode
+        if mode == "auto":
+            mode = "transaction" if await supports_transactions() else "bulk"
+
+        if mode == "transaction":
+            return await self._create_in_transaction(order_data, ids)
+        if mode == "bulk":
+            return await self._create_with_bulk_reservation(order_data, ids)
+        return await self._create_sequential(order_data, ids)
+
+    async def _create_with_ledger(self, order_data: dict) -> dict:
+        # Imported here: the ledger module depends on the db layer, not the other way around
+        from app.services.stock_ledger import stock_ledger
+
+        seq = await stock_ledger.reserve(order_data["items"])
+        order_data["ledger"] = {"worker": stock_ledger.worker_id, "seq": seq}
+        try:
+            result = await self.collection.insert_one(order_data)
+        except Exception:
+            stock_ledger.release(order_data["items"])
+            raise
+        order_data["_id"] = result.inserted_id
+        return order_data
+
+    async def _create_in_transaction(self, order_data: dict, ids: List[ObjectId]) -> dict:
+        ops = [
+            UpdateOne(_stock_filter(pid, item), touch({"$inc": _stock_decrement(item)}))
+            for pid, item in zip(ids, order_data["items"])
+        ]
+
+        async def place(session):
+            result = await self.products.bulk_write(ops, ordered=True, session=session)
+            if result.matched_count < len(ops):
+                # Raising aborts the transaction: no stock is touched
+                raise ValueError(await self._shortage_message(order_data["items"]))
+            inserted = await self.collection.insert_one(order_data, session=session)
+            order_data["_id"] = inserted.inserted_id
+
+        async with await client.start_session() as session:
+            # with_transaction retries the whole callback on TransientTransactionError.
+            # Transactions must read from the primary whatever MONGO_READ_PREFERENCE says
+            await session.with_transaction(place, read_preference=ReadPreference.PRIMARY)
+        return order_data
+
+    async def _create_with_bulk_reservation(self, order_data: dict, ids: List[ObjectId]) -> dict:
+        # Each reservation is tagged (token, line index) on its product so that we can
+        # tell exactly which lines were applied, and undo only those.
+        token = ObjectId()
+        now = datetime.now(timezone.utc)
+        items = order_data["items"]
+        ops = []
+        for index, (pid, item) in enumerate(zip(ids, items)):
+            marker = {"t": token, "i": index, "q": item["quantity"], "size": item.get("size"), "at": now}
+            ops.append(UpdateOne(
+                _stock_filter(pid, item),
+                touch({"$inc": _stock_decrement(item), "$push": {RESERVATIONS_FIELD: marker}}),
+            ))
+
+        try:
+            result = await self.products.bulk_write(ops, ordered=True)
+        except BulkWriteError:
+            # Ordered bulk stops at the failing op; the lines before it are tagged
+            await self._release(token, ids, items)
+            raise
+        if result.matched_count < len(ops):
+            await self._release(token, ids, items)
+            raise ValueError(await self._shortage_message(items))
+
+        order_data["reservation_id"] = token
+        try:
+            inserted = await self.collection.insert_one(order_data)
+        except Exception:
+            await self._release(token, ids, items)
+            raise
+        order_data["_id"] = inserted.inserted_id
+
+        # Order is durable: the reservation tags are no longer needed
+        await self.products.update_many(
+            {"_id": {"$in": ids}}, {"$pull": {RESERVATIONS_FIELD: {"t": token}}}
+        )
+        return order_data
+
+    async def _release(self, token: ObjectId, ids: List[ObjectId], items: List[dict]):
+        """Gives back the stock of every line tagged with 'token' (untagged lines are skipped)."""
+        ops = []
+        for index, (pid, item) in enumerate(zip(ids, items)):
+            quantity, size = item["quantity"], item.get("size")
+            tag = {RESERVATIONS_FIELD: {"$elemMatch": {"t": token, "i": index}}}
+            pull = {"$pull": {RESERVATIONS_FIELD: {"t": token, "i": index}}}
+            if size:
+                ops.append(UpdateOne(
+                    {"_id": pid, **tag},
+                    touch({"$inc": {"variants.$[v].stock": quantity, "sold_count": -quantity}, **pull}),
+                    array_filters=[{"v.size": size}],
+                ))
+            else:
+                ops.append(UpdateOne({"_id": pid, **tag}, touch({"$inc": {"stock": quantity, "sold_count": -quantity}, **pull})))
+        await self.products.bulk_write(ops, ordered=False)
+
+    async def _create_sequential(self, order_data: dict, ids: List[ObjectId]) -> dict:
         # Fallback for Standalone MongoDB (common in local dev)
         # We manually rollback if something fails since transactions might not be supported.
         stock_rollbacks = []
         try:
             # 1. Deduct stock atomically
-            for item in order_data["items"]:
-                product_id = item["id"]
-                quantity = item["quantity"]
-                size = item.get("size")
-                
-                if size:
-                    # It's a variant purchase
-                    updated = await self.products.find_one_and_update(
-                        {"_id": ObjectId(product_id), "variants.size": size, "variants.stock": {"$gte": quantity}},
-                        {"$inc": {"variants.$.stock": -quantity, "sold_count": quantity}},
-                        return_document=True
-                    )
-                else:
-                    # Legacy fallback
-                    updated = await self.products.find_one_and_update(
-                        {"_id": ObjectId(product_id), "stock": {"$gte": quantity}},
-                        {"$inc": {"stock": -quantity, "sold_count": quantity}},
-                        return_document=True
-                    )
-                
+            for product_id, item in zip(ids, order_data["items"]):
+                updated = await self.products.find_one_and_update(
+                    _stock_filter(product_id, item),
+                    touch({"$inc": _stock_decrement(item)}),
+                    projection={"_id": 1},
+                )
+
                 if not updated:
                     raise ValueError(f"Out of stock or invalid product/variant: {item['name']}")
-                
-                stock_rollbacks.append((product_id, quantity, size))
-            
-            # 2. Snapshot current price (could be fetched from db here for extreme safety)
-            
-            # 3. Create the order
+
+                stock_rollbacks.append((product_id, item["quantity"], item.get("size")))
+
+            # 2. Create the order
             result = await self.collection.insert_one(order_data)
             order_data["_id"] = result.inserted_id
-            
+
             return order_data
 
         except Exception as e:
@@ -52,16 +221,87 @@ class OrderRepository:
             for p_id, q, size in stock_rollbacks:
                 if size:
                     await self.products.update_one(
-                        {"_id": ObjectId(p_id), "variants.size": size},
-                        {"$inc": {"variants.$.stock": q, "sold_count": -q}}
+                        {"_id": p_id},
+                        touch({"$inc": {"variants.$[v].stock": q, "sold_count": -q}}),
+                        array_filters=[{"v.size": size}],
                     )
                 else:
                     await self.products.update_one(
-                        {"_id": ObjectId(p_id)},
-                        {"$inc": {"stock": q, "sold_count": -q}}
+                        {"_id": p_id},
+                        touch({"$inc": {"stock": q, "sold_count": -q}})
                     )
             raise e
 
-    async def get_by_user_id(self, user_id: str, limit: int = 100) -> List[dict]:
-        cursor = self.collection.find({"user_id": user_id}).sort("created_at", -1)
-        return await cursor.to_list(length=limit)
+    async def _shortage_message(self, items: List[dict]) -> str:
+        """Names the first line that cannot be fulfilled (one read, failure path only)."""
+        ids = [ObjectId(item["id"]) for item in items]
+        docs = await self.products.find({"_id": {"$in": ids}}, {"stock": 1, "variants": 1}).to_list(length=len(ids))
+        by_id = {str(doc["_id"]): doc for doc in docs}
+        for item in items:
+            doc = by_id.get(item["id"])
+            if doc is None:
+                break
+            if item.get("size"):
+                variant = next((v for v in doc.get("variants", []) if v.get("size") == item["size"]), None)
+                available = variant.get("stock", 0) if variant else 0
+            else:
+                available = doc.get("stock") or 0
+            if available < item["quantity"]:
+                break
+        else:
+            item = items[0]
+        return f"Out of stock or invalid product/variant: {item['name']}"
+
+    async def release_stale_reservations(self, older_than_seconds: float) -> int:
+        """
+        Crash recovery for the bulk path: a worker that died between reserving stock
+        and clearing the tags leaves reservations behind. If the order was written we
+        only drop the tag; otherwise the stock is given back. Returns lines restored.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_seconds)
+        restored = 0
+        cursor = self.products.find(
+            {f"{RESERVATIONS_FIELD}.at": {"$lt": cutoff}}, {RESERVATIONS_FIELD: 1}
+        )
+        async for product in cursor:
+            for marker in product.get(RESERVATIONS_FIELD, []):
+                if marker["at"].replace(tzinfo=timezone.utc) >= cutoff:
+                    continue
+                placed = await self.collection.count_documents({"reservation_id": marker["t"]}, limit=1)
+                pull = {"$pull": {RESERVATIONS_FIELD: {"t": marker["t"], "i": marker["i"]}}}
+                tag = {"_id": product["_id"], RESERVATIONS_FIELD: {"$elemMatch": {"t": marker["t"], "i": marker["i"]}}}
+                if placed:
+                    await self.products.update_one(tag, pull)
+                    continue
+                quantity, size = marker["q"], marker.get("size")
+                if size:
+                    await self.products.update_one(
+                        tag,
+                        touch({"$inc": {"variants.$[v].stock": quantity, "sold_count": -quantity}, **pull}),
+                        array_filters=[{"v.size": size}],
+                    )
+                else:
+                    await self.products.update_one(tag, touch({"$inc": {"stock": quantity, "sold_count": -quantity}, **pull}))
+                restored += 1
+        if restored:
+            logger.warning(f"Released {restored} stale stock reservations")
+        return restored
+
+    async def list_by_user(
+        self, user_id: str, limit: int, cursor: Optional[str] = None, summary: bool = False
+    ) -> Tuple[List[dict], Optional[str]]:
+        """One page of the user's order history and the cursor of the next one (None on the last page)."""
+        query = {"user_id": user_id}
+        if cursor:
+            query.update(keyset_filter(ORDER_HISTORY_SORT, decode_cursor(cursor, ORDER_HISTORY_SORT)))
+        projection = ORDER_SUMMARY_PROJECTION if summary else None
+        # One extra document tells whether there is a next page without a count
+        docs = await reader("orders.history").orders.find(query, projection).sort(sort_spec(ORDER_HISTORY_SORT)).limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = encode_cursor(ORDER_HISTORY_SORT, docs[limit - 1]) if len(docs) > limit else None
+        return docs[:limit], next_cursor
+
+    async def get_for_user(self, user_id: str, order_id: str) -> Optional[dict]:
+        """An order by id, only if it belongs to user_id."""
+        if not ObjectId.is_valid(order_id):
+            return None
+        return await reader("orders.detail").orders.find_one({"_id": ObjectId(order_id), "user_id": user_id})
@@ -1,11 +1,42 @@
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Tuple
 from app.schemas.user import UserCreate
 from app.db import db
+from app.core.pagination import decode_cursor, encode_cursor, keyset_filter, sort_spec
+from app.core.security import invalidate_user_cache
+from bson import ObjectId
 from datetime import datetime, timezone
 
+# Campos que devuelven los listados y exportaciones de administración.
+# Proyección por inclusión: el hash de la contraseña (y cualquier campo futuro) nunca sale de MongoDB
+USER_LIST_PROJECTION = {"email": 1, "name": 1, "role": 1, "is_active": 1, "created_at": 1}
+# Orden por _id (≈ fecha de alta): paginación por cursor sobre el índice que siempre existe
+USER_LIST_SORT = "_id"
+
+def user_list_filter(
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> dict:
+    query = {}
+    if role:
+        query["role"] = role
+    if is_active is not None:
+        # Los usuarios antiguos no tienen el campo: cuentan como activos
+        query["is_active"] = {"$ne": False} if is_active else False
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = created_from
+        if created_to:
+            query["created_at"]["$lt"] = created_to
+    return query
+
 class UserRepository:
-    def __init__(self):
-        self.collection = db.users
+    @property
+    def collection(self):
+        # Resuelto en cada uso: el cliente de MongoDB se crea en el arranque de la app
+        return db.users
 
     async def get_by_email(self, email: str) -> Optional[dict]:
         return await self.collection.find_one({"email": email})
@@ -16,4 +47,28 @@ class UserRepository:
         return user_data
 
     async def update(self, user_id: str, update_data: dict) -> bool:
-        pass # To implement later
+        result = await self.collection.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
+        # Role, is_active or token_version may have changed: drop the cached auth copy
+        invalidate_user_cache(user_id)
+        return result.matched_count > 0
+
+    async def bump_token_version(self, user_id: str) -> bool:
+        """Revokes every token issued so far for this user."""
+        result = await self.collection.update_one({"_id": ObjectId(user_id)}, {"$inc": {"token_version": 1}})
+        invalidate_user_cache(user_id)
+        return result.matched_count > 0
+
+    async def list_page(self, query: dict, limit: int, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Una página de usuarios (sin hash de contraseña) y el cursor de la siguiente (None si es la última)."""
+        if cursor:
+            query = {"$and": [query, keyset_filter(USER_LIST_SORT, decode_cursor(cursor, USER_LIST_SORT))]}
+        # Un documento de más indica si hay página siguiente sin hacer un count
+        docs = await self.collection.find(query, USER_LIST_PROJECTION).sort(sort_spec(USER_LIST_SORT)).limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = encode_cursor(USER_LIST_SORT, docs[limit - 1]) if len(docs) > limit else None
+        return docs[:limit], next_cursor
+
+    async def iter_all(self, query: dict, batch_size: int = 1000) -> AsyncIterator[dict]:
+        """Recorre todos los usuarios del filtro directamente desde el cursor (memoria constante)."""
+        cursor = self.collection.find(query, USER_LIST_PROJECTION).sort(sort_spec(USER_LIST_SORT)).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc
@@ -24,3 +24,15 @@ class OrderOut(BaseModel):
     created_at: datetime
     
     model_config = ConfigDict(from_attributes=True)
+
+class OrderSummary(BaseModel):
+    """Fila del historial de pedidos (?view=summary): sin líneas de pedido."""
+    id: str
+    user_id: str
+    total: float
+    status: str
+    created_at: datetime
+    item_count: int = 0
+    thumbnail: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
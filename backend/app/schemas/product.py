@@ -1,5 +1,6 @@
 from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional, List
+from datetime import datetime
+from typing import Any, Dict, Optional, List
 
 class ProductVariant(BaseModel):
     size: str
@@ -48,9 +49,55 @@ class ProductUpdate(BaseModel):
 
 class ProductOut(ProductBase):
     id: str
+    # Derivados de variants/price/stock, se guardan al escribir (ver app/services/product_fields.py)
+    min_price: Optional[float] = None
+    in_stock: Optional[bool] = None
+    # Cambian con cada escritura del producto (edición, stock, ventas): base del ETag
+    version: int = 0
+    updated_at: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
 
+class ProductSummary(BaseModel):
+    """Lo justo para pintar una tarjeta del catálogo (vista 'summary')."""
+    id: str
+    name: str
+    slug: str = ""
+    type: str
+    image_url: str
+    min_price: Optional[float] = None
+    in_stock: bool = False
+    is_new: bool = False
+    featured: bool = False
+
 class ProductList(BaseModel):
     products: List[ProductOut]
     total: int
+    # Solo en paginación por cursor: token para pedir la siguiente página (None = última)
+    next_cursor: Optional[str] = None
+    # True si 'total' es una estimación (metadatos de la colección) y no un conteo exacto
+    total_is_estimate: bool = False
+
+class ProductSummaryList(ProductList):
+    products: List[ProductSummary]
+
+class ProductFieldsList(ProductList):
+    # Con ?fields=...: solo los campos pedidos (más 'id')
+    products: List[Dict[str, Any]]
+
+# Máximo de claves por petición en /products/batch
+BATCH_MAX_KEYS = 300
+
+class ProductBatchRequest(BaseModel):
+    # IDs de MongoDB o slugs, mezclados; el resultado respeta este orden
+    keys: List[str] = Field(min_length=1, max_length=BATCH_MAX_KEYS)
+    # Campos a devolver (ej: ["price", "stock", "variants"]). None = producto completo
+    fields: Optional[List[str]] = None
+
+class ProductBatchItem(BaseModel):
+    key: str
+    found: bool
+    product: Optional[Dict[str, Any]] = None
+
+class ProductBatchResult(BaseModel):
+    results: List[ProductBatchItem]
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr, ConfigDict
+from datetime import datetime
 from typing import Optional
 
 # --- Esquemas (Schemas) Pydantic ---
@@ -53,3 +54,10 @@ class UserOut(UserBase):
     # directamente desde objetos ORM o diccionarios complejos, sin tener que mapear campo a campo.
     # (En Pydantic v1 esto se llamaba 'orm_mode = True')
     model_config = ConfigDict(from_attributes=True)
+
+class AdminUserOut(UserOut):
+    """
+    Usuario tal y como lo ve el panel de administración (listado y exportación).
+    """
+    is_active: bool = True
+    created_at: Optional[datetime] = None
@@ -0,0 +1,98 @@
+"""
+Servidor de producción con varios workers.
+
+    python -m app.serve                      # un worker por núcleo, puerto 8000
+    python -m app.serve --workers 4 --port 8080
+
+Sobre el supervisor de uvicorn:
+
+- Workers: SERVER_WORKERS (0 = uno por núcleo disponible para el proceso, respetando
+  el cpuset del contenedor). Cada worker es un proceso nuevo (spawn) que importa la app
+  y crea su propio cliente Motor con su pool de conexiones: nada se comparte tras un fork.
+- Event loop y parser HTTP: uvloop y httptools si están instalados (pip install uvloop
+  httptools); si no, asyncio y h11.
+- Precarga: el proceso padre importa la app antes de crear los workers (un error de
+  configuración o de importación aborta aquí, no en N workers en bucle) y ejecuta una sola
+  vez las tareas únicas del arranque (índices, campos derivados, rollups), que los
+  workers ya no repiten.
+- Señales al proceso padre:
+    SIGHUP           reinicio escalonado: arranca un worker nuevo, espera a que responda y
+                     solo entonces retira uno viejo, que termina sus peticiones en curso
+                     (SERVER_GRACEFUL_TIMEOUT). Los workers nuevos cargan el código actual.
+    SIGTTIN/SIGTTOU  un worker más / uno menos
+    SIGTERM/SIGINT   parada ordenada
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import uvicorn
+from app.core.config import settings
+
+logger = logging.getLogger("api.serve")
+
+def available_cpus() -> int:
+    """Núcleos que puede usar este proceso (cpuset/affinity), no los de la máquina."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows
+        return os.cpu_count() or 1
+
+def event_loop() -> str:
+    if sys.platform != "win32" and importlib.util.find_spec("uvloop"):
+        return "uvloop"
+    return "asyncio"
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+async def _preload_maintenance():
+    from app.db import database
+    from app.main import startup_maintenance
+    try:
+        await startup_maintenance()
+    finally:
+        # Los workers crean su propio cliente; el del padre no se vuelve a usar
+        database.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="Servidor de producción de la API")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers, help="0 = uno por núcleo")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", action="store_true", help="Sin una línea de log por petición")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or available_cpus()
+    loop, http = event_loop(), http_protocol()
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+
+    # Precarga: falla aquí si la app no importa (config, dependencias...)
+    import app.main  # noqa: F401
+
+    if workers > 1 and settings.startup_maintenance:
+        asyncio.run(_preload_maintenance())
+        # Los workers heredan el entorno del padre
+        os.environ["STARTUP_MAINTENANCE"] = "false"
+
+    logger.info(f"Starting {workers} worker(s) on {args.host}:{args.port} (loop={loop}, http={http})")
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=True,
+        forwarded_allow_ips=settings.server_forwarded_allow_ips,
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        log_level=args.log_level,
+        access_log=not args.no_access_log,
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
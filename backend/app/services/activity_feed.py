@@ -0,0 +1,56 @@
+from collections import deque
+from datetime import timezone
+from typing import List
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.services.activity_queue import activity_queue
+
+# --- Feed de actividad reciente (GET /activity/user) ---
+# El feed solo muestra los FEED_SIZE eventos más recientes del usuario. Cada worker guarda
+# esos eventos por usuario en un buffer circular (deque con maxlen) que log_activity
+# completa al registrar un evento: en el caso habitual, leer el feed no toca MongoDB.
+# - Solo se añade a buffers ya cargados (uno sin cargar no sabe qué eventos le faltan).
+# - Un fallo carga los últimos eventos de MongoDB más los que aún esperan en la cola de escritura.
+# - El TTL acota el desfase con eventos registrados a través de otros workers.
+# La retención en MongoDB la hace el índice TTL de 'timestamp' (ver app/db/indexes.py).
+
+FEED_SIZE = 20
+
+def _as_stored(doc: dict) -> dict:
+    # MongoDB devuelve fechas UTC sin zona horaria: los eventos aún no leídos de la BD
+    # se guardan igual para poder ordenarlos juntos y servirlos con el mismo formato
+    timestamp = doc["timestamp"]
+    if timestamp.tzinfo is not None:
+        doc = {**doc, "timestamp": timestamp.astimezone(timezone.utc).replace(tzinfo=None)}
+    return doc
+
+class ActivityFeed:
+    def __init__(self, ttl: float, max_users: int, size: int = FEED_SIZE):
+        self.size = size
+        self._buffers = TTLCache(ttl, max_users)
+
+    async def recent(self, collection, user_id: str) -> List[dict]:
+        """Últimos 'size' eventos del usuario, del más reciente al más antiguo."""
+        buffer = self._buffers.get(user_id)
+        if buffer is None:
+            docs = await collection.find({"user_id": user_id}).sort("timestamp", -1).limit(self.size).to_list(length=self.size)
+            stored = {doc["_id"] for doc in docs}
+            pending = [_as_stored(doc) for doc in activity_queue.pending_for(user_id) if doc["_id"] not in stored]
+            merged = sorted(pending + docs, key=lambda doc: doc["timestamp"], reverse=True)
+            buffer = deque(merged[:self.size], maxlen=self.size)
+            self._buffers.set(user_id, buffer)
+        return list(buffer)
+
+    def record(self, doc: dict):
+        """Añade un evento recién registrado al buffer de su usuario (si está cargado)."""
+        buffer = self._buffers.peek(doc["user_id"])
+        if buffer is not None:
+            buffer.appendleft(_as_stored(doc))
+
+    def clear(self):
+        self._buffers.clear()
+
+    def stats(self) -> dict:
+        return self._buffers.stats()
+
+activity_feed = ActivityFeed(settings.activity_feed_cache_ttl_seconds, settings.activity_feed_cache_max_users)
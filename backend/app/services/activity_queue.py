@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import List, Optional
+from pymongo.errors import BulkWriteError
+from app.core.config import settings
+from app.db import db
+
+logger = logging.getLogger("api.activity")
+
+class ActivityQueue:
+    """
+    Buffer en memoria del proceso para los eventos de actividad (telemetría).
+
+    `submit()` solo añade el evento a una lista; una tarea en segundo plano escribe
+    el buffer con un único `insert_many(ordered=False)` al llegar a `batch_size`
+    eventos o cada `flush_interval` segundos, lo que ocurra antes.
+
+    Contrapresión: como mucho esperan `max_pending` eventos en memoria. Por encima,
+    `submit()` devuelve False (el endpoint responde 503 + Retry-After) y el evento
+    cuenta como descartado. Un evento no es durable hasta que se vuelca: si el worker
+    se cae se pierden como mucho `max_pending`, aceptable para telemetría.
+    Al apagar, `stop()` escribe todo lo que quede en el buffer.
+    """
+
+    def __init__(self, max_pending: int, batch_size: int, flush_interval: float):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[dict] = []
+        self._full_batch = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.accepted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def submit(self, doc: dict) -> bool:
+        """Encola un evento sin esperar a MongoDB. False si el buffer está lleno."""
+        if len(self._buffer) >= self.max_pending:
+            self.dropped += 1
+            return False
+        # Por si se usa sin el evento de startup (scripts, benchmarks)
+        self.start()
+        self._buffer.append(doc)
+        self.accepted += 1
+        if len(self._buffer) >= self.batch_size:
+            self._full_batch.set()
+        return True
+
+    def pending_for(self, user_id: str) -> List[dict]:
+        """Eventos del usuario aceptados que aún no se han escrito."""
+        return [doc for doc in self._buffer if doc.get("user_id") == user_id]
+
+    async def flush(self):
+        """Escribe todo lo pendiente en lotes de batch_size."""
+        while self._buffer:
+            batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+            self.flushes += 1
+            try:
+                result = await db.activities.insert_many(batch, ordered=False)
+                self.written += len(result.inserted_ids)
+            except BulkWriteError as e:
+                # ordered=False: el resto del lote sí se escribió. Un _id duplicado es un
+                # reintento de un lote que sí llegó a MongoDB: cuenta como escrito
+                errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+                self.written += len(batch) - len(errors)
+                self.failed += len(errors)
+                if errors:
+                    logger.error(f"Activity flush: {len(errors)} events rejected: {errors[0].get('errmsg')}")
+            except Exception as e:
+                # Sin respuesta de MongoDB: se reintenta el lote en la siguiente vuelta si hay sitio
+                room = self.max_pending - len(self._buffer)
+                retry = batch[:max(room, 0)]
+                self._buffer[:0] = retry
+                self.failed += len(batch) - len(retry)
+                logger.error(f"Activity flush failed ({len(retry)} events requeued): {e}")
+                return
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full_batch.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full_batch.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Activity flush loop error: {e}")
+
+    def start(self):
+        if self._task is None and not self._stopping:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Para el volcado periódico y escribe lo que quede en el buffer."""
+        self._stopping = True
+        if self._task is not None:
+            # Sin cancelar: un insert_many a medias perdería su lote
+            self._full_batch.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._buffer:
+            logger.error(f"Activity queue stopped with {len(self._buffer)} unwritten events")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._buffer),
+            "max_pending": self.max_pending,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+activity_queue = ActivityQueue(
+    settings.activity_queue_max_pending,
+    settings.activity_queue_batch_size,
+    settings.activity_queue_flush_interval_seconds,
+)
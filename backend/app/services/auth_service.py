@@ -1,10 +1,14 @@
+import logging
 from datetime import datetime, timezone
 from fastapi import HTTPException, status
 from app.repositories.user_repository import UserRepository
 from app.schemas.user import UserCreate, UserLogin, UserOut
 from app.schemas.token import Token
-from app.core.security import hash_password, verify_password, create_token
+from app.core.security import hash_password_async, verify_password_async, create_token
 from app.core.config import settings
+from app.services import metrics
+
+logger = logging.getLogger("api.auth")
 
 class AuthService:
     def __init__(self):
@@ -18,7 +22,7 @@ class AuthService:
                 detail="Email already exists"
             )
         
-        hashed = hash_password(payload.password)
+        hashed = await hash_password_async(payload.password)
         user_data = {
             "email": payload.email,
             "password": hashed,
@@ -31,6 +35,11 @@ class AuthService:
             user_data["name"] = payload.name
             
         created_user = await self.user_repo.create(user_data)
+        try:
+            await metrics.record_user(created_user)
+        except Exception as e:
+            # El usuario ya existe: el contador se corrige con 'python -m app.services.metrics rebuild'
+            logger.error(f"Failed to update metrics for new user {created_user['_id']}: {e}")
         
         return UserOut(
             id=str(created_user["_id"]),
@@ -42,7 +51,7 @@ class AuthService:
     async def authenticate_user(self, payload: UserLogin) -> Token:
         user = await self.user_repo.get_by_email(payload.email)
         
-        if not user or not verify_password(payload.password, user["password"]):
+        if not user or not await verify_password_async(payload.password, user["password"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password",
@@ -53,13 +62,14 @@ class AuthService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
             
         user_id = str(user["_id"])
+        token_version = user.get("token_version", 0)
         
-        access_token = create_token(user_id, settings.access_token_expires_min)
-        refresh_token = create_token(user_id, settings.refresh_token_expires_min)
+        access_token = create_token(user_id, settings.access_token_expires_min, token_version)
+        refresh_token = create_token(user_id, settings.refresh_token_expires_min, token_version)
         
         return Token(access_token=access_token, refresh_token=refresh_token)
 
-    def refresh_user_token(self, user_id: str) -> Token:
-        access_token = create_token(user_id, settings.access_token_expires_min)
-        refresh_token = create_token(user_id, settings.refresh_token_expires_min)
+    def refresh_user_token(self, user_id: str, token_version: int = 0) -> Token:
+        access_token = create_token(user_id, settings.access_token_expires_min, token_version)
+        refresh_token = create_token(user_id, settings.refresh_token_expires_min, token_version)
         return Token(access_token=access_token, refresh_token=refresh_token)
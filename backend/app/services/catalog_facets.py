@@ -0,0 +1,113 @@
+import asyncio
+import time
+from typing import Tuple
+from app.core.config import settings
+from app.core.http_cache import make_etag
+from app.core.serialization import dumps
+from app.db import causal_session, reader
+
+# Un producto con variantes se vende por variante; los antiguos usan price/stock en la raíz
+_HAS_VARIANTS = {"$gt": [{"$size": {"$ifNull": ["$variants", []]}}, 0]}
+
+FACETS_PIPELINE = [
+    {"$project": {
+        "type": 1,
+        # $min/$max de un campo ausente dan null: esos productos no cuentan para el rango
+        "min_price": {"$cond": [_HAS_VARIANTS, {"$min": "$variants.price"}, "$price"]},
+        "max_price": {"$cond": [_HAS_VARIANTS, {"$max": "$variants.price"}, "$price"]},
+        "in_stock": {"$cond": [
+            {"$gt": [{"$cond": [_HAS_VARIANTS, {"$sum": "$variants.stock"}, {"$ifNull": ["$stock", 0]}]}, 0]}, 1, 0,
+        ]},
+    }},
+    {"$facet": {
+        "by_type": [
+            {"$group": {
+                "_id": "$type",
+                "count": {"$sum": 1},
+                "in_stock": {"$sum": "$in_stock"},
+                "min_price": {"$min": "$min_price"},
+                "max_price": {"$max": "$max_price"},
+            }},
+            {"$sort": {"_id": 1}},
+        ],
+        "overall": [
+            {"$group": {
+                "_id": None,
+                "count": {"$sum": 1},
+                "in_stock": {"$sum": "$in_stock"},
+                "min_price": {"$min": "$min_price"},
+                "max_price": {"$max": "$max_price"},
+            }},
+        ],
+    }},
+]
+
+def _facet(row: dict) -> dict:
+    return {
+        "count": row["count"],
+        "in_stock": row["in_stock"],
+        "out_of_stock": row["count"] - row["in_stock"],
+        "price_range": {"min": row.get("min_price"), "max": row.get("max_price")},
+    }
+
+class CatalogFacets:
+    """
+    Filters of the catalog page (types with counts, price ranges, availability),
+    computed with one aggregation and kept in memory as pre-serialized JSON.
+
+    Product writes in this worker call invalidate(); `max_age` bounds how stale
+    it can get with respect to sales and writes handled by other workers.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = asyncio.Lock()
+        self._built_at = 0.0
+        self._generation = 0
+        self._built_generation = -1
+        self._types: list = []
+        self._body = b""
+        self._etag = ""
+
+    async def get(self) -> Tuple[bytes, str]:
+        """Returns (json body, etag), recomputing first if invalidated or too old."""
+        if self._stale():
+            async with self._lock:
+                if self._stale():
+                    await self.rebuild()
+        return self._body, self._etag
+
+    async def types(self) -> list:
+        await self.get()
+        return self._types
+
+    def _stale(self) -> bool:
+        return self._built_generation != self._generation or time.monotonic() - self._built_at > self.max_age
+
+    async def rebuild(self):
+        # A write that lands while we aggregate bumps the generation: the result stays stale
+        generation = self._generation
+        # Sesión causal: leída de una réplica, incluye las escrituras que la invalidaron
+        async with causal_session("catalog.facets") as session:
+            rows = await reader("catalog.facets").products.aggregate(FACETS_PIPELINE, session=session).to_list(length=1)
+        by_type = rows[0]["by_type"] if rows else []
+        overall = rows[0]["overall"] if rows else []
+
+        total = _facet(overall[0]) if overall else _facet({"count": 0, "in_stock": 0})
+        payload = {
+            "types": [{"type": row["_id"], **_facet(row)} for row in by_type if row["_id"] is not None],
+            "total": total["count"],
+            "availability": {"in_stock": total["in_stock"], "out_of_stock": total["out_of_stock"]},
+            "price_range": total["price_range"],
+        }
+        self._types = [facet["type"] for facet in payload["types"]]
+        self._body = dumps(payload)
+        self._etag = make_etag(self._body)
+        self._built_at = time.monotonic()
+        self._built_generation = generation
+
+    def invalidate(self):
+        """Forces a recompute on the next read (product created, edited or deleted)."""
+        self._generation += 1
+
+catalog_facets = CatalogFacets(settings.catalog_facets_max_age_seconds)
@@ -0,0 +1,34 @@
+import asyncio
+from datetime import datetime
+from typing import Optional, Tuple
+from app.db import db
+
+# --- Versión del catálogo (ETag de los listados) ---
+# Un listado cambia si se crea, edita o borra un producto, o si cambia su stock/ventas.
+# - Cada escritura de un producto actualiza su 'updated_at' (ver product_fields.touch),
+#   así que max(updated_at) —una lectura por índice— cubre ediciones, stock y ventas.
+# - Un borrado no deja documento que mirar: para eso hay un contador en 'counters',
+#   que también suben las altas y ediciones del panel de administración (pocas).
+# Juntos permiten responder 304 a un listado sin ejecutar su consulta.
+
+COUNTER_ID = "products"
+
+async def bump_catalog_version():
+    """Llamar tras crear, editar o borrar un producto."""
+    await db.counters.update_one({"_id": COUNTER_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+async def catalog_version(session=None) -> Tuple[int, Optional[datetime]]:
+    """
+    (contador de altas/bajas/ediciones, updated_at más reciente del catálogo).
+    Con 'session' (ver causal_session) las dos lecturas van en serie: una sesión no
+    admite operaciones concurrentes. Sin ella (sin réplicas o ruta en el primario), en paralelo.
+    """
+    if session is not None:
+        counter = await db.counters.find_one({"_id": COUNTER_ID}, session=session)
+        latest = await db.products.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)], session=session)
+    else:
+        counter, latest = await asyncio.gather(
+            db.counters.find_one({"_id": COUNTER_ID}),
+            db.products.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)]),
+        )
+    return (counter or {}).get("version", 0), (latest or {}).get("updated_at")
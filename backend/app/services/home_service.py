@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Tuple
+from app.core.config import settings
+from app.core.http_cache import make_etag
+from app.core.serialization import dumps
+from app.db import causal_session, reader
+from app.repositories.order_repository import PRODUCT_PUBLIC_PROJECTION
+
+logger = logging.getLogger("api.home")
+
+FEATURED_LIMIT = 4
+
+def _featured_card(doc: dict) -> dict:
+    card = {k: v for k, v in doc.items() if k != "_id"}
+    if "_id" in doc:
+        card["id"] = str(doc["_id"])
+    # El frontend con ProductCard espera 'img' pero en BBDD a veces se usa 'image_url'
+    if "image_url" in card and "img" not in card:
+        card["img"] = card["image_url"]
+    return card
+
+class HomeSnapshot:
+    """
+    Materialized view of the home page payload.
+
+    A full rebuild runs the original queries (counts, newest products and the
+    best seller, read off the sold_count_id index). Between rebuilds, order
+    commits and product creations/deletions patch the counters in place, so
+    anonymous visitors are served pre-serialized bytes straight from memory.
+
+    Each uvicorn worker keeps its own snapshot; `home_snapshot_max_age_seconds`
+    bounds how stale it can get with respect to writes handled by other workers.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = asyncio.Lock()
+        self._built_at = 0.0
+        self._ready = False
+        self._dirty = False
+        self._rebuilding = False
+        self._total_products = 0
+        self._total_orders = 0
+        self._featured: list = []
+        # Best seller as {"id", "name", "total_sold"}; _runner_up is the second highest total at the
+        # last rebuild, an upper bound for every other product's, and _sold_since what sold since then
+        self._best: Optional[dict] = None
+        self._runner_up = 0
+        self._sold_since: dict = {}
+        self._body = b""
+        self._etag = ""
+
+    async def get(self) -> Tuple[bytes, str]:
+        """Returns (json body, etag), rebuilding first if the snapshot is missing, dirty or too old."""
+        if self._needs_rebuild():
+            async with self._lock:
+                # Another request may have rebuilt it while we waited for the lock
+                if self._needs_rebuild():
+                    await self.rebuild()
+        return self._body, self._etag
+
+    def _needs_rebuild(self) -> bool:
+        return not self._ready or self._dirty or time.monotonic() - self._built_at > self.max_age
+
+    async def rebuild(self):
+        self._rebuilding = True
+        # Writes from here on may be missed by the reads below: _can_patch() marks them dirty again
+        self._dirty = False
+        try:
+            home_db = reader("home")
+            # Sesión causal: leído de una réplica, incluye las escrituras que marcaron el snapshot como sucio
+            async with causal_session("home") as session:
+                total_products = await home_db.products.count_documents({}, session=session)
+                total_orders = await home_db.orders.count_documents({}, session=session)
+                cursor = home_db.products.find({}, PRODUCT_PUBLIC_PROJECTION, session=session).sort("_id", -1).limit(FEATURED_LIMIT)
+                featured = [_featured_card(doc) for doc in await cursor.to_list(length=FEATURED_LIMIT)]
+
+                best, runner_up = None, 0
+                try:
+                    # sold_count lo mantiene el checkout (y el stock ledger): una lectura del índice sold_count_id
+                    cursor = home_db.products.find({"sold_count": {"$gt": 0}}, {"name": 1, "sold_count": 1}, session=session)
+                    top = await cursor.sort([("sold_count", -1), ("_id", -1)]).limit(2).to_list(length=2)
+                    if top:
+                        best = {"id": str(top[0]["_id"]), "name": top[0].get("name"), "total_sold": top[0]["sold_count"]}
+                    if len(top) > 1:
+                        runner_up = top[1]["sold_count"]
+                except Exception as e:
+                    logger.warning(f"Best seller query failed, falling back to newest product: {e}")
+        finally:
+            self._rebuilding = False
+
+        self._total_products = total_products
+        self._total_orders = total_orders
+        self._featured = featured
+        self._best = best
+        self._runner_up = runner_up
+        self._sold_since = {}
+        self._built_at = time.monotonic()
+        self._ready = True
+        self._render()
+
+    def _render(self):
+        best_seller = None
+        if self._best is not None:
+            best_seller = {"name": self._best["name"]}
+        elif self._featured:
+            best_seller = {"name": self._featured[0].get("name", "N/A")}
+
+        payload = {
+            "featuredProducts": self._featured,
+            "stats": {
+                "total_products": self._total_products,
+                "total_orders": self._total_orders,
+                "rating": "4.9"  # Harcoded review average for now
+            },
+            "bestSeller": best_seller
+        }
+        # Bytes ya codificados: el endpoint los sirve tal cual en cada petición
+        self._body = dumps(payload)
+        self._etag = make_etag(self._body)
+
+    def _can_patch(self) -> bool:
+        if self._rebuilding:
+            # The rebuild may have read past this write already: rebuild again on the next read
+            self._dirty = True
+            return False
+        # Before the first build the first rebuild will already see the write
+        return self._ready
+
+    def record_order(self, order: dict):
+        """Applies a committed order to the counters and best-seller totals."""
+        if not self._can_patch():
+            return
+        self._total_orders += 1
+        for item in order.get("items", []):
+            quantity = item.get("quantity", 0)
+            if self._best is not None and item["id"] == self._best["id"]:
+                self._best["total_sold"] += quantity
+                continue
+            sold = self._sold_since.get(item["id"], 0) + quantity
+            self._sold_since[item["id"]] = sold
+            # At most _runner_up + sold: if that can't beat the leader, the leader stays exact
+            leader = self._best["total_sold"] if self._best is not None else 0
+            if self._runner_up + sold <= leader:
+                continue
+            if self._runner_up == 0:
+                # Only the leader had sold at the last rebuild, so 'sold' is the exact total
+                if self._best is not None:
+                    self._sold_since[self._best["id"]] = self._best["total_sold"]
+                self._best = {"id": item["id"], "name": item.get("name"), "total_sold": sold}
+            else:
+                # It may have overtaken the leader: the next read re-reads it from the index
+                self._dirty = True
+        self._render()
+
+    def product_created(self, product: dict):
+        if not self._can_patch():
+            return
+        self._total_products += 1
+        # Newest first, same order as sort("_id", -1)
+        self._featured = [_featured_card(product)] + self._featured[:FEATURED_LIMIT - 1]
+        self._render()
+
+    def product_deleted(self, product_id: str):
+        if not self._can_patch():
+            return
+        self._total_products = max(0, self._total_products - 1)
+        if any(card.get("id") == product_id for card in self._featured):
+            # We need the next-newest product to refill the grid: rebuild on the next read
+            self._dirty = True
+        else:
+            self._render()
+
+    def invalidate(self):
+        """Forces a rebuild on the next read (e.g. a featured product was edited)."""
+        self._dirty = True
+
+home_snapshot = HomeSnapshot(settings.home_snapshot_max_age_seconds)
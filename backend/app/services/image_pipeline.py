@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import AsyncIterator, BinaryIO, Dict, Optional
+from fastapi import HTTPException, Request, UploadFile
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from app.core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - sin Pillow se guarda solo el original
+    Image = None
+
+logger = logging.getLogger("api.images")
+
+# --- Subida de imágenes de productos ---
+# 0. El endpoint lee el multipart él mismo (save_request), después de autenticar: se rechaza
+#    por Content-Length sin leer nada y el stream se corta en cuanto supera el límite.
+# 1. El archivo se copia por bloques a un temporal en un thread (nunca en el event loop),
+#    calculando su SHA-256 y cortando en cuanto supera settings.upload_max_bytes.
+# 2. El nombre final es el hash del contenido: subir dos veces la misma imagen no
+#    duplica archivos (y el nombre nunca cambia de contenido, así que es cacheable).
+# 3. Las variantes WebP redimensionadas se generan en un pool de procesos (decodificar
+#    y redimensionar es CPU pura y retendría el GIL del worker).
+
+# Ancho máximo de cada variante (nunca se amplía una imagen más pequeña)
+VARIANTS = {"thumb": 320, "medium": 800, "full": 1600}
+WEBP_QUALITY = 82
+CHUNK_SIZE = 1024 * 1024
+# Margen del cuerpo multipart (separadores, cabeceras de cada parte) sobre upload_max_bytes
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Sin Pillow no se puede convertir: se acepta el original solo en estos formatos
+_PASSTHROUGH_TYPES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp", "image/gif": "gif"}
+
+class UploadTooLarge(Exception):
+    pass
+
+def _spool_to_disk(source: BinaryIO, tmp_path: str, max_bytes: int) -> str:
+    """Copia 'source' a 'tmp_path' por bloques. Devuelve el SHA-256 del contenido."""
+    digest = hashlib.sha256()
+    written = 0
+    with open(tmp_path, "wb") as out:
+        while chunk := source.read(CHUNK_SIZE):
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadTooLarge()
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+async def _limited(stream: AsyncIterator[bytes], limit: int, detail: str) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise HTTPException(413, detail)
+        yield chunk
+
+def _variant_name(key: str, variant: str) -> str:
+    return f"{key}-{variant}.webp"
+
+def render_variants(src_path: str, out_dir: str, key: str) -> Dict[str, str]:
+    """
+    Genera las variantes WebP de 'src_path' en 'out_dir'. Se ejecuta en el pool de procesos.
+    Lanza ValueError si el archivo no es una imagen válida.
+    """
+    try:
+        with Image.open(src_path) as img:
+            img.load()
+            # Respeta la orientación EXIF de las fotos de móvil
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "P") else "RGB")
+            names = {}
+            for variant, width in VARIANTS.items():
+                resized = img.copy()
+                resized.thumbnail((width, width * 4), Image.LANCZOS)
+                name = _variant_name(key, variant)
+                tmp = os.path.join(out_dir, f".{name}.{uuid.uuid4().hex}")
+                resized.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+                # Renombrado atómico: nadie sirve nunca un archivo a medio escribir
+                os.replace(tmp, os.path.join(out_dir, name))
+                names[variant] = name
+            return names
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Invalid image: {e}") from e
+
+class ImagePipeline:
+    """Guarda subidas de imágenes con nombre por contenido y genera sus variantes."""
+
+    def __init__(self, upload_dir: str, max_bytes: int, workers: int):
+        self.upload_dir = upload_dir
+        self.max_bytes = max_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[Executor] = None
+        self.processed = 0
+        self.deduplicated = 0
+        if Image is None:
+            logger.warning("Pillow is not installed: uploads are stored without resized variants")
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            # "spawn" por lo mismo que el pool de bcrypt: no heredar event loop ni cliente de Mongo
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _too_large(self) -> str:
+        return f"Image exceeds the {self.max_bytes // (1024 * 1024)} MB limit"
+
+    async def save_request(self, request: Request, field: str = "file") -> Dict[str, str]:
+        """
+        Lee el campo 'field' del cuerpo multipart de 'request' y lo guarda (ver save()).
+        Nunca lee más de upload_max_bytes (más el margen del multipart) del cliente.
+        """
+        limit = self.max_bytes + MULTIPART_OVERHEAD
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            raise HTTPException(413, self._too_large())
+        if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+            raise HTTPException(400, f"Expected a multipart/form-data body with a '{field}' field")
+
+        parser = MultiPartParser(request.headers, _limited(request.stream(), limit, self._too_large()), max_files=1, max_fields=10)
+        try:
+            form = await parser.parse()
+        except MultiPartException as e:
+            raise HTTPException(400, e.message)
+        try:
+            file = form.get(field)
+            if not isinstance(file, StarletteUploadFile):
+                raise HTTPException(422, f"Field '{field}' must be a file")
+            return await self.save(file)
+        finally:
+            await form.close()
+
+    async def save(self, file: StarletteUploadFile) -> Dict[str, str]:
+        """Guarda la imagen subida. Devuelve {variante: nombre de archivo dentro de upload_dir}."""
+        if not (file.content_type or "").startswith("image/"):
+            raise HTTPException(400, "File must be an image")
+
+        tmp_dir = os.path.join(self.upload_dir, ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+        try:
+            try:
+                digest = await asyncio.to_thread(_spool_to_disk, file.file, tmp_path, self.max_bytes)
+            except UploadTooLarge:
+                raise HTTPException(413, self._too_large())
+            key = digest[:32]
+            if Image is None:
+                return await asyncio.to_thread(self._store_original, file.content_type, tmp_path, key)
+
+            names = {variant: _variant_name(key, variant) for variant in VARIANTS}
+            if all(os.path.exists(os.path.join(self.upload_dir, name)) for name in names.values()):
+                self.deduplicated += 1
+                return names
+            loop = asyncio.get_running_loop()
+            try:
+                names = await loop.run_in_executor(self._get_executor(), render_variants, tmp_path, self.upload_dir, key)
+            except ValueError:
+                raise HTTPException(400, "File is not a valid image")
+            self.processed += 1
+            return names
+        finally:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def _store_original(self, content_type: str, tmp_path: str, key: str) -> Dict[str, str]:
+        extension = _PASSTHROUGH_TYPES.get(content_type)
+        if extension is None:
+            raise HTTPException(400, f"Unsupported image type: {content_type}")
+        name = f"{key}.{extension}"
+        path = os.path.join(self.upload_dir, name)
+        if os.path.exists(path):
+            self.deduplicated += 1
+        else:
+            os.replace(tmp_path, path)
+            self.processed += 1
+        return {variant: name for variant in VARIANTS}
+
+    def stats(self) -> dict:
+        return {
+            "variants": "webp" if Image is not None else "original-only",
+            "workers": self.workers,
+            "max_bytes": self.max_bytes,
+            "processed": self.processed,
+            "deduplicated": self.deduplicated,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+image_pipeline = ImagePipeline(settings.uploads_dir, settings.upload_max_bytes, settings.image_workers)
@@ -0,0 +1,194 @@
+"""
+Métricas del panel de administración precalculadas (rollups).
+
+En lugar de contar colecciones y agrupar todos los pedidos en cada refresco del
+dashboard, cada alta incrementa unos contadores:
+
+- metrics {_id: "totals"}: totales históricos (pedidos, ingresos, unidades, usuarios, productos).
+- metrics_daily {_id: "YYYY-MM-DD"}: lo mismo por día (UTC), para desgloses por rango.
+
+Leer el dashboard es un find_one; un rango de fechas, una lectura por día.
+Los datos anteriores a los contadores (o si se desajustan) se recalculan con:
+
+    python -m app.services.metrics rebuild
+
+El arranque lo lanza solo si aún no existen los totales. Un solo rebuild a la vez
+(lock en metrics {_id: "rebuild"}, también entre workers), y no pisa las altas que
+llegan mientras tanto: cuenta los documentos anteriores a su inicio y aplica la
+diferencia con $inc sobre los contadores que ya siguen incrementándose.
+"""
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.db import db, reader
+
+TOTALS_ID = "totals"
+REBUILD_LOCK_ID = "rebuild"
+# Un lock más antiguo es de un rebuild que murió a medias
+REBUILD_LOCK_TTL = timedelta(minutes=30)
+DAY_FORMAT = "%Y-%m-%d"
+# Campos de cada día (y de los totales, que además llevan users/products)
+DAILY_FIELDS = ("orders", "revenue", "units", "new_users")
+# Días máximos de un desglose por rango
+MAX_RANGE_DAYS = 366
+
+def _day(moment: Optional[datetime]) -> str:
+    moment = moment or datetime.now(timezone.utc)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime(DAY_FORMAT)
+
+async def _increment(day: str, daily: dict, totals: dict):
+    await asyncio.gather(
+        db.metrics_daily.update_one({"_id": day}, {"$inc": daily}, upsert=True),
+        db.metrics.update_one({"_id": TOTALS_ID}, {"$inc": totals}, upsert=True),
+    )
+
+async def record_order(order: dict):
+    """Llamar tras crear un pedido."""
+    units = sum(item["quantity"] for item in order["items"])
+    increments = {"orders": 1, "revenue": float(order["total"]), "units": units}
+    await _increment(_day(order.get("created_at")), increments, increments)
+
+async def record_user(user: dict):
+    """Llamar tras registrar un usuario."""
+    await _increment(_day(user.get("created_at")), {"new_users": 1}, {"users": 1})
+
+async def record_product(delta: int):
+    """Llamar tras crear (+1) o borrar (-1) un producto."""
+    await db.metrics.update_one({"_id": TOTALS_ID}, {"$inc": {"products": delta}}, upsert=True)
+
+async def totals() -> dict:
+    doc = await reader("admin.stats").metrics.find_one({"_id": TOTALS_ID}) or {}
+    return {
+        "products": doc.get("products", 0),
+        "users": doc.get("users", 0),
+        "orders": doc.get("orders", 0),
+        "revenue": round(doc.get("revenue", 0.0), 2),
+        "units": doc.get("units", 0),
+    }
+
+async def daily_range(start: date, end: date) -> dict:
+    """Desglose por día entre 'start' y 'end' (ambos incluidos), con los días sin actividad a 0."""
+    days = await reader("admin.stats").metrics_daily.find(
+        {"_id": {"$gte": start.strftime(DAY_FORMAT), "$lte": end.strftime(DAY_FORMAT)}}
+    ).to_list(length=MAX_RANGE_DAYS)
+    by_day = {doc["_id"]: doc for doc in days}
+    breakdown = []
+    current = start
+    while current <= end:
+        doc = by_day.get(current.strftime(DAY_FORMAT), {})
+        breakdown.append({"date": current.isoformat(), **{field: doc.get(field, 0) for field in DAILY_FIELDS}})
+        current += timedelta(days=1)
+    summary = {field: sum(day[field] for day in breakdown) for field in DAILY_FIELDS}
+    summary["revenue"] = round(summary["revenue"], 2)
+    return {"from": start.isoformat(), "to": end.isoformat(), **summary, "days": breakdown}
+
+# Día (UTC) de created_at; null si falta o no es una fecha (documentos antiguos)
+_CREATED_DAY = {"$cond": [
+    {"$eq": [{"$type": "$created_at"}, "date"]},
+    {"$dateToString": {"format": DAY_FORMAT, "date": "$created_at"}},
+    None,
+]}
+
+async def _claim_rebuild(database, now: datetime) -> bool:
+    try:
+        await database.metrics.insert_one({"_id": REBUILD_LOCK_ID, "started_at": now})
+        return True
+    except DuplicateKeyError:
+        stale = await database.metrics.find_one_and_update(
+            {"_id": REBUILD_LOCK_ID, "started_at": {"$lt": now - REBUILD_LOCK_TTL}},
+            {"$set": {"started_at": now}},
+        )
+        return stale is not None
+
+def _diff(target: dict, current: dict, fields) -> dict:
+    return {field: target.get(field, 0) - current.get(field, 0) for field in fields if target.get(field, 0) != current.get(field, 0)}
+
+async def rebuild(database=None) -> Optional[dict]:
+    """
+    Recalcula todos los rollups desde orders, users y products. Devuelve los totales,
+    o None si otro proceso ya está haciendo un rebuild.
+    """
+    database = db if database is None else database
+    started_at = datetime.now(timezone.utc)
+    if not await _claim_rebuild(database, started_at):
+        return None
+    try:
+        return await _rebuild(database, started_at)
+    finally:
+        await database.metrics.delete_one({"_id": REBUILD_LOCK_ID, "started_at": started_at})
+
+async def _rebuild(database, started_at: datetime) -> dict:
+    # Los contadores tal y como están ahora; lo que se registre a partir de aquí se les
+    # suma con $inc y no entra en las agregaciones (_id posterior a 'boundary')
+    products = await database.products.count_documents({})
+    current_totals = await database.metrics.find_one({"_id": TOTALS_ID}) or {}
+    current_days = {doc["_id"]: doc async for doc in database.metrics_daily.find({})}
+    before = {"$match": {"_id": {"$lt": ObjectId.from_datetime(started_at)}}}
+
+    days = defaultdict(lambda: dict.fromkeys(DAILY_FIELDS, 0))
+    totals_doc = {"orders": 0, "revenue": 0.0, "units": 0, "users": 0, "products": products}
+
+    orders = database.orders.aggregate([before, {"$group": {
+        "_id": _CREATED_DAY,
+        "orders": {"$sum": 1},
+        "revenue": {"$sum": "$total"},
+        "units": {"$sum": {"$sum": "$items.quantity"}},
+    }}])
+    async for row in orders:
+        for field in ("orders", "revenue", "units"):
+            totals_doc[field] += row[field]
+            if row["_id"]:
+                days[row["_id"]][field] = row[field]
+
+    users = database.users.aggregate([before, {"$group": {
+        "_id": _CREATED_DAY,
+        "count": {"$sum": 1},
+    }}])
+    async for row in users:
+        # Usuarios antiguos sin created_at: cuentan en el total pero no en ningún día
+        totals_doc["users"] += row["count"]
+        if row["_id"]:
+            days[row["_id"]]["new_users"] = row["count"]
+
+    # $inc de la diferencia en lugar de reemplazar: conserva lo registrado durante el rebuild
+    ops = []
+    for day in set(days) | set(current_days):
+        delta = _diff(days.get(day, {}), current_days.get(day, {}), DAILY_FIELDS)
+        if delta:
+            ops.append(UpdateOne({"_id": day}, {"$inc": delta}, upsert=True))
+    if ops:
+        await database.metrics_daily.bulk_write(ops, ordered=False)
+    delta = _diff(totals_doc, current_totals, totals_doc)
+    if delta:
+        await database.metrics.update_one({"_id": TOTALS_ID}, {"$inc": delta}, upsert=True)
+    return totals_doc
+
+async def ensure_metrics(database=None) -> bool:
+    """Rebuild solo si los rollups aún no existen (primer arranque). True si lo lanzó."""
+    database = db if database is None else database
+    if await database.metrics.find_one({"_id": TOTALS_ID}, {"_id": 1}):
+        return False
+    # None: otro worker lo está haciendo
+    return await rebuild(database) is not None
+
+async def _main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.services.metrics", description="Rollups de métricas del panel de administración")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args(argv)
+    result = await rebuild()
+    if result is None:
+        print("Another metrics rebuild is already running")
+        return 1
+    print(result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
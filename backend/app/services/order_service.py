@@ -1,12 +1,21 @@
 import logging
 from datetime import datetime, timezone
 from fastapi import HTTPException, status
-from typing import List
+from typing import List, Optional, Tuple, Union
+from app.core.response_cache import response_cache
+from app.core.serialization import DocumentShape
+from app.db import db
 from app.repositories.order_repository import OrderRepository
-from app.schemas.order import OrderCreate, OrderOut
+from app.schemas.order import OrderCreate, OrderOut, OrderSummary
+from app.services import metrics
+from app.services.home_service import home_snapshot
+from app.services.product_fields import refresh_derived_fields
 
 logger = logging.getLogger("api.orders")
 
+_order_shape = DocumentShape(OrderOut)
+_summary_shape = DocumentShape(OrderSummary)
+
 class OrderService:
     def __init__(self):
         self.order_repo = OrderRepository()
@@ -22,8 +31,6 @@ class OrderService:
         
         try:
             created_order = await self.order_repo.create_with_transaction(order_data)
-            logger.info(f"Order created successfully for user {user_id}, Order ID: {created_order['_id']}")
-            return OrderOut(id=str(created_order["_id"]), **order_data)
         except ValueError as ve:
             logger.warning(f"Stock error creating order for user {user_id}: {str(ve)}")
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(ve))
@@ -31,6 +38,55 @@ class OrderService:
             logger.error(f"Failed to create order for user {user_id}: {str(e)}")
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to proceed with checkout")
 
-    async def get_user_orders(self, user_id: str) -> List[OrderOut]:
-        orders = await self.order_repo.get_by_user_id(user_id)
-        return [OrderOut(id=str(o.pop("_id")), **o) for o in orders]
+        logger.info(f"Order created successfully for user {user_id}, Order ID: {created_order['_id']}")
+        await self._after_commit(created_order, user_id)
+        return OrderOut(id=str(created_order["_id"]), **order_data)
+
+    async def _after_commit(self, order: dict, user_id: str):
+        # El pedido ya está creado: un fallo aquí no debe convertirse en un 500, o el cliente
+        # reintentaría y crearía un segundo pedido. Cada paso se registra y falla por separado.
+        order_id = order["_id"]
+        product_ids = [item["id"] for item in order["items"]]
+        try:
+            home_snapshot.record_order(order)
+        except Exception as e:
+            logger.error(f"Failed to update home snapshot for order {order_id}: {e}")
+        try:
+            # El pedido ha podido agotar algún producto: in_stock de los listados
+            await refresh_derived_fields(db.products, product_ids)
+        except Exception as e:
+            logger.error(f"Failed to refresh derived fields for order {order_id}: {e}")
+        try:
+            await response_cache.purge(
+                *{f"product:{product_id}" for product_id in product_ids},
+                "catalog", "home", f"orders:user:{user_id}",
+            )
+        except Exception as e:
+            logger.error(f"Failed to purge cached responses for order {order_id}: {e}")
+        try:
+            await metrics.record_order(order)
+        except Exception as e:
+            logger.error(f"Failed to update metrics for order {order_id}: {e}")
+
+    async def get_user_orders(
+        self, user_id: str, limit: int, cursor: Optional[str] = None, summary: bool = False
+    ) -> Tuple[List[Union[OrderOut, OrderSummary]], Optional[str]]:
+        """A page of the user's order history (newest first) and the next-page cursor."""
+        orders, next_cursor = await self.order_repo.list_by_user(user_id, limit, cursor, summary)
+        model = OrderSummary if summary else OrderOut
+        return [model(id=str(o.pop("_id")), **o) for o in orders], next_cursor
+
+    async def get_user_order_documents(
+        self, user_id: str, limit: int, cursor: Optional[str] = None, summary: bool = False
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Same as get_user_orders, shaped but without building models (fast JSON path)."""
+        orders, next_cursor = await self.order_repo.list_by_user(user_id, limit, cursor, summary)
+        shape = _summary_shape if summary else _order_shape
+        return [shape(o) for o in orders], next_cursor
+
+    async def get_user_order(self, user_id: str, order_id: str) -> dict:
+        """Full order document; 404 if it does not exist or belongs to someone else."""
+        order = await self.order_repo.get_for_user(user_id, order_id)
+        if order is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        return order
@@ -0,0 +1,51 @@
+from typing import Iterable
+from bson import ObjectId
+
+# --- Campos mantenidos al escribir un producto ---
+# min_price e in_stock se guardan en el documento al escribir para que los listados
+# (vista "summary") no tengan que recorrer las variantes de cada producto.
+# Productos con variantes: se calculan sobre variants[]; los antiguos usan price/stock.
+# version/updated_at cambian con cualquier escritura (edición, stock, ventas) y son
+# la base de los ETag/Last-Modified del catálogo (ver app/services/catalog_version.py).
+
+# Campos que devuelve la vista "summary" del catálogo (lo que pinta la tarjeta del grid)
+SUMMARY_FIELDS = ("name", "slug", "type", "image_url", "min_price", "in_stock", "is_new", "featured")
+
+def derived_fields(product: dict) -> dict:
+    """min_price/in_stock calculados en Python (para documentos que aún no están en MongoDB)."""
+    variants = product.get("variants") or []
+    if variants:
+        return {
+            "min_price": min(v["price"] for v in variants),
+            "in_stock": sum(v.get("stock", 0) for v in variants) > 0,
+        }
+    return {"min_price": product.get("price"), "in_stock": (product.get("stock") or 0) > 0}
+
+def touch(update: dict) -> dict:
+    """Añade a un update de MongoDB el incremento de 'version' y la fecha (del servidor) de 'updated_at'."""
+    return {**update, "$inc": {**update.get("$inc", {}), "version": 1}, "$currentDate": {"updated_at": True}}
+
+# Lo mismo como etapa de un update de tipo pipeline
+TOUCH_STAGE = {"$set": {"version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}, "updated_at": "$$NOW"}}
+
+_HAS_VARIANTS = {"$gt": [{"$size": {"$ifNull": ["$variants", []]}}, 0]}
+
+# Mismo cálculo como update de tipo pipeline, para recalcular en MongoDB sin leer el documento.
+# Cuenta como escritura: si in_stock cambia, los ETag también
+DERIVED_FIELDS_UPDATE = [{"$set": {
+    "min_price": {"$cond": [_HAS_VARIANTS, {"$min": "$variants.price"}, {"$ifNull": ["$price", None]}]},
+    "in_stock": {"$gt": [{"$cond": [_HAS_VARIANTS, {"$sum": "$variants.stock"}, {"$ifNull": ["$stock", 0]}]}, 0]},
+}}, TOUCH_STAGE]
+
+async def refresh_derived_fields(collection, product_ids: Iterable[str]):
+    """Recalcula min_price/in_stock de los productos indicados (tras cambios de stock)."""
+    ids = list({ObjectId(pid) for pid in product_ids if ObjectId.is_valid(pid)})
+    if ids:
+        await collection.update_many({"_id": {"$in": ids}}, DERIVED_FIELDS_UPDATE)
+
+async def backfill_derived_fields(collection) -> int:
+    """Calcula los campos mantenidos de productos creados antes de que existieran. Devuelve cuántos."""
+    result = await collection.update_many(
+        {"$or": [{"in_stock": {"$exists": False}}, {"updated_at": {"$exists": False}}]}, DERIVED_FIELDS_UPDATE
+    )
+    return result.modified_count
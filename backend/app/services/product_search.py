@@ -0,0 +1,210 @@
+import asyncio
+import bisect
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import TEXT
+from app.core.config import settings
+from app.db import causal_session, reader
+
+# Searchable fields and their relevance weight (shared by both backends)
+SEARCH_WEIGHTS = {
+    "name": 10,
+    "type": 5,
+    "short_description": 3,
+    "long_description": 1,
+}
+
+# Mongo text index over the same fields. default_language "none" disables
+# stemming/stop words: product names are mostly proper nouns (Pikachu, Eevee...).
+TEXT_INDEX_KEYS = [(field, TEXT) for field in SEARCH_WEIGHTS]
+TEXT_INDEX_OPTIONS = {"name": "product_text_search", "weights": SEARCH_WEIGHTS, "default_language": "none"}
+
+MAX_QUERY_LENGTH = 100
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def normalize(text: str) -> str:
+    """Lowercase and strip accents so 'Pokémon' matches 'pokemon'."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return _TOKEN_RE.findall(normalize(text))
+
+def trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def text_search_query(search: str) -> dict:
+    """
+    $text filter for the Mongo backend. Each term is quoted so that operators
+    in user input ('-' negation, phrase quotes) are matched literally.
+    Whole words only: 'pika' does not match 'Pikachu' (the memory backend does).
+    """
+    terms = tokenize(search[:MAX_QUERY_LENGTH])
+    return {"$search": " ".join(f'"{term}"' for term in terms)}
+
+def regex_search_query(search: str) -> dict:
+    """Legacy unanchored regex on name, with metacharacters escaped."""
+    return {"$regex": re.escape(search[:MAX_QUERY_LENGTH]), "$options": "i"}
+
+class ProductSearchIndex:
+    """
+    In-process inverted index over the catalog, with prefix and trigram matching.
+
+    - Exact token hits score the field weight.
+    - Prefix hits ('pika' -> 'pikachu') score a fraction of it, so search-as-you-type works.
+    - Typos fall back to trigram similarity against the token vocabulary.
+    Every query term must match (AND); documents are ranked by total score.
+
+    The index is patched on product writes and fully rebuilt from Mongo when it
+    is older than `search_index_max_age_seconds` (writes from other workers).
+    """
+
+    PREFIX_FACTOR = 0.7
+    FUZZY_FACTOR = 0.4
+    FUZZY_MIN_SIMILARITY = 0.45
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = asyncio.Lock()
+        self._built_at = 0.0
+        self._ready = False
+        # token -> {product_id: score}
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # product_id -> tokens it contributed (for removals)
+        self._doc_tokens: Dict[str, set] = {}
+        self._doc_types: Dict[str, Optional[str]] = {}
+        self._vocabulary: List[str] = []
+        self._trigrams: Dict[str, set] = defaultdict(set)
+        self._vocab_dirty = False
+
+    async def ensure_ready(self):
+        if self._ready and time.monotonic() - self._built_at <= self.max_age:
+            return
+        async with self._lock:
+            if not self._ready or time.monotonic() - self._built_at > self.max_age:
+                await self.rebuild()
+
+    async def rebuild(self, collection=None):
+        projection = {field: 1 for field in SEARCH_WEIGHTS}
+        if collection is not None:
+            docs = await collection.find({}, projection).to_list(length=None)
+        else:
+            # Sesión causal: leído de una réplica, no es más antiguo que el primario al empezar
+            async with causal_session("catalog.search_index") as session:
+                docs = await reader("catalog.search_index").products.find({}, projection, session=session).to_list(length=None)
+        self._postings = defaultdict(dict)
+        self._doc_tokens = {}
+        self._doc_types = {}
+        for doc in docs:
+            self._add(doc)
+        self._rebuild_vocabulary()
+        self._built_at = time.monotonic()
+        self._ready = True
+
+    def _add(self, doc: dict):
+        product_id = str(doc.get("_id") or doc.get("id"))
+        scores: Dict[str, float] = defaultdict(float)
+        for field, weight in SEARCH_WEIGHTS.items():
+            for token in tokenize(doc.get(field)):
+                scores[token] += weight
+        for token, score in scores.items():
+            self._postings[token][product_id] = score
+        self._doc_tokens[product_id] = set(scores)
+        self._doc_types[product_id] = doc.get("type")
+
+    def _remove(self, product_id: str):
+        for token in self._doc_tokens.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._doc_types.pop(product_id, None)
+
+    def _rebuild_vocabulary(self):
+        self._vocabulary = sorted(self._postings)
+        self._trigrams = defaultdict(set)
+        for token in self._vocabulary:
+            for gram in trigrams(token):
+                self._trigrams[gram].add(token)
+        self._vocab_dirty = False
+
+    def upsert(self, doc: dict):
+        """Re-indexes one product after create/update (no-op until the first build)."""
+        if not self._ready:
+            return
+        product_id = str(doc.get("_id") or doc.get("id"))
+        self._remove(product_id)
+        self._add(doc)
+        self._vocab_dirty = True
+
+    def remove(self, product_id: str):
+        if not self._ready:
+            return
+        self._remove(product_id)
+        self._vocab_dirty = True
+
+    def _prefix_tokens(self, term: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, term)
+        matches = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches.append(token)
+        return matches
+
+    def _fuzzy_tokens(self, term: str) -> List[Tuple[str, float]]:
+        grams = trigrams(term)
+        candidates: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for token in self._trigrams.get(gram, ()):
+                candidates[token] += 1
+        matches = []
+        for token, shared in candidates.items():
+            similarity = shared / len(grams | trigrams(token))
+            if similarity >= self.FUZZY_MIN_SIMILARITY:
+                matches.append((token, similarity))
+        return matches
+
+    def _term_scores(self, term: str) -> Dict[str, float]:
+        scores: Dict[str, float] = defaultdict(float)
+        for token in self._prefix_tokens(term):
+            factor = 1.0 if token == term else self.PREFIX_FACTOR
+            for product_id, score in self._postings[token].items():
+                scores[product_id] = max(scores[product_id], score * factor)
+        if not scores and len(term) >= 3:
+            for token, similarity in self._fuzzy_tokens(term):
+                for product_id, score in self._postings[token].items():
+                    scores[product_id] = max(scores[product_id], score * similarity * self.FUZZY_FACTOR)
+        return scores
+
+    def search(self, text: str, type: Optional[str] = None) -> List[ObjectId]:
+        """Product ids matching every term of 'text', best match first."""
+        if self._vocab_dirty:
+            self._rebuild_vocabulary()
+        terms = tokenize(text[:MAX_QUERY_LENGTH])
+        if not terms:
+            return []
+        totals: Optional[Dict[str, float]] = None
+        for term in terms:
+            scores = self._term_scores(term)
+            if totals is None:
+                totals = dict(scores)
+            else:
+                totals = {pid: totals[pid] + scores[pid] for pid in totals.keys() & scores.keys()}
+            if not totals:
+                return []
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [
+            ObjectId(product_id) for product_id, _ in ranked
+            if type is None or self._doc_types.get(product_id) == type
+        ]
+
+product_search = ProductSearchIndex(settings.search_index_max_age_seconds)
@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.core.config import settings
+from app.db import db
+from app.repositories.order_repository import SOLD_FLUSHES_FIELD
+from app.services.product_fields import TOUCH_STAGE, refresh_derived_fields, touch
+
+logger = logging.getLogger("api.stock")
+
+# (product_id, size or None)
+StockKey = Tuple[str, Optional[str]]
+
+# Flush tokens remembered per product. A retry comes one flush interval later, so this only
+# has to cover the flushes every worker makes on the same product in that window.
+SOLD_FLUSHES_KEPT = 64
+
+def _key(item: dict) -> StockKey:
+    return item["id"], item.get("size") or None
+
+class StockLedger:
+    """
+    In-process stock counters for flash sales.
+
+    Instead of one find_one_and_update per order on the same hot product document,
+    each worker leases stock from Mongo in chunks (`stock_ledger_chunk` units, one
+    atomic pipeline update that never takes more than is available) and admits
+    orders against its local counters without any I/O.
+
+    Never oversells: leased units are already subtracted from Mongo's stock, so
+    the sum of everything all workers can sell is bounded by the real stock.
+
+    Durability:
+    - Every lease is recorded in `stock_leases` with the units still held and the
+      sequence number of the last admitted order reflected in that figure.
+    - Orders carry {"ledger": {"worker", "seq"}}. If a worker dies, `reconcile()`
+      (run at startup by the survivors) returns held units minus the ones sold by
+      orders newer than the last flush. A crash can only lose units, never resell them.
+    - Sold counts are batched into `sold_count` on flush; idle leases go back to Mongo.
+      Each batch carries a token recorded on the product in the same update, so a batch
+      whose outcome is unknown is retried as is and applied at most once.
+    """
+
+    def __init__(self, chunk: int, flush_interval: float, lease_ttl: float, idle_return: float, worker_id: Optional[str] = None):
+        self.chunk = chunk
+        self.flush_interval = flush_interval
+        self.lease_ttl = lease_ttl
+        self.idle_return = idle_return
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._held: Dict[StockKey, int] = defaultdict(int)
+        self._sold: Dict[StockKey, int] = defaultdict(int)
+        # Sold batches whose write failed or has an unknown outcome: (token, quantity), retried unchanged
+        self._unconfirmed: Dict[StockKey, Tuple[str, int]] = {}
+        self._last_used: Dict[StockKey, float] = {}
+        self._claim_locks: Dict[StockKey, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._seq = 0
+        self._flush_no = 0
+        self._task: Optional[asyncio.Task] = None
+        self.admitted = 0
+        self.rejected = 0
+        self.claims = 0
+        self.flushes = 0
+
+    # --- Admission -------------------------------------------------------
+
+    async def reserve(self, items: List[dict]) -> int:
+        """
+        Admits an order or raises ValueError. Returns the ledger sequence number
+        that must be stored with the order (see reconcile()).
+        """
+        needs: Dict[StockKey, int] = defaultdict(int)
+        names = {}
+        for item in items:
+            needs[_key(item)] += item["quantity"]
+            names.setdefault(_key(item), item["name"])
+
+        # Only touches Mongo when the local lease cannot cover the order
+        for key, quantity in needs.items():
+            if self._held[key] < quantity:
+                await self._claim(key, quantity)
+
+        # Check and decrement with no await in between: atomic within the event loop
+        for key, quantity in needs.items():
+            if self._held[key] < quantity:
+                self.rejected += 1
+                raise ValueError(f"Out of stock or invalid product/variant: {names[key]}")
+        now = time.monotonic()
+        for key, quantity in needs.items():
+            self._held[key] -= quantity
+            self._sold[key] += quantity
+            self._last_used[key] = now
+        self._seq += 1
+        self.admitted += 1
+        return self._seq
+
+    def release(self, items: List[dict]):
+        """Undoes a reserve() whose order could not be written."""
+        for item in items:
+            key = _key(item)
+            self._held[key] += item["quantity"]
+            self._sold[key] -= item["quantity"]
+
+    async def _claim(self, key: StockKey, wanted: int):
+        async with self._claim_locks[key]:
+            if self._held[key] >= wanted:
+                # Another coroutine topped it up while we waited
+                return
+            product_id, size = key
+            if not ObjectId.is_valid(product_id):
+                return
+            amount = max(self.chunk, wanted - self._held[key])
+            taken = await self._take_from_mongo(ObjectId(product_id), size, amount)
+            if taken:
+                self.claims += 1
+                self._held[key] += taken
+                await db.stock_leases.update_one(
+                    {"_id": self._lease_id(key)},
+                    {
+                        "$inc": {"qty": taken},
+                        "$set": {"worker": self.worker_id, "product_id": product_id, "size": size,
+                                 "heartbeat_at": datetime.now(timezone.utc)},
+                        "$setOnInsert": {"flushed_seq": self._seq},
+                    },
+                    upsert=True,
+                )
+
+    async def _take_from_mongo(self, product_id: ObjectId, size: Optional[str], amount: int) -> int:
+        """Atomically subtracts min(available, amount) from Mongo; returns what was taken."""
+        if size:
+            previous = await db.products.find_one_and_update(
+                {"_id": product_id, "variants": {"$elemMatch": {"size": size, "stock": {"$gt": 0}}}},
+                [{"$set": {"variants": {"$map": {
+                    "input": "$variants", "as": "v",
+                    "in": {"$cond": [
+                        {"$eq": ["$$v.size", size]},
+                        {"$mergeObjects": ["$$v", {"stock": {"$max": [0, {"$subtract": ["$$v.stock", amount]}]}}]},
+                        "$$v",
+                    ]},
+                }}}}, TOUCH_STAGE],
+                projection={"variants": 1},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if not previous:
+                return 0
+            variant = next(v for v in previous["variants"] if v.get("size") == size)
+            return min(variant.get("stock", 0), amount)
+
+        previous = await db.products.find_one_and_update(
+            {"_id": product_id, "stock": {"$gt": 0}},
+            [{"$set": {"stock": {"$max": [0, {"$subtract": ["$stock", amount]}]}}}, TOUCH_STAGE],
+            projection={"stock": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+        return min(previous["stock"], amount) if previous else 0
+
+    # --- Flush / lifecycle ----------------------------------------------
+
+    def _lease_id(self, key: StockKey) -> str:
+        return f"{self.worker_id}|{key[0]}|{key[1] or ''}"
+
+    def _sold_update(self, key: StockKey, token: str, quantity: int) -> UpdateOne:
+        # No-op if this token was already applied
+        return UpdateOne(
+            {"_id": ObjectId(key[0]), SOLD_FLUSHES_FIELD: {"$ne": token}},
+            touch({"$inc": {"sold_count": quantity},
+                   "$push": {SOLD_FLUSHES_FIELD: {"$each": [token], "$slice": -SOLD_FLUSHES_KEPT}}}),
+        )
+
+    def _stock_return(self, key: StockKey, quantity: int) -> UpdateOne:
+        product_id, size = key
+        if size:
+            return UpdateOne({"_id": ObjectId(product_id)}, touch({"$inc": {"variants.$[v].stock": quantity}}), array_filters=[{"v.size": size}])
+        return UpdateOne({"_id": ObjectId(product_id)}, touch({"$inc": {"stock": quantity}}))
+
+    async def flush(self, return_all: bool = False):
+        """Writes pending sold counts, refreshes leases and gives back idle (or all) stock."""
+        now = time.monotonic()
+        seq = self._seq
+        self._flush_no += 1
+        token = f"{self.worker_id}|{self._flush_no}"
+        # A pending batch goes out unchanged; new sales of that key wait until it is confirmed
+        sold, self._unconfirmed = self._unconfirmed, {}
+        for key, quantity in list(self._sold.items()):
+            if quantity and key not in sold:
+                sold[key] = (token, quantity)
+                del self._sold[key]
+
+        # (operation, kind, key, quantity, token) so that a failed write can be traced back to its counter
+        product_ops, returned = [], {}
+        for key, (batch_token, quantity) in sold.items():
+            product_ops.append((self._sold_update(key, batch_token, quantity), "sold", key, quantity, batch_token))
+        for key, held in list(self._held.items()):
+            idle = now - self._last_used.get(key, 0) > self.idle_return
+            if held > 0 and (return_all or idle):
+                returned[key] = held
+                self._held[key] = 0
+                product_ops.append((self._stock_return(key, held), "held", key, held, None))
+
+        lease_ops = []
+        heartbeat = datetime.now(timezone.utc)
+        for key, held in self._held.items():
+            if not held and key not in returned and key not in sold:
+                # Never leased, or already flushed as empty
+                continue
+            # Upsert: a lease deleted by a failed flush must reappear once the units are held again
+            lease_ops.append(UpdateOne(
+                {"_id": self._lease_id(key)},
+                {"$set": {"qty": held, "flushed_seq": seq, "heartbeat_at": heartbeat, "worker": self.worker_id,
+                          "product_id": key[0], "size": key[1]}},
+                upsert=True,
+            ))
+        try:
+            # Leases first: if we die before the stock is back in Mongo they under-report,
+            # so reconcile() can lose those units but never return them twice
+            if lease_ops:
+                await db.stock_leases.bulk_write(lease_ops, ordered=False)
+            await db.stock_leases.delete_many({"worker": self.worker_id, "qty": 0})
+        except Exception as e:
+            # Nothing reached the products: put every counter back for the next flush
+            self._restore(product_ops)
+            logger.error(f"Stock ledger flush failed: {e}")
+            return
+
+        try:
+            if product_ops:
+                await db.products.bulk_write([op for op, *_ in product_ops], ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            self._restore([entry for index, entry in enumerate(product_ops) if index in failed])
+            logger.error(f"Stock ledger flush partially failed ({len(failed)} writes): {e}")
+        except Exception as e:
+            # Unknown outcome: sold batches are retried with their token (applied at most once),
+            # a stock return has no token and retrying it could duplicate it
+            self._restore([entry for entry in product_ops if entry[1] == "sold"])
+            logger.error(f"Stock ledger flush failed, returned stock may be lost: {e}")
+        if returned:
+            # Stock devuelto: el producto puede volver a aparecer como disponible (in_stock)
+            await refresh_derived_fields(db.products, {key[0] for key in returned})
+        for key in returned:
+            # A claim may have refilled it while we were writing
+            if self._held.get(key) == 0:
+                self._held.pop(key, None)
+                self._last_used.pop(key, None)
+        self.flushes += 1
+
+    def _restore(self, entries):
+        for _, kind, key, quantity, token in entries:
+            if kind == "sold":
+                self._unconfirmed[key] = (token, quantity)
+            else:
+                self._held[key] += quantity
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Keep flushing: a dead loop would stop heartbeats and get our leases reclaimed
+                logger.error(f"Stock ledger flush loop error: {e}")
+
+    async def reconcile(self) -> int:
+        """
+        Returns to Mongo the stock held by workers whose lease heartbeat expired
+        (crashed without a clean shutdown). Returns units restored.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.lease_ttl)
+        restored = 0
+        expired = await db.stock_leases.find({"heartbeat_at": {"$lt": cutoff}}, {"_id": 1}).to_list(length=None)
+        for candidate in expired:
+            # Deleting first makes the lease ours: two workers starting at once cannot both return it
+            lease = await db.stock_leases.find_one_and_delete({"_id": candidate["_id"], "heartbeat_at": {"$lt": cutoff}})
+            if lease is None:
+                continue
+            # Orders admitted after the last flush are not reflected in lease.qty yet
+            pipeline = [
+                {"$match": {"ledger.worker": lease["worker"], "ledger.seq": {"$gt": lease.get("flushed_seq", 0)}}},
+                {"$unwind": "$items"},
+                {"$match": {"items.id": lease["product_id"], "items.size": lease.get("size")}},
+                {"$group": {"_id": None, "sold": {"$sum": "$items.quantity"}}},
+            ]
+            rows = await db.orders.aggregate(pipeline).to_list(length=1)
+            unflushed = rows[0]["sold"] if rows else 0
+            quantity = max(0, lease.get("qty", 0) - unflushed)
+            key = (lease["product_id"], lease.get("size"))
+            ops = [] if quantity == 0 else [self._stock_return(key, quantity)]
+            if unflushed:
+                ops.append(UpdateOne({"_id": ObjectId(key[0])}, touch({"$inc": {"sold_count": unflushed}})))
+            if ops:
+                await db.products.bulk_write(ops, ordered=False)
+            restored += quantity
+        if restored:
+            logger.warning(f"Stock ledger reconciled {restored} units from expired leases")
+        return restored
+
+    async def start(self):
+        await self.reconcile()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(return_all=True)
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "held_units": sum(self._held.values()),
+            "pending_sold": sum(self._sold.values()) + sum(quantity for _, quantity in self._unconfirmed.values()),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "claims": self.claims,
+            "flushes": self.flushes,
+        }
+
+stock_ledger = StockLedger(
+    settings.stock_ledger_chunk,
+    settings.stock_ledger_flush_interval_seconds,
+    settings.stock_ledger_lease_ttl_seconds,
+    settings.stock_ledger_idle_return_seconds,
+)
@@ -0,0 +1,82 @@
+"""
+Utilidades compartidas por los scripts de benchmark.
+
+Los benchmarks hablan con la API por HTTP usando httpx (pip install httpx).
+Por defecto montan la app en proceso (ASGITransport, sin red) contra el MongoDB
+configurado en .env; con --base-url apuntan a un servidor ya levantado.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+# Permite importar 'app' igual que seed_products.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+
+def percentile(samples, pct: float) -> float:
+    """Percentil por el método nearest-rank (suficiente para reportar p50/p99)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(label: str, samples, elapsed: float = None) -> dict:
+    """Imprime y devuelve p50/p99/media (en ms) de una lista de latencias en segundos."""
+    result = {
+        "label": label,
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "avg_ms": (sum(samples) / len(samples) * 1000) if samples else 0.0,
+    }
+    line = f"{label:<32} n={result['count']:<6} p50={result['p50_ms']:8.2f}ms p99={result['p99_ms']:8.2f}ms avg={result['avg_ms']:8.2f}ms"
+    if elapsed:
+        result["rps"] = len(samples) / elapsed
+        line += f" rps={result['rps']:8.1f}"
+    print(line)
+    return result
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--base-url", default=None, help="Servidor ya levantado (ej: http://127.0.0.1:8000). Por defecto, app en proceso.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes concurrentes")
+    return parser
+
+
+@asynccontextmanager
+async def bench_client(base_url: str = None):
+    """
+    Cliente HTTP para el benchmark.
+    En modo en proceso ejecuta también los eventos de startup/shutdown de la app.
+    """
+    if base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+            yield client
+        return
+
+    from app.main import app
+    from app.core.limiter import limiter
+
+    # El rate limit de /auth (5/minute por IP) falsearía cualquier medición en proceso
+    limiter.enabled = False
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30.0) as client:
+            yield client
+
+
+async def timed(coro_factory, samples: list):
+    """Ejecuta la corrutina y añade su latencia (s) a samples."""
+    start = time.perf_counter()
+    result = await coro_factory()
+    samples.append(time.perf_counter() - start)
+    return result
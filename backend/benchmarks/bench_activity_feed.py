@@ -0,0 +1,95 @@
+"""
+Benchmark: latencia del feed de actividad (GET /activity/user) según crece el historial.
+
+Crea colecciones 'activities' sintéticas (por defecto 100k, 1M y 3M eventos repartidos
+entre --users usuarios) en una base de datos aparte ('<MONGO_DB>_bench', se borra al
+terminar) con los mismos índices que la app, y mide la lectura de los 20 eventos más
+recientes de un usuario al azar:
+
+- mongo: find().sort(timestamp).limit(20) sobre el índice (user_id, timestamp)
+- ring:  ActivityFeed con el buffer del usuario ya cargado (el caso habitual)
+
+Uso:
+    python benchmarks/bench_activity_feed.py --sizes 100000 1000000 --users 5000 --rounds 2000
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from _common import summarize
+
+from app.core.config import settings
+from app.db import client
+from app.db.indexes import INDEXES
+from app.services.activity_feed import FEED_SIZE, ActivityFeed
+
+TYPES = ["view", "cart", "order", "login"]
+
+
+async def _grow(collection, current: int, target: int, users: int):
+    """Añade eventos hasta 'target' (los tamaños se miden de menor a mayor sin resembrar)."""
+    # Fechas recientes: el índice TTL de retención no debe borrar eventos a mitad de medición
+    start = datetime.now(timezone.utc) - timedelta(days=40)
+    batch = []
+    for i in range(current, target):
+        batch.append({
+            "_id": ObjectId(),
+            "user_id": f"user-{random.randrange(users)}",
+            "type": random.choice(TYPES),
+            "title": f"Evento {i}",
+            "description": "Actividad sintética del benchmark",
+            "timestamp": start + timedelta(seconds=i),  # 3M eventos = ~35 días
+        })
+        if len(batch) == 10000:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def _mongo(collection, user_id):
+    return await collection.find({"user_id": user_id}).sort("timestamp", -1).limit(FEED_SIZE).to_list(length=FEED_SIZE)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 3_000_000])
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    bench_db = client[f"{settings.mongo_db}_bench"]
+    collection = bench_db.activities
+    await collection.drop()
+    await collection.create_indexes(INDEXES["activities"])
+    try:
+        current = 0
+        for size in sorted(args.sizes):
+            start = time.perf_counter()
+            await _grow(collection, current, size, args.users)
+            current = size
+            print(f"\n--- {size} eventos ({args.users} usuarios, sembrado en {time.perf_counter() - start:.1f}s) ---")
+
+            users = [f"user-{random.randrange(args.users)}" for _ in range(args.rounds)]
+            feed = ActivityFeed(ttl=float("inf"), max_users=args.users)
+            for user_id in set(users):
+                await feed.recent(collection, user_id)
+
+            for label, run in (("mongo", lambda u: _mongo(collection, u)), ("ring", lambda u: feed.recent(collection, u))):
+                samples = []
+                for user_id in users:
+                    start = time.perf_counter()
+                    await run(user_id)
+                    samples.append(time.perf_counter() - start)
+                summarize(f"{label} @ {size}", samples)
+    finally:
+        await client.drop_database(bench_db.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Benchmark: throughput de rutas autenticadas con la caché de usuarios activada y desactivada.
+
+Golpea /api/v1/auth/me y /api/v1/orders/ con el mismo token y compara
+requests/s y latencias. En modo en proceso alterna settings.user_cache_enabled;
+con --base-url solo mide la configuración del servidor remoto.
+
+Uso:
+    python benchmarks/bench_auth_cache.py --duration 10 --concurrency 32
+"""
+import asyncio
+import time
+import uuid
+
+from _common import base_parser, bench_client, summarize, timed
+
+ROUTES = ["/api/v1/auth/me", "/api/v1/orders/"]
+
+
+async def _worker(client, headers, deadline: float, samples: list):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = ROUTES[i % len(ROUTES)]
+        i += 1
+        response = await timed(lambda: client.get(path, headers=headers), samples)
+        response.raise_for_status()
+
+
+async def _scenario(client, headers, args, label: str):
+    deadline = time.perf_counter() + args.duration
+    samples = []
+    start = time.perf_counter()
+    await asyncio.gather(*[_worker(client, headers, deadline, samples) for _ in range(args.concurrency)])
+    summarize(label, samples, time.perf_counter() - start)
+
+
+async def main():
+    args = base_parser(__doc__).parse_args()
+    email = f"bench-{uuid.uuid4().hex[:8]}@bench.local"
+    password = "bench-password"
+
+    async with bench_client(args.base_url) as client:
+        (await client.post("/api/v1/auth/register", json={"email": email, "password": password})).raise_for_status()
+        login = await client.post("/api/v1/auth/login", json={"email": email, "password": password})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.cookies['access_token']}"}
+
+        if args.base_url:
+            await _scenario(client, headers, args, "auth routes (remoto)")
+            return
+
+        from app.core.config import settings
+        from app.core.security import user_cache
+        from app.db import db
+
+        for enabled in (False, True):
+            settings.user_cache_enabled = enabled
+            user_cache.clear()
+            user_cache.hits = user_cache.misses = 0
+            await _scenario(client, headers, args, f"auth routes (cache={'on' if enabled else 'off'})")
+            if enabled:
+                print(f"  user_cache: {user_cache.stats()}")
+
+        await db.users.delete_one({"email": email})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Benchmark: tamaño de respuesta y latencia del listado del catálogo según la vista.
+
+Compara GET /api/v1/products?limit=100 con view=full, view=summary y
+fields=name,slug,min_price. Para no depender del catálogo real, inserta --seed
+productos sintéticos (descripciones largas, varias imágenes y variantes) con un
+tipo propio, filtra por él y los borra al terminar.
+
+Uso:
+    python benchmarks/bench_catalog_payload.py --seed 500 --duration 10 --concurrency 16
+"""
+import asyncio
+import random
+import time
+
+from _common import base_parser, bench_client, summarize, timed
+
+BENCH_TYPE = "BenchPayload"
+LIMIT = 100
+VIEWS = {
+    "full": {},
+    "summary": {"view": "summary"},
+    "fields": {"fields": "name,slug,min_price"},
+}
+WORDS = "pikachu charmander squirtle plush figure shiny limited edition handmade soft cotton".split()
+
+
+def _product(i: int) -> dict:
+    return {
+        "name": f"Bench Payload Product {i}",
+        "slug": f"bench-payload-{i}",
+        "type": BENCH_TYPE,
+        "image_url": f"/uploads/bench-{i}.webp",
+        "images": [f"/uploads/bench-{i}-{n}.webp" for n in range(6)],
+        "short_description": " ".join(random.choices(WORDS, k=20)),
+        "long_description": " ".join(random.choices(WORDS, k=300)),
+        "description": " ".join(random.choices(WORDS, k=80)),
+        "variants": [
+            {"size": size, "price": round(random.uniform(5, 80), 2), "stock": random.randint(0, 50)}
+            for size in ("S", "M", "L", "XL")
+        ],
+        "sold_count": random.randint(0, 1000),
+    }
+
+
+async def _scenario(client, params: dict, args, label: str):
+    params = {"type": BENCH_TYPE, "limit": LIMIT, **params}
+    first = await client.get("/api/v1/products/", params=params)
+    first.raise_for_status()
+    size = len(first.content)
+
+    deadline = time.perf_counter() + args.duration
+    samples = []
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            response = await timed(lambda: client.get("/api/v1/products/", params=params), samples)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    summarize(label, samples, time.perf_counter() - start)
+    print(f"  {len(first.json()['products'])} productos, {size / 1024:.1f} KiB por página")
+    return size
+
+
+async def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--seed", type=int, default=500, help="Productos sintéticos a insertar (0 = no sembrar)")
+    args = parser.parse_args()
+
+    from app.db import db
+    from app.services.product_fields import derived_fields
+
+    if args.seed:
+        docs = [_product(i) for i in range(args.seed)]
+        for doc in docs:
+            doc.update(derived_fields(doc))
+        await db.products.insert_many(docs)
+
+    try:
+        async with bench_client(args.base_url) as client:
+            sizes = {name: await _scenario(client, params, args, f"products ({name})") for name, params in VIEWS.items()}
+        for name, size in sizes.items():
+            print(f"{name:<8} {size / sizes['full'] * 100:6.1f}% del tamaño de view=full")
+    finally:
+        if args.seed:
+            await db.products.delete_many({"type": BENCH_TYPE})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
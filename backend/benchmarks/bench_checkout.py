@@ -0,0 +1,96 @@
+"""
+Benchmark: throughput de checkout y corrección (sin sobreventa) sobre un único SKU muy disputado.
+
+Crea un producto con --stock unidades y lanza --orders pedidos concurrentes
+(cada uno con --lines líneas del mismo SKU) por cada modo de checkout. Verifica
+que las unidades vendidas nunca superen el stock inicial, que el stock final
+cuadre con los pedidos aceptados y que no queden reservas colgadas.
+
+Uso:
+    python benchmarks/bench_checkout.py --stock 500 --orders 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from _common import summarize
+
+from app.core.config import settings
+from app.db import db
+from app.repositories.order_repository import RESERVATIONS_FIELD, OrderRepository, supports_transactions
+
+BENCH_USER = "bench-checkout"
+
+
+async def _run_mode(mode: str, args) -> bool:
+    settings.checkout_mode = mode
+    product_id = (await db.products.insert_one({
+        "name": f"Bench Hot SKU ({mode})",
+        "type": "Bench",
+        "image_url": "",
+        "variants": [{"size": "M", "price": 10.0, "stock": args.stock}],
+        "sold_count": 0,
+    })).inserted_id
+
+    item = {"id": str(product_id), "name": "Bench Hot SKU", "price": 10.0, "quantity": 1, "type": "Bench", "img": "", "size": "M"}
+    repo = OrderRepository()
+    samples, accepted, rejected = [], 0, 0
+    queue = asyncio.Queue()
+    for _ in range(args.orders):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal accepted, rejected
+        while not queue.empty():
+            queue.get_nowait()
+            order = {
+                "items": [dict(item) for _ in range(args.lines)],
+                "total": 10.0 * args.lines,
+                "user_id": BENCH_USER,
+                "status": "pending",
+                "created_at": datetime.now(timezone.utc),
+            }
+            start = time.perf_counter()
+            try:
+                await repo.create_with_transaction(order)
+                accepted += 1
+            except ValueError:
+                rejected += 1
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    summarize(f"checkout ({mode})", samples, time.perf_counter() - start)
+
+    product = await db.products.find_one({"_id": product_id})
+    stock = product["variants"][0]["stock"]
+    sold = accepted * args.lines
+    ok = stock >= 0 and sold <= args.stock and stock == args.stock - sold and not product.get(RESERVATIONS_FIELD)
+    print(f"  aceptados={accepted} rechazados={rejected} vendidos={sold} stock_final={stock} -> {'OK' if ok else 'SOBREVENTA/DESCUADRE'}")
+
+    await db.products.delete_one({"_id": product_id})
+    await db.orders.delete_many({"user_id": BENCH_USER})
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=1, help="Líneas del mismo SKU por pedido")
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    modes = ["sequential", "bulk"]
+    if await supports_transactions():
+        modes.append("transaction")
+    else:
+        print("(sin replica set: se omite el modo 'transaction')")
+
+    results = [await _run_mode(mode, args) for mode in modes]
+    raise SystemExit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
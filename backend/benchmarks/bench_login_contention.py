@@ -0,0 +1,90 @@
+"""
+Benchmark: latencia de /api/v1/products mientras hay logins concurrentes.
+
+Mide p50/p99 del listado de productos en dos escenarios:
+  1. Sin carga de login (línea base).
+  2. Con N clientes haciendo login en bucle (bcrypt en el pool).
+
+Con --mode sync se reemplaza el hashing asíncrono por la llamada bloqueante
+original, para comparar el antes/después en el mismo entorno.
+
+Uso:
+    python benchmarks/bench_login_contention.py --duration 10 --logins 8
+"""
+import asyncio
+import time
+import uuid
+
+from _common import base_parser, bench_client, summarize, timed
+
+
+async def _products_poller(client, deadline: float, samples: list):
+    while time.perf_counter() < deadline:
+        await timed(lambda: client.get("/api/v1/products/", params={"limit": 20}), samples)
+
+
+async def _login_loop(client, email: str, password: str, deadline: float, samples: list, errors: list):
+    while time.perf_counter() < deadline:
+        response = await timed(
+            lambda: client.post("/api/v1/auth/login", json={"email": email, "password": password}),
+            samples,
+        )
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def _scenario(client, args, email, password, with_logins: bool):
+    deadline = time.perf_counter() + args.duration
+    product_samples, login_samples, login_errors = [], [], []
+    tasks = [_products_poller(client, deadline, product_samples) for _ in range(args.concurrency)]
+    if with_logins:
+        tasks += [
+            _login_loop(client, email, password, deadline, login_samples, login_errors)
+            for _ in range(args.logins)
+        ]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    label = "products (con logins)" if with_logins else "products (sin logins)"
+    summarize(label, product_samples, elapsed)
+    if with_logins:
+        summarize("login", login_samples, elapsed)
+        if login_errors:
+            print(f"  login no-200: {len(login_errors)} (503 = pool saturado)")
+
+
+async def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--logins", type=int, default=8, help="Clientes haciendo login en paralelo")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    args = parser.parse_args()
+
+    if args.mode == "sync":
+        # Simula el comportamiento anterior: bcrypt bloqueando el event loop
+        from app.core import security
+        from app.services import auth_service
+
+        async def blocking_verify(password, hashed):
+            return security.verify_password(password, hashed)
+
+        auth_service.verify_password_async = blocking_verify
+
+    email = f"bench-{uuid.uuid4().hex[:8]}@bench.local"
+    password = "bench-password"
+
+    async with bench_client(args.base_url) as client:
+        response = await client.post("/api/v1/auth/register", json={"email": email, "password": password})
+        response.raise_for_status()
+
+        print(f"mode={args.mode} duration={args.duration}s concurrency={args.concurrency} logins={args.logins}")
+        await _scenario(client, args, email, password, with_logins=False)
+        await _scenario(client, args, email, password, with_logins=True)
+
+    if not args.base_url:
+        from app.db import db
+        await db.users.delete_one({"email": email})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
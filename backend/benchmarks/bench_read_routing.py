@@ -0,0 +1,95 @@
+"""
+Comprobación y benchmark del enrutado de lecturas (READ_ROUTES) contra un replica set.
+
+Replica set local de 3 nodos (ejemplo):
+    for i in 0 1 2; do mkdir -p /tmp/rs/$i; mongod --replSet rs0 --port 2701$i --dbpath /tmp/rs/$i --fork --logpath /tmp/rs/$i.log; done
+    mongosh --port 27010 --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27010"}, {_id: 1, host: "localhost:27011"}, {_id: 2, host: "localhost:27012"}]})'
+
+    MONGO_URI="mongodb://localhost:27010,localhost:27011,localhost:27012/?replicaSet=rs0" \\
+        python benchmarks/bench_read_routing.py --rounds 500
+
+Para cada ruta ejecuta --rounds lecturas con reader(ruta) sobre su colección, registra
+qué miembro sirvió cada una (CommandListener del driver) y reporta p50/p99 por ruta.
+Termina con código 1 si una ruta PRIMARY la sirve un secundario o, con
+MONGO_REPLICA_READ_PREFERENCE secondary/secondaryPreferred y secundarios disponibles,
+si una ruta REPLICA la sirve el primario. Solo lee: no modifica la base de datos.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+from pymongo import monitoring
+
+from _common import summarize
+
+from app.core.config import settings
+from app.db import PRIMARY, READ_ROUTES, database, reader
+
+# Colección que lee cada grupo de rutas
+ROUTE_COLLECTIONS = {"catalog": "products", "home": "products", "admin": "metrics", "orders": "orders"}
+
+
+class ServedBy(monitoring.CommandListener):
+    """Miembro del replica set que recibió el último comando de lectura."""
+
+    def __init__(self):
+        self.last = None
+
+    def started(self, event):
+        if event.command_name in ("find", "aggregate", "count"):
+            self.last = "%s:%s" % event.connection_id
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    served_by = ServedBy()
+    # Antes de crear el cliente: los listeners se fijan al construirlo
+    monitoring.register(served_by)
+
+    hello = await database.client.admin.command("hello")
+    primary = hello.get("primary")
+    secondaries = [host for host in hello.get("hosts", []) if host != primary]
+    print(f"primario: {primary or '(sin replica set)'}  secundarios: {secondaries or '-'}")
+    strict = bool(secondaries) and settings.mongo_replica_read_preference in ("secondary", "secondaryPreferred")
+
+    failures = []
+    for route in READ_ROUTES:
+        target = settings.mongo_read_routes.get(route, READ_ROUTES[route])
+        collection = reader(route)[ROUTE_COLLECTIONS[route.split(".")[0]]]
+        samples, members = [], Counter()
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            await collection.find_one({})
+            samples.append(time.perf_counter() - start)
+            members[served_by.last] += 1
+
+        summarize(f"{route} ({target})", samples)
+        print(f"  servido por: {dict(members)}")
+        on_primary = members.get(primary, 0)
+        if primary and target == PRIMARY and on_primary < args.rounds:
+            failures.append(f"{route}: {args.rounds - on_primary} lecturas fuera del primario")
+        if strict and target != PRIMARY and on_primary:
+            failures.append(f"{route}: {on_primary} lecturas en el primario")
+
+    database.close()
+    if failures:
+        print("\nFALLO:\n  " + "\n  ".join(failures))
+        return 1
+    print("\nOK: cada ruta lee del miembro que le corresponde")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
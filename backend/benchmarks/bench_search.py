@@ -0,0 +1,110 @@
+"""
+Benchmark: búsqueda de productos con regex vs índice de texto de MongoDB vs índice en memoria.
+
+Crea catálogos sintéticos de 10k y 100k productos en una base de datos aparte
+('<MONGO_DB>_bench', se borra al terminar) y mide la latencia de la primera
+página (20 resultados + total) para una batería de términos.
+
+Uso:
+    python benchmarks/bench_search.py --sizes 10000 100000 --rounds 50
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from _common import summarize
+
+from app.core.config import settings
+from app.db import client
+from app.services.product_search import (
+    TEXT_INDEX_KEYS, TEXT_INDEX_OPTIONS, ProductSearchIndex, regex_search_query, text_search_query,
+)
+
+SPECIES = ["pikachu", "charmander", "squirtle", "bulbasaur", "eevee", "jigglypuff", "gengar", "snorlax", "mewtwo", "lucario"]
+TYPES = ["Electric", "Fire", "Water", "Grass", "Normal", "Fairy", "Ghost", "Psychic", "Fighting"]
+KINDS = ["plush", "figure", "keychain", "poster", "mug", "cap"]
+QUERIES = ["pikachu", "gengar plush", "shiny figure", "mewtwo", "water", "keychain"]
+PAGE = 20
+
+
+def _product(i: int) -> dict:
+    species, kind = random.choice(SPECIES), random.choice(KINDS)
+    return {
+        "name": f"{species.title()} {kind.title()} #{i}",
+        "slug": f"{species}-{kind}-{i}",
+        "type": random.choice(TYPES),
+        "image_url": "/uploads/x.webp",
+        "short_description": f"{'Shiny ' if i % 17 == 0 else ''}{species} {kind}",
+        "long_description": " ".join(random.choices(SPECIES + KINDS, k=30)),
+        "price": round(random.uniform(5, 80), 2),
+    }
+
+
+async def _seed(collection, size: int):
+    await collection.drop()
+    batch = []
+    for i in range(size):
+        batch.append(_product(i))
+        if len(batch) == 5000:
+            await collection.insert_many(batch)
+            batch = []
+    if batch:
+        await collection.insert_many(batch)
+    await collection.create_index(TEXT_INDEX_KEYS, **TEXT_INDEX_OPTIONS)
+
+
+async def _regex(collection, term):
+    query = {"name": regex_search_query(term)}
+    await collection.count_documents(query)
+    await collection.find(query).limit(PAGE).to_list(length=PAGE)
+
+
+async def _text(collection, term):
+    query = {"$text": text_search_query(term)}
+    await collection.count_documents(query)
+    cursor = collection.find(query, {"score": {"$meta": "textScore"}}).sort([("score", {"$meta": "textScore"})])
+    await cursor.limit(PAGE).to_list(length=PAGE)
+
+
+def _memory_factory(index: ProductSearchIndex):
+    async def _memory(collection, term):
+        ids = index.search(term)
+        page = ids[:PAGE]
+        await collection.find({"_id": {"$in": page}}).to_list(length=PAGE)
+    return _memory
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(42)
+    bench_db = client[f"{settings.mongo_db}_bench"]
+    collection = bench_db.products
+    try:
+        for size in args.sizes:
+            print(f"\n--- {size} productos ---")
+            await _seed(collection, size)
+
+            index = ProductSearchIndex(max_age=float("inf"))
+            start = time.perf_counter()
+            await index.rebuild(collection)
+            print(f"índice en memoria construido en {(time.perf_counter() - start) * 1000:.0f}ms")
+
+            for label, run in (("regex", _regex), ("text", _text), ("memory", _memory_factory(index))):
+                samples = []
+                for _ in range(args.rounds):
+                    for term in QUERIES:
+                        start = time.perf_counter()
+                        await run(collection, term)
+                        samples.append(time.perf_counter() - start)
+                summarize(f"{label} @ {size}", samples)
+    finally:
+        await client.drop_database(bench_db.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
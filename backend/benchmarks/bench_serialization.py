@@ -0,0 +1,139 @@
+"""
+Microbenchmark: coste de serialización por endpoint, camino Pydantic vs camino rápido.
+
+No necesita MongoDB: genera documentos sintéticos con la misma forma que los de
+la base de datos (ObjectId, datetime, variantes, items...) y mide, por llamada:
+
+- pydantic: construir los modelos como hace el endpoint + validar contra el
+  response_model + jsonable_encoder + JSONResponse (lo que hace FastAPI).
+- fast: DocumentShape + dumps() (orjson), el camino de settings.fast_json_responses.
+
+Uso:
+    python benchmarks/bench_serialization.py --rounds 200
+"""
+import argparse
+import copy
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import _common  # noqa: F401  (añade backend/ al sys.path)
+
+from app.core.serialization import DocumentShape, dumps
+from app.schemas.activity import ActivityOut
+from app.schemas.order import OrderOut
+from app.schemas.product import ProductList, ProductOut, ProductSummary, ProductSummaryList
+from app.services.product_fields import derived_fields
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def _product(i: int) -> dict:
+    doc = {
+        "_id": ObjectId(),
+        "name": f"Pikachu Plush {i}",
+        "slug": f"pikachu-plush-{i}",
+        "type": "Electric",
+        "image_url": f"/uploads/{i}.webp",
+        "images": [f"/uploads/{i}-{n}.webp" for n in range(4)],
+        "short_description": "Peluche suave de Pikachu " * 3,
+        "long_description": "Texto largo de descripción del producto. " * 40,
+        "variants": [{"size": s, "price": round(random.uniform(5, 60), 2), "stock": random.randint(0, 30)} for s in "SML"],
+        "sold_count": random.randint(0, 500),
+        "is_new": i % 5 == 0,
+        "featured": i % 9 == 0,
+    }
+    doc.update(derived_fields(doc))
+    return doc
+
+
+def _order(i: int) -> dict:
+    items = [
+        {"id": str(ObjectId()), "name": f"Item {n}", "price": 12.5, "quantity": 2, "type": "Fire", "img": "/uploads/x.webp", "size": "M"}
+        for n in range(3)
+    ]
+    return {"_id": ObjectId(), "user_id": str(ObjectId()), "items": items, "total": 75.0, "status": "pending",
+            "created_at": NOW - timedelta(days=i), "reservation_id": ObjectId()}
+
+
+def _activity(i: int) -> dict:
+    return {"_id": ObjectId(), "user_id": str(ObjectId()), "type": "view", "title": f"Visto producto {i}",
+            "description": "El usuario vio un producto del catálogo", "timestamp": NOW - timedelta(minutes=i)}
+
+
+def _pydantic_body(response_model, value) -> bytes:
+    # Lo mismo que FastAPI: validar contra response_model, jsonable_encoder y JSONResponse
+    validated = TypeAdapter(response_model).validate_python(value, from_attributes=True)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def _with_id(doc: dict) -> dict:
+    doc = dict(doc)
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+
+def scenarios():
+    products = [_product(i) for i in range(100)]
+    orders = [_order(i) for i in range(50)]
+    activities = [_activity(i) for i in range(20)]
+    product_shape, summary_shape = DocumentShape(ProductOut), DocumentShape(ProductSummary)
+    order_shape, activity_shape = DocumentShape(OrderOut), DocumentShape(ActivityOut)
+
+    return {
+        "GET /products (limit=100)": (
+            lambda docs: _pydantic_body(ProductList, ProductList(products=[_with_id(d) for d in docs], total=1000)),
+            lambda docs: dumps({"products": [product_shape(d) for d in docs], "total": 1000, "next_cursor": None, "total_is_estimate": False}),
+            products,
+        ),
+        "GET /products?view=summary": (
+            lambda docs: _pydantic_body(ProductSummaryList, ProductSummaryList(products=[_with_id(d) for d in docs], total=1000)),
+            lambda docs: dumps({"products": [summary_shape(d) for d in docs], "total": 1000, "next_cursor": None, "total_is_estimate": False}),
+            products,
+        ),
+        "GET /products/{id}": (
+            lambda docs: _pydantic_body(ProductOut, _with_id(docs[0])),
+            lambda docs: dumps(product_shape(docs[0])),
+            products,
+        ),
+        "GET /orders (50)": (
+            lambda docs: _pydantic_body(List[OrderOut], [OrderOut(id=str(o["_id"]), **{k: v for k, v in o.items() if k != "_id"}) for o in docs]),
+            lambda docs: dumps([order_shape(o) for o in docs]),
+            orders,
+        ),
+        "GET /activity/user (20)": (
+            lambda docs: _pydantic_body(List[ActivityOut], [ActivityOut(id=str(a["_id"]), **{k: v for k, v in a.items() if k != "_id"}) for a in docs]),
+            lambda docs: dumps([activity_shape(a) for a in docs]),
+            activities,
+        ),
+    }
+
+
+def _measure(func, docs, rounds: int) -> float:
+    func(copy.deepcopy(docs))  # calentamiento
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(docs)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<30} {'pydantic':>12} {'fast':>12} {'x':>6}")
+    for label, (slow, fast, docs) in scenarios().items():
+        slow_s = _measure(slow, docs, args.rounds)
+        fast_s = _measure(fast, docs, args.rounds)
+        print(f"{label:<30} {slow_s * 1e6:10.0f}us {fast_s * 1e6:10.0f}us {slow_s / fast_s:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: throughput de imágenes de /uploads por worker.
+
+No necesita MongoDB: crea --files imágenes falsas de --size KB con nombre por
+contenido en una carpeta temporal y las sirve, en proceso, con:
+
+- staticfiles: el StaticFiles de Starlette tal cual (lo que había antes).
+- uploads: app/core/uploads.py (caché de stat, bloques de 256 KB, Cache-Control).
+- uploads 304: el mismo, con If-None-Match (navegador/CDN revalidando).
+- accel-redirect: solo cabeceras; los bytes los serviría nginx.
+
+Con --base-url mide un servidor ya levantado pidiendo las rutas de --paths.
+
+Uso:
+    python benchmarks/bench_uploads.py --duration 10 --concurrency 32 --size 150
+    python benchmarks/bench_uploads.py --base-url http://127.0.0.1:8000 --paths /uploads/<hash>-thumb.webp
+"""
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+import httpx
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.staticfiles import StaticFiles
+
+from _common import base_parser, summarize, timed
+
+from app.core.uploads import UploadFiles
+
+
+async def _worker(client, paths, headers, deadline: float, samples: list, sizes: list):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        response = await timed(lambda: client.get(path, headers=headers.get(path, {})), samples)
+        if response.status_code not in (200, 304):
+            response.raise_for_status()
+        sizes.append(len(response.content))
+
+
+async def _scenario(client, paths, args, label: str, headers=None):
+    deadline = time.perf_counter() + args.duration
+    samples, sizes = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[_worker(client, paths, headers or {}, deadline, samples, sizes) for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    summarize(label, samples, elapsed)
+    print(f"  {sum(sizes) / elapsed / 1024 / 1024:8.1f} MB/s")
+
+
+def _make_files(directory: str, count: int, size_kb: int):
+    names = []
+    for _ in range(count):
+        name = f"{uuid.uuid4().hex}-medium.webp"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(os.urandom(size_kb * 1024))
+        names.append(name)
+    return names
+
+
+async def main():
+    parser = base_parser(__doc__)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size", type=int, default=150, help="KB por imagen")
+    parser.add_argument("--paths", nargs="*", default=[], help="Rutas a pedir con --base-url")
+    args = parser.parse_args()
+
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0) as client:
+            await _scenario(client, args.paths, args, "uploads (remoto)")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [f"/uploads/{name}" for name in _make_files(directory, args.files, args.size)]
+        apps = {
+            "staticfiles": StaticFiles(directory=directory),
+            "uploads": UploadFiles(directory),
+            "accel-redirect": UploadFiles(directory, accel_redirect_prefix="/_uploads"),
+        }
+        for label, static in apps.items():
+            app = Starlette(routes=[Mount("/uploads", static)])
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30.0) as client:
+                await _scenario(client, paths, args, label)
+                if label == "uploads":
+                    etags = {path: {"If-None-Match": (await client.get(path)).headers["etag"]} for path in paths}
+                    await _scenario(client, paths, args, "uploads 304", etags)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
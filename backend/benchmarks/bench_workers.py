@@ -0,0 +1,128 @@
+"""
+Benchmark: throughput y latencia de los endpoints principales según el número de workers.
+
+Para cada valor de --workers levanta `python -m app.serve --workers N` en --port (contra el
+MongoDB configurado en .env), espera a que responda y lanza carga HTTP real sobre cada ruta
+durante --duration segundos desde --client-procs procesos cliente (un solo proceso de
+Python no genera carga suficiente para 8 workers). Reporta req/s y p50/p99 por ruta y una
+tabla final de req/s por número de workers.
+
+Los clientes comparten máquina con el servidor: en una máquina con pocos núcleos la carga
+les roba CPU a los workers. Para medidas finas, ejecutar en una máquina con núcleos de sobra.
+
+Uso:
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --duration 10 --concurrency 64
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from _common import summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = [
+    "/",
+    "/api/v1/home/",
+    "/api/v1/products?limit=20",
+    "/api/v1/products?limit=20&view=summary",
+    "/api/v1/products/facets",
+    "/api/v1/products/types/list",
+]
+
+
+async def _load(base_url: str, path: str, duration: float, concurrency: int):
+    samples, errors = [], 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    samples.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors
+
+
+def _client_process(base_url: str, path: str, duration: float, concurrency: int):
+    return asyncio.run(_load(base_url, path, duration, concurrency))
+
+
+def _wait_ready(base_url: str, server: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"app.serve terminó al arrancar (código {server.returncode})")
+        try:
+            if httpx.get(base_url + "/", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("app.serve no respondió a tiempo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por ruta")
+    parser.add_argument("--concurrency", type=int, default=64, help="Conexiones concurrentes en total")
+    parser.add_argument("--client-procs", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--paths", nargs="+", default=PATHS)
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    per_process = max(1, args.concurrency // args.client_procs)
+    table = {}
+    pool = ProcessPoolExecutor(args.client_procs, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for workers in args.workers:
+            server = subprocess.Popen(
+                [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(args.port),
+                 "--log-level", "warning", "--no-access-log"],
+                cwd=BACKEND_DIR,
+            )
+            try:
+                _wait_ready(base_url, server)
+                print(f"\n--- {workers} worker(s), {args.client_procs}x{per_process} conexiones ---")
+                for path in args.paths:
+                    futures = [pool.submit(_client_process, base_url, path, args.duration, per_process) for _ in range(args.client_procs)]
+                    samples, errors = [], 0
+                    for future in futures:
+                        part, failed = future.result()
+                        samples += part
+                        errors += failed
+                    result = summarize(path[:32], samples, elapsed=args.duration)
+                    if errors:
+                        print(f"  {errors} errores")
+                    table[(path, workers)] = result.get("rps", 0.0)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+    finally:
+        pool.shutdown()
+
+    print("\nreq/s por workers")
+    print(f"{'ruta':<42}" + "".join(f"{w:>10}" for w in args.workers))
+    for path in args.paths:
+        print(f"{path:<42}" + "".join(f"{table.get((path, w), 0.0):>10.0f}" for w in args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Stress test del rate limiting de la app con varios workers (límite de /auth/login: 5/minute).
+
+Carga --workers copias independientes de app.main (cada una con su propio `limiter`,
+como cada worker de uvicorn) y les reparte en round-robin --requests peticiones a
+POST /api/v1/auth/login de un mismo cliente. Pasa por todo lo de app/core/limiter.py:
+rate_limit_key, key_prefix, la estrategia (RATE_LIMIT_STRATEGY) y el fallback en memoria.
+
+- per-worker: cada copia con su "memory://" (lo que pasa sin almacenamiento compartido)
+- shared:     todas contra el mismo almacenamiento. Por defecto un MemoryStorage común
+              que hace de Redis local; con --storage-uri, el backend real
+              (ej: redis://localhost:6379/1).
+- token:      con la IP ya agotada, un Bearer válido cuenta aparte como "user:<id>"
+- fallback:   el almacenamiento compartido deja de responder: cada worker sigue
+              limitando en memoria (como mucho el límite por worker) y ninguna petición falla
+
+Las peticiones admitidas llegan al endpoint (401 con estas credenciales): necesita el
+MongoDB configurado en .env. Termina con código 1 si alguna comprobación falla.
+También mide las entradas que deja en memoria cada estrategia con --clients clientes
+distintos (O(1) por clave vs un timestamp por petición).
+
+Uso:
+    python benchmarks/stress_rate_limit.py --workers 2 --requests 50
+    python benchmarks/stress_rate_limit.py --storage-uri redis://localhost:6379/1
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+
+import httpx
+from limits import parse
+from limits.storage import MemoryStorage, storage_from_string
+from limits.strategies import STRATEGIES
+
+from _common import summarize
+
+from app.core.config import settings
+
+LIMIT = "5/minute"
+LOGIN_PATH = "/api/v1/auth/login"
+LOGIN_PAYLOAD = {"email": "stress@example.com", "password": "not-the-password"}
+
+
+class FlakyStorage(MemoryStorage):
+    """MemoryStorage que, con down=True, falla como un Redis caído."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def _fail(self):
+        if self.down:
+            raise ConnectionError("rate limit storage unreachable")
+
+    def incr(self, *args, **kwargs):
+        self._fail()
+        return super().incr(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        self._fail()
+        return super().get(*args, **kwargs)
+
+    def acquire_entry(self, *args, **kwargs):
+        self._fail()
+        return super().acquire_entry(*args, **kwargs)
+
+    def acquire_sliding_window_entry(self, *args, **kwargs):
+        self._fail()
+        return super().acquire_sliding_window_entry(*args, **kwargs)
+
+    def get_sliding_window(self, *args, **kwargs):
+        self._fail()
+        return super().get_sliding_window(*args, **kwargs)
+
+    def get_moving_window(self, *args, **kwargs):
+        self._fail()
+        return super().get_moving_window(*args, **kwargs)
+
+    def check(self):
+        # Como los backends reales: check() informa, no lanza
+        return not self.down
+
+
+def _load_worker(storage=None):
+    """
+    Importa una copia nueva de la app (módulos app.* recién cargados, su propio limiter).
+    Con 'storage', su limiter cuenta en ese almacenamiento en lugar del de RATE_LIMIT_STORAGE_URI.
+    """
+    for name in [name for name in sys.modules if name == "app" or name.startswith("app.")]:
+        del sys.modules[name]
+    main = importlib.import_module("app.main")
+    limiter = importlib.import_module("app.core.limiter").limiter
+    if storage is not None:
+        # Lo que haría storage_from_string con un backend compartido, sin necesitar uno
+        limiter._storage = storage
+        limiter._limiter = STRATEGIES[limiter._strategy](storage)
+    return main.app, importlib.import_module("app.core.security")
+
+
+async def _login(apps, requests: int, ip: str, token: str = None):
+    """Reparte 'requests' logins entre los workers. Devuelve (admitidas, estados inesperados, latencias)."""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    clients = [
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 40000)), base_url="http://stress")
+        for app in apps
+    ]
+    admitted, unexpected, samples = 0, [], []
+    try:
+        for i in range(requests):
+            start = time.perf_counter()
+            response = await clients[i % len(clients)].post(LOGIN_PATH, json=LOGIN_PAYLOAD, headers=headers)
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 429:
+                admitted += 1
+            if response.status_code not in (401, 429):
+                unexpected.append(response.status_code)
+    finally:
+        for client in clients:
+            await client.aclose()
+    return admitted, unexpected, samples
+
+
+def _footprint(strategy: str, clients: int, per_client: int) -> int:
+    """Entradas que guarda un MemoryStorage tras 'per_client' peticiones de 'clients' claves."""
+    storage = MemoryStorage()
+    limiter = STRATEGIES[strategy](storage)
+    limit = parse("1000/minute")
+    for client in range(clients):
+        for _ in range(per_client):
+            limiter.hit(limit, "stress", f"ip:10.0.{client // 256}.{client % 256}")
+    return len(storage.storage) + sum(len(events) for events in storage.events.values())
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--strategy", default=settings.rate_limit_strategy, choices=sorted(STRATEGIES))
+    parser.add_argument("--storage-uri", default=None, help="Backend compartido real (por defecto, un MemoryStorage común)")
+    parser.add_argument("--clients", type=int, default=2000, help="Claves distintas para medir la memoria")
+    args = parser.parse_args()
+
+    # La app registra como error el 401 de cada login admitido: solo taparía el resultado
+    logging.getLogger("api.errors").setLevel(logging.CRITICAL)
+    # Las copias de la app leen la configuración al importarse
+    os.environ["RATE_LIMIT_STRATEGY"] = args.strategy
+    limit = parse(LIMIT).amount
+    run = time.time_ns() % 250
+    failures = []
+
+    print(f"--- {LIMIT}, {args.workers} workers, {args.requests} logins, estrategia {args.strategy} ---")
+    os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+    per_worker = [_load_worker()[0] for _ in range(args.workers)]
+    admitted_local, unexpected, samples = await _login(per_worker, args.requests, f"10.1.0.{run}")
+    summarize(f"per-worker (admitidas {admitted_local})", samples)
+    failures += [f"per-worker: respuesta {status}" for status in unexpected]
+
+    if args.storage_uri:
+        os.environ["RATE_LIMIT_STORAGE_URI"] = args.storage_uri
+        shared = storage_from_string(args.storage_uri)
+        workers = [_load_worker() for _ in range(args.workers)]
+    else:
+        shared = FlakyStorage()
+        workers = [_load_worker(shared) for _ in range(args.workers)]
+    apps = [app for app, _ in workers]
+
+    ip = f"10.2.0.{run}"
+    admitted_shared, unexpected, samples = await _login(apps, args.requests, ip)
+    summarize(f"shared (admitidas {admitted_shared})", samples)
+    failures += [f"shared: respuesta {status}" for status in unexpected]
+    if admitted_shared != min(limit, args.requests):
+        failures.append(f"shared admitió {admitted_shared} (límite {limit} entre todos los workers)")
+
+    # Un token válido: clave "user:<id>" con prefijo "webpoke", independiente de la IP ya agotada
+    user_id = f"stress{time.time_ns()}"
+    token = workers[0][1].create_token(user_id, 5)
+    admitted_user, unexpected, samples = await _login(apps, args.requests, ip, token)
+    summarize(f"token (admitidas {admitted_user})", samples)
+    failures += [f"token: respuesta {status}" for status in unexpected]
+    if admitted_user != min(limit, args.requests):
+        failures.append(f"con token se admitieron {admitted_user} (límite {limit} por usuario)")
+    # moving-window guarda sus claves en 'events'; el resto, en 'storage'
+    if isinstance(shared, MemoryStorage) and not any(f"webpoke/user:{user_id}/" in key for key in [*shared.storage, *shared.events]):
+        failures.append(f"no hay contador 'webpoke/user:{user_id}' en el almacenamiento")
+
+    if isinstance(shared, FlakyStorage):
+        shared.down = True
+        admitted_fallback, unexpected, samples = await _login(apps, args.requests, f"10.3.0.{run}")
+        summarize(f"fallback (admitidas {admitted_fallback})", samples)
+        failures += [f"fallback: respuesta {status}" for status in unexpected]
+        if admitted_fallback > limit * args.workers:
+            failures.append(f"fallback admitió {admitted_fallback} > {limit} x {args.workers} workers")
+
+    print(f"\n--- Memoria: {args.clients} clientes x 50 peticiones ---")
+    for strategy in sorted(STRATEGIES):
+        print(f"{strategy:<24} {_footprint(strategy, args.clients, 50):>8} entradas")
+
+    if failures:
+        print("\nFALLO:\n  " + "\n  ".join(failures))
+        return 1
+    print(f"\nOK: compartido admite {admitted_shared} <= {limit} (por worker: {admitted_local})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,143 @@
+"""
+Stress test del ledger de stock en memoria (flash sale sobre un único SKU).
+
+Simula --workers procesos (instancias de StockLedger con worker_id distinto)
+vendiendo a la vez un producto con --stock unidades mediante --orders pedidos
+concurrentes. Uno de los workers "se cae" a mitad (deja su lote sin volcar) y
+otro lo reconcilia. Al final comprueba que:
+
+- nunca se vendieron más unidades que el stock inicial,
+- stock final + vendidas == stock inicial (no se pierden ni duplican unidades),
+- sold_count en MongoDB coincide con las unidades de los pedidos aceptados.
+
+Además compara el throughput con el checkout directo contra MongoDB.
+
+Uso:
+    python benchmarks/stress_stock_ledger.py --stock 500 --orders 3000 --workers 4 --concurrency 128
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+
+from _common import summarize
+
+from app.core.config import settings
+from app.db import db
+from app.repositories.order_repository import OrderRepository
+from app.services import stock_ledger as ledger_module
+from app.services.stock_ledger import StockLedger
+
+BENCH_USER = "bench-stock-ledger"
+
+
+async def _create_product(stock: int):
+    return (await db.products.insert_one({
+        "name": "Bench Flash Sale SKU",
+        "type": "Bench",
+        "image_url": "",
+        "variants": [{"size": "M", "price": 10.0, "stock": stock}],
+        "sold_count": 0,
+    })).inserted_id
+
+
+async def _sell(product_id, args, ledgers=None, crash_after=None):
+    """Lanza los pedidos repartidos entre los ledgers. Devuelve (latencias, aceptados, segundos)."""
+    item = {"id": str(product_id), "name": "Bench Flash Sale SKU", "price": 10.0, "quantity": 1, "type": "Bench", "img": "", "size": "M"}
+    repo = OrderRepository()
+    samples, accepted = [], 0
+    remaining = args.orders
+    alive = list(ledgers or [])
+
+    async def client():
+        nonlocal accepted, remaining
+        while remaining > 0:
+            remaining -= 1
+            if crash_after is not None and accepted >= crash_after and len(alive) == len(ledgers) > 1:
+                # El primer worker muere: deja de atender pedidos y nunca vuelca ni devuelve su lote
+                alive.pop(0)
+            if settings.stock_ledger_enabled:
+                # El repositorio importa el singleton en cada pedido: así repartimos entre "procesos"
+                ledger_module.stock_ledger = random.choice(alive)
+            order = {
+                "items": [dict(item)],
+                "total": 10.0,
+                "user_id": BENCH_USER,
+                "status": "pending",
+                "created_at": datetime.now(timezone.utc),
+            }
+            start = time.perf_counter()
+            try:
+                await repo.create_with_transaction(order)
+                accepted += 1
+            except ValueError:
+                pass
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(args.concurrency)])
+    return samples, accepted, time.perf_counter() - start
+
+
+async def _check(product_id, initial: int, label: str) -> bool:
+    product = await db.products.find_one({"_id": product_id})
+    stock = product["variants"][0]["stock"]
+    rows = await db.orders.aggregate([
+        {"$match": {"user_id": BENCH_USER, "items.id": str(product_id)}},
+        {"$unwind": "$items"},
+        {"$group": {"_id": None, "sold": {"$sum": "$items.quantity"}}},
+    ]).to_list(length=1)
+    sold = rows[0]["sold"] if rows else 0
+    ok = sold <= initial and stock + sold == initial and product.get("sold_count", 0) == sold
+    print(f"  [{label}] vendidas={sold} stock_final={stock} sold_count={product.get('sold_count', 0)} "
+          f"-> {'OK' if ok else 'SOBREVENTA/DESCUADRE'}")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=4, help="Instancias de StockLedger (simulan procesos)")
+    parser.add_argument("--chunk", type=int, default=settings.stock_ledger_chunk)
+    parser.add_argument("--concurrency", type=int, default=128)
+    args = parser.parse_args()
+
+    # 1. Referencia: checkout directo contra MongoDB
+    settings.stock_ledger_enabled = False
+    settings.checkout_mode = "bulk"
+    baseline_id = await _create_product(args.stock)
+    samples, _, elapsed = await _sell(baseline_id, args)
+    summarize("checkout directo (bulk)", samples, elapsed)
+    results = [await _check(baseline_id, args.stock, "directo")]
+
+    # 2. Ledger con varios workers; uno se cae a mitad de la venta
+    settings.stock_ledger_enabled = True
+    product_id = await _create_product(args.stock)
+    ledgers = [
+        StockLedger(args.chunk, flush_interval=0.05, lease_ttl=0, idle_return=0.2, worker_id=f"bench-{i}")
+        for i in range(max(2, args.workers))
+    ]
+    flushers = [asyncio.create_task(ledger._flush_loop()) for ledger in ledgers[1:]]
+    samples, _, elapsed = await _sell(product_id, args, ledgers, crash_after=args.stock // 4)
+    summarize(f"ledger ({len(ledgers)} workers, chunk={args.chunk})", samples, elapsed)
+
+    for task in flushers:
+        task.cancel()
+    await asyncio.gather(*flushers, return_exceptions=True)
+    # Los supervivientes cierran limpio; el worker caído solo se recupera por reconciliación
+    for ledger in ledgers[1:]:
+        await ledger.stop()
+    restored = await ledgers[1].reconcile()
+    print(f"  reconciliadas {restored} unidades del worker caído")
+    results.append(await _check(product_id, args.stock, "ledger"))
+
+    await db.products.delete_many({"_id": {"$in": [baseline_id, product_id]}})
+    await db.orders.delete_many({"user_id": BENCH_USER})
+    await db.stock_leases.delete_many({"worker": {"$in": [ledger.worker_id for ledger in ledgers]}})
+    raise SystemExit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())